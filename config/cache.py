@@ -0,0 +1,430 @@
+"""
+Two-tier cache backend for Passenger deployments.
+
+Passenger runs several worker processes, and Django's default LocMemCache gives
+each of them a private cache, so an invalidation in one worker never reaches the
+others. ``TwoTierCache`` keeps a small LRU inside each process (tier 1) in front
+of a SQLite file shared by every worker on the host (tier 2), which needs no
+extra service.
+
+Any write that could leave another worker's tier 1 stale (overwriting a key,
+delete, incr, touch) appends the key to a change log stored next to the
+entries. Each worker reads the log at most once per request and drops just
+the changed keys from its tier 1; outside a request (management commands,
+shells) it is read before every operation. Writes that touch many keys at
+once (clear, culling) bump a generation counter instead, which empties every
+tier 1, as does falling further behind than the log keeps.
+
+Settings::
+
+    CACHES = {
+        "default": {
+            "BACKEND": "config.cache.TwoTierCache",
+            "LOCATION": "/path/to/cache.sqlite3",
+            "OPTIONS": {"LOCAL_MAX_ENTRIES": 500, "MAX_ENTRIES": 10000},
+        }
+    }
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.signals import request_finished, request_started
+
+# Tier 1 is shared by every thread of a process, one per LOCATION
+_local_tiers = {}
+_local_tiers_lock = threading.Lock()
+
+# Which locations have already been checked against the shared generation in
+# the current request, per thread. ``None`` outside a request.
+_request_state = threading.local()
+
+_MISSING = object()
+CULL_EVERY = 100
+# Changes kept in the shared log; a worker further behind empties its tier 1
+CHANGE_LOG_LENGTH = 1000
+
+
+def _on_request_started(**kwargs):
+    _request_state.checked = set()
+
+
+def _on_request_finished(**kwargs):
+    _request_state.checked = None
+
+
+request_started.connect(_on_request_started, dispatch_uid="two_tier_cache_request_started")
+request_finished.connect(_on_request_finished, dispatch_uid="two_tier_cache_request_finished")
+
+
+class _LocalTier:
+    """Bounded in-process LRU of pickled values"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires, pickled)
+        self.generation = None
+        self.change = None  # last change log entry applied
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.inserts = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires, pickled = entry
+            if expires is not None and expires <= time.time():
+                del self.entries[key]
+                return _MISSING
+            self.entries.move_to_end(key)
+            return pickled
+
+    def put(self, key, pickled, expires):
+        with self.lock:
+            self.entries[key] = (expires, pickled)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class TwoTierCache(BaseCache):
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._path = os.path.abspath(location)
+        with _local_tiers_lock:
+            tier = _local_tiers.get(self._path)
+            if tier is None:
+                tier = _LocalTier(int(options.get("LOCAL_MAX_ENTRIES", 500)))
+                _local_tiers[self._path] = tier
+        self._local = tier
+        self._connections = threading.local()
+
+    # ---- shared tier ----------------------------------------------------
+
+    def _connection(self):
+        state = self._connections
+        conn = getattr(state, "conn", None)
+        # SQLite connections must not be shared across a fork
+        if conn is None or state.pid != os.getpid():
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            conn = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_meta "
+                "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache_change "
+                "(seq INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL)"
+            )
+            conn.execute("INSERT OR IGNORE INTO cache_meta VALUES ('generation', 0)")
+            state.conn = conn
+            state.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _write(self):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _read_generation(self, conn):
+        return conn.execute("SELECT value FROM cache_meta WHERE name = 'generation'").fetchone()[0]
+
+    def _bump_generation(self, conn):
+        generation = self._read_generation(conn)
+        conn.execute(
+            "UPDATE cache_meta SET value = ? WHERE name = 'generation'", (generation + 1,)
+        )
+        return generation
+
+    def _after_invalidation(self, previous_generation):
+        """Keep tier 1 if the bump we just made was the only change since our last sync"""
+        local = self._local
+        with local.lock:
+            if local.generation == previous_generation:
+                local.generation = previous_generation + 1
+            else:
+                local.entries.clear()
+                local.generation = None
+
+    def _log_change(self, conn, key):
+        """Record that ``key`` changed; returns its change log position"""
+        seq = conn.execute("INSERT INTO cache_change (key) VALUES (?)", (key,)).lastrowid
+        if seq % CULL_EVERY == 0:
+            conn.execute("DELETE FROM cache_change WHERE seq <= ?", (seq - CHANGE_LOG_LENGTH,))
+        return seq
+
+    def _after_change(self, seq):
+        """Mark our own change as applied if tier 1 was in sync just before it"""
+        local = self._local
+        with local.lock:
+            if local.change == seq - 1:
+                local.change = seq
+
+    def _sync(self):
+        """Drop keys other processes changed from tier 1, or empty it"""
+        checked = getattr(_request_state, "checked", None)
+        if checked is not None:
+            if self._path in checked:
+                return
+            checked.add(self._path)
+        conn = self._connection()
+        generation, first, last = conn.execute(
+            "SELECT (SELECT value FROM cache_meta WHERE name = 'generation'), "
+            "MIN(seq), COALESCE(MAX(seq), 0) FROM cache_change"
+        ).fetchone()
+        local = self._local
+        with local.lock:
+            applied = local.change
+        changed = None
+        if applied is not None and applied < last and first is not None and first <= applied + 1:
+            if last - applied <= local.max_entries:
+                changed = [
+                    key
+                    for (key,) in conn.execute(
+                        "SELECT key FROM cache_change WHERE seq > ? AND seq <= ?", (applied, last)
+                    )
+                ]
+        with local.lock:
+            if local.generation != generation or (local.change != last and changed is None):
+                if local.entries:
+                    local.stats["local_flushes"] += 1
+                local.entries.clear()
+            elif changed:
+                for key in changed:
+                    local.entries.pop(key, None)
+                local.stats["local_invalidations"] += len(changed)
+            local.generation = generation
+            local.change = last
+
+    def _cull(self, conn):
+        """Trim the shared tier; returns the generation before a bump, if any
+
+        Culling live entries bumps the generation: another worker's tier 1
+        could otherwise keep serving a copy after the key is added again.
+        """
+        local = self._local
+        local.inserts += 1
+        if local.inserts % CULL_EVERY:
+            return None
+        conn.execute("DELETE FROM cache_entry WHERE expires <= ?", (time.time(),))
+        (count,) = conn.execute("SELECT COUNT(*) FROM cache_entry").fetchone()
+        if count <= self._max_entries:
+            return None
+        culled = conn.execute(
+            "SELECT key FROM cache_entry ORDER BY expires IS NULL, expires LIMIT ?",
+            (count // self._cull_frequency,),
+        ).fetchall()
+        conn.executemany("DELETE FROM cache_entry WHERE key = ?", culled)
+        for (key,) in culled:
+            local.discard(key)
+        return self._bump_generation(conn)
+
+    @staticmethod
+    def _expired(expires):
+        return expires is not None and expires <= time.time()
+
+    # ---- cache API ------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        stats = self._local.stats
+        pickled = self._local.get(key)
+        if pickled is not _MISSING:
+            stats["local_hits"] += 1
+            return pickle.loads(pickled)
+
+        row = self._connection().execute(
+            "SELECT value, expires FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self._expired(row[1]):
+            stats["misses"] += 1
+            return default
+        stats["shared_hits"] += 1
+        self._local.put(key, row[0], row[1])
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        stats = self._local.stats
+        found = {}
+        pending = {}
+        for original in keys:
+            key = self.make_and_validate_key(original, version=version)
+            pickled = self._local.get(key)
+            if pickled is _MISSING:
+                pending[key] = original
+            else:
+                stats["local_hits"] += 1
+                found[original] = pickle.loads(pickled)
+
+        if pending:
+            placeholders = ",".join("?" * len(pending))
+            rows = self._connection().execute(
+                f"SELECT key, value, expires FROM cache_entry WHERE key IN ({placeholders})",
+                list(pending),
+            )
+            for key, pickled, expires in rows:
+                if self._expired(expires):
+                    continue
+                stats["shared_hits"] += 1
+                self._local.put(key, pickled, expires)
+                found[pending.pop(key)] = pickle.loads(pickled)
+            stats["misses"] += len(pending)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        previous_generation = seq = None
+        with self._write() as conn:
+            updated = conn.execute(
+                "UPDATE cache_entry SET value = ?, expires = ? WHERE key = ?",
+                (pickled, expires, key),
+            ).rowcount
+            if updated:
+                seq = self._log_change(conn, key)
+            else:
+                conn.execute(
+                    "INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?)",
+                    (key, pickled, expires),
+                )
+                previous_generation = self._cull(conn)
+        if seq is not None:
+            self._after_change(seq)
+        if previous_generation is not None:
+            self._after_invalidation(previous_generation)
+        self._local.stats["sets"] += 1
+        self._local.put(key, pickled, expires)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        expires = self.get_backend_timeout(timeout)
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT expires FROM cache_entry WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and not self._expired(row[0]):
+                return False
+            # An expired entry is expired in every tier 1 too, so no bump is needed
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entry (key, value, expires) VALUES (?, ?, ?)",
+                (key, pickled, expires),
+            )
+            previous_generation = self._cull(conn)
+        if previous_generation is not None:
+            self._after_invalidation(previous_generation)
+        self._local.stats["sets"] += 1
+        self._local.put(key, pickled, expires)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        expires = self.get_backend_timeout(timeout)
+        with self._write() as conn:
+            updated = conn.execute(
+                "UPDATE cache_entry SET expires = ? "
+                "WHERE key = ? AND (expires IS NULL OR expires > ?)",
+                (expires, key, time.time()),
+            ).rowcount
+            seq = self._log_change(conn, key) if updated else None
+        if seq is None:
+            return False
+        self._after_change(seq)
+        self._local.discard(key)
+        return True
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        with self._write() as conn:
+            deleted = conn.execute("DELETE FROM cache_entry WHERE key = ?", (key,)).rowcount
+            seq = self._log_change(conn, key) if deleted else None
+        self._local.discard(key)
+        if seq is None:
+            return False
+        self._after_change(seq)
+        return True
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        if self._local.get(key) is not _MISSING:
+            return True
+        row = self._connection().execute(
+            "SELECT expires FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None and not self._expired(row[0])
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._sync()
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT value, expires FROM cache_entry WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._expired(row[1]):
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            pickled = pickle.dumps(new_value, self.pickle_protocol)
+            conn.execute("UPDATE cache_entry SET value = ? WHERE key = ?", (pickled, key))
+            seq = self._log_change(conn, key)
+        self._after_change(seq)
+        self._local.put(key, pickled, row[1])
+        return new_value
+
+    def clear(self):
+        with self._write() as conn:
+            conn.execute("DELETE FROM cache_entry")
+            self._bump_generation(conn)
+        with self._local.lock:
+            self._local.entries.clear()
+            self._local.generation = None
+            self._local.change = None
+
+    def close(self, **kwargs):
+        # Keep the per-thread SQLite connection open across requests
+        pass
+
+    def stats(self):
+        """Hit/miss counters for this process since it started"""
+        local = self._local
+        with local.lock:
+            stats = dict(local.stats)
+            stats["local_entries"] = len(local.entries)
+        names = ("local_hits", "shared_hits", "misses", "sets", "local_flushes", "local_invalidations")
+        for name in names:
+            stats.setdefault(name, 0)
+        return stats
@@ -88,6 +88,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "home.middleware.SiteContextUsageMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -123,6 +124,42 @@ DATABASES = {
 }
 
 
+# Cache
+# A per-process LRU in front of a SQLite file shared by all Passenger workers,
+# so invalidations reach every worker without running a cache server.
+
+CACHES = {
+    "default": {
+        "BACKEND": "config.cache.TwoTierCache",
+        "LOCATION": os.environ.get(
+            "CACHE_LOCATION", str(BASE_DIR / ".cache" / "django-cache.sqlite3")
+        ),
+        "OPTIONS": {
+            "LOCAL_MAX_ENTRIES": int(os.environ.get("CACHE_LOCAL_MAX_ENTRIES", 500)),
+            "MAX_ENTRIES": int(os.environ.get("CACHE_MAX_ENTRIES", 10000)),
+        },
+    }
+}
+
+# manage.py test points CACHES at a temporary file for the run
+TEST_RUNNER = "config.test_runner.TestRunner"
+
+# Serve stale cached pages and snapshots while a background thread rebuilds them
+CACHE_STALE_WHILE_REVALIDATE = os.environ.get("CACHE_STALE_WHILE_REVALIDATE", "False") == "True"
+
+# Edge cache (reverse proxy / CDN) in front of Passenger: how long it may keep
+# public pages, and the purger called with Surrogate-Keys when content changes
+# (home.edge.NullPurger, home.edge.HTTPPurger or home.edge.LocalEdgeProxy).
+# HTTPPurger sends its purges from the task queue, so it needs run_worker.
+EDGE_CACHE_SECONDS = int(os.environ.get("EDGE_CACHE_SECONDS", 5 * 60))
+EDGE_STALE_WHILE_REVALIDATE_SECONDS = int(os.environ.get("EDGE_STALE_WHILE_REVALIDATE_SECONDS", 60))
+EDGE_PURGER = os.environ.get("EDGE_PURGER", "home.edge.NullPurger")
+EDGE_PURGE_URL = os.environ.get("EDGE_PURGE_URL", "")
+
+# Count {% cache_on %} fragment hits and misses per template (admin/fragment-cache-stats/)
+FRAGMENT_CACHE_DEBUG = os.environ.get("FRAGMENT_CACHE_DEBUG", str(DEBUG)) == "True"
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -167,6 +204,60 @@ STATIC_ROOT = BASE_DIR / "staticfiles"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Widths (px) and quality of the WebP/JPEG derivatives made for uploaded images
+IMAGE_DERIVATIVE_WIDTHS = (320, 640, 1024, 1600)
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# On-demand resizing at /media-resize/: largest width/height that may be
+# requested, and where rendered variants are cached (LRU, size-limited)
+MEDIA_RESIZE_MAX_DIMENSION = 2400
+MEDIA_RESIZE_CACHE_DIR = os.environ.get(
+    "MEDIA_RESIZE_CACHE_DIR", str(BASE_DIR / ".cache" / "media-resize")
+)
+MEDIA_RESIZE_CACHE_MAX_BYTES = int(
+    os.environ.get("MEDIA_RESIZE_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+)
+
+# Multi-file gallery uploads are copied here (local disk) and stored in the
+# background; files stay until their batch has been processed
+UPLOAD_STAGING_DIR = os.environ.get("UPLOAD_STAGING_DIR", str(BASE_DIR / "upload-staging"))
+
+# Album ZIP downloads: how much of the next photos is read ahead from storage
+ARCHIVE_READ_AHEAD_BYTES = 8 * 1024 * 1024
+
+# Drag-and-drop ranks (home.ranking): key length at which they are respaced
+RANK_REBALANCE_LENGTH = 24
+
+# Threads generating image derivatives during a ZIP album import
+IMAGE_IMPORT_WORKERS = int(os.environ.get("IMAGE_IMPORT_WORKERS", 4))
+
+# ZIP album imports: the largest photo, and the most all photos in one archive
+# may unpack to; checked against the archive's listing before extracting
+IMAGE_IMPORT_MAX_FILE_BYTES = int(os.environ.get("IMAGE_IMPORT_MAX_FILE_BYTES", 50 * 1024 * 1024))
+IMAGE_IMPORT_MAX_TOTAL_BYTES = int(
+    os.environ.get("IMAGE_IMPORT_MAX_TOTAL_BYTES", 4 * 1024 * 1024 * 1024)
+)
+
+# Resumable chunked uploads (/admin/uploads/): largest file, largest chunk per
+# request, and how long an unfinished or unused upload is kept
+CHUNKED_UPLOAD_MAX_BYTES = int(os.environ.get("CHUNKED_UPLOAD_MAX_BYTES", 1024 * 1024 * 1024))
+CHUNKED_UPLOAD_MAX_CHUNK_BYTES = 8 * 1024 * 1024
+CHUNKED_UPLOAD_EXPIRY_HOURS = 24
+
+# Deleting content (home.deletion): stored files modified this recently are
+# kept and checked again later, since an identical upload may be reusing them
+FILE_DELETE_GRACE_SECONDS = int(os.environ.get("FILE_DELETE_GRACE_SECONDS", 3600))
+
+# Background task queue (home.tasks, run by `manage.py run_worker`): how long a
+# worker's claim on a task lasts without renewal, the first retry delay
+# (doubled on each retry) and how long finished tasks are kept
+TASK_LEASE_SECONDS = 300
+TASK_RETRY_BACKOFF_SECONDS = 30
+TASK_RETENTION_DAYS = 7
+
+# Homepage spotlight: how long each rotation of spotlight images is shown
+SPOTLIGHT_ROTATION_SECONDS = int(os.environ.get("SPOTLIGHT_ROTATION_SECONDS", 15 * 60))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -212,8 +303,12 @@ if (
     # Optional: Use Cloudinary for static files too (usually not recommended unless necessary)
     # STATICFILES_STORAGE = 'cloudinary_storage.storage.StaticHashedCloudinaryStorage'
 else:
-    # Local storage fallback
-    DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+    # Local storage fallback; files are named by a hash of their content, so
+    # /media/ can be served as immutable (see home/storage.py)
+    STORAGES = {
+        "default": {"BACKEND": "home.storage.ContentAddressedStorage"},
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
 
 # Logging Configuration
 LOGGING = {
@@ -0,0 +1,31 @@
+"""
+Test runner that keeps tests away from the live cache.
+
+The ``TwoTierCache`` file under ``.cache/`` is shared by every Passenger
+worker on the host, and the tests clear it freely. Each run gets its own
+cache files in a temporary directory instead, removed when the run ends.
+"""
+
+import copy
+import os
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        self._cache_dir = tempfile.TemporaryDirectory(prefix="test-cache-")
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, config in caches.items():
+            config["LOCATION"] = os.path.join(self._cache_dir.name, f"{alias}.sqlite3")
+        self._cache_settings = override_settings(CACHES=caches)
+        self._cache_settings.enable()
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self._cache_settings.disable()
+        self._cache_dir.cleanup()
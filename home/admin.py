@@ -27,12 +27,41 @@ from admin_ordering.admin import OrderableAdmin
 
 from adminsortable2.admin import SortableAdminMixin
 
+from .ranking import initial_rank
+
+
+class RankedSortableAdminMixin(SortableAdminMixin):
+    """``SortableAdminMixin`` for models with a ``RankField``
+
+    adminsortable2 renumbers ``display_order`` with ``update()`` and
+    ``bulk_update()``, which skip ``RankField.pre_save``, so re-rank the rows
+    it moved.
+    """
+
+    def _update_order(self, updated_items, extra_model_filters):
+        updated = super()._update_order(updated_items, extra_model_filters)
+        self._sync_ranks([pk for pk, _ in updated_items])
+        return updated
+
+    def _move_item(self, startorder, endorder, extra_model_filters):
+        moved = super()._move_item(startorder, endorder, extra_model_filters)
+        self._sync_ranks(list(moved))
+        return moved
+
+    def _sync_ranks(self, pks):
+        rows = list(self.model.objects.filter(pk__in=pks).only("pk", "display_order", "rank"))
+        for row in rows:
+            row.rank = initial_rank(row.display_order)
+        self.model.objects.bulk_update(rows, ["rank"])
+
+
 @admin.register(Notice)
-class NoticeAdmin(SortableAdminMixin, admin.ModelAdmin):
+class NoticeAdmin(RankedSortableAdminMixin, admin.ModelAdmin):
     list_display = ["title", "date_bs", "priority", "is_active", "display_order", "created_at"]
     list_filter = ["priority", "is_active", "created_at"]
     search_fields = ["title", "description"]
     list_editable = ["is_active"]
+    # adminsortable2 sorts by the first field and writes integers to it
     ordering = ["display_order", "-created_at"]
     readonly_fields = ["created_at", "updated_at"]
 
@@ -67,7 +96,7 @@ class FacultyAdmin(admin.ModelAdmin):
     list_filter = ["department", "is_active"]
     search_fields = ["name", "designation", "qualification"]
     list_editable = ["is_active", "display_order"]
-    ordering = ["display_order", "name"]
+    ordering = ["rank", "name"]
 
     fieldsets = (
         (
@@ -100,7 +129,7 @@ class MarqueeItemAdmin(admin.ModelAdmin):
     list_filter = ["is_new", "is_urgent", "is_active"]
     search_fields = ["text"]
     list_editable = ["is_new", "is_urgent", "is_active", "display_order"]
-    ordering = ["display_order"]
+    ordering = ["rank"]
 
 
 @admin.register(PrincipalMessage)
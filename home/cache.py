@@ -0,0 +1,230 @@
+"""
+Content-versioned caching helpers.
+
+Every model in the ``home`` app has a version counter stored in the shared
+cache. Saving or deleting a row bumps the counter for its model (see
+``home/signals.py``), so any cache key built from those versions goes stale
+on its own and never needs to be deleted explicitly.
+
+For expensive values (the homepage snapshot, cached pages) ``get_or_compute``
+adds stampede protection on top: the value lives under a stable key together
+with the version tag it was built from, so when it goes stale only one worker
+rebuilds it while the others keep serving the previous value.
+"""
+
+import hashlib
+import logging
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from django.core.cache import cache
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY_PREFIX = "content-version"
+
+
+def _version_key(model):
+    return f"{VERSION_KEY_PREFIX}:{model._meta.label_lower}"
+
+
+def _initial_version():
+    # Seeding with the clock instead of 0 means an evicted counter can never
+    # come back at a value that was already used for an older cache entry.
+    return time.time_ns() // 1000
+
+
+def get_versions(*models):
+    """Return the current version of each model, in the order given"""
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        version = found.get(key)
+        if version is None:
+            version = _initial_version()
+            if not cache.add(key, version, timeout=None):
+                version = cache.get(key, version)
+        versions.append(version)
+    return tuple(versions)
+
+
+def get_version(model):
+    """Return the current version of a single model"""
+    return get_versions(model)[0]
+
+
+def bump_version(model):
+    """Invalidate every cache entry that depends on ``model``"""
+    cache.set(_modified_key(model), time.time(), timeout=None)
+    key = _version_key(model)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def _modified_key(model):
+    return f"{VERSION_KEY_PREFIX}:{model._meta.label_lower}:modified"
+
+
+def get_last_modified(*models):
+    """Unix time of the latest save or delete on any of ``models``
+
+    Recorded by ``bump_version``, so deletions count too. A model with no
+    recorded time (e.g. after the cache was cleared) counts as modified now,
+    which can only make clients download a page again, never keep a stale one.
+    """
+    keys = [_modified_key(model) for model in models]
+    found = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in found:
+            if not cache.add(key, now, timeout=None):
+                found[key] = cache.get(key, now)
+            else:
+                found[key] = now
+    return max(found.values())
+
+
+def version_tag(*models):
+    """Short digest of the current versions of ``models``"""
+    versions = ".".join(str(version) for version in get_versions(*models))
+    return hashlib.md5(versions.encode(), usedforsecurity=False).hexdigest()
+
+
+def versioned_key(prefix, *models):
+    """Build a cache key that changes whenever any of ``models`` changes"""
+    return f"{prefix}:{version_tag(*models)}"
+
+
+# ---- stampede protection ----------------------------------------------------
+
+REFRESH_LOCK_TIMEOUT = 30
+DEFAULT_STALE_TIMEOUT = 60 * 60
+# How long a request with nothing to serve waits for another worker's rebuild
+COLD_WAIT_SECONDS = 2.0
+COLD_WAIT_INTERVAL = 0.05
+
+
+@dataclass
+class Envelope:
+    """A cached value with the version tag and timing it was built with"""
+
+    value: Any
+    tag: str
+    expires: float
+    delta: float  # seconds the last rebuild took
+
+
+def read_envelope(key):
+    envelope = cache.get(key)
+    return envelope if isinstance(envelope, Envelope) else None
+
+
+def write_envelope(key, value, tag, timeout, delta, stale_timeout=DEFAULT_STALE_TIMEOUT):
+    """Store ``value`` fresh for ``timeout`` and servable stale for ``stale_timeout`` more"""
+    envelope = Envelope(value=value, tag=tag, expires=time.time() + timeout, delta=delta)
+    cache.set(key, envelope, timeout + stale_timeout)
+    return envelope
+
+
+def is_fresh(envelope, tag, beta=1.0, now=None):
+    """Return True if ``envelope`` can be served without a rebuild
+
+    Besides the version tag and expiry, this applies probabilistic early expiry:
+    the closer an entry is to expiring, and the longer it took to build, the
+    more likely a request is to refresh it early, so rebuilds spread out
+    instead of all landing on the instant it expires.
+    """
+    if envelope.tag != tag:
+        return False
+    if now is None:
+        now = time.time()
+    early = envelope.delta * beta * -math.log(1.0 - random.random())
+    return now + early < envelope.expires
+
+
+def acquire_refresh_lock(key):
+    """Claim the right to rebuild ``key``; only one caller at a time gets True"""
+    return cache.add(f"{key}:refresh-lock", 1, REFRESH_LOCK_TIMEOUT)
+
+
+def release_refresh_lock(key):
+    cache.delete(f"{key}:refresh-lock")
+
+
+def _rebuild(key, compute, tag, timeout, stale_timeout):
+    try:
+        started = time.monotonic()
+        value = compute()
+        write_envelope(key, value, tag, timeout, time.monotonic() - started, stale_timeout)
+        return value
+    finally:
+        release_refresh_lock(key)
+
+
+def refresh_in_background(target):
+    """Run ``target`` in a daemon thread that cleans up its DB connections"""
+
+    def run():
+        try:
+            target()
+        except Exception:
+            logger.exception("Background cache refresh failed")
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def get_or_compute(
+    key,
+    compute,
+    models,
+    timeout,
+    stale_timeout=DEFAULT_STALE_TIMEOUT,
+    beta=1.0,
+    background=False,
+):
+    """Return the cached value of ``compute()``, rebuilding it at most once at a time
+
+    The value is stale once any of ``models`` changes or ``timeout`` passes
+    (possibly a little early, see ``is_fresh``). A stale value is rebuilt by the
+    single caller that wins the refresh lock, while everyone else is served the
+    stale value; with ``background=True`` the winner is served the stale value
+    too and the rebuild runs in a thread. Stale values are kept for
+    ``stale_timeout`` seconds after they expire.
+    """
+    tag = version_tag(*models)
+    envelope = read_envelope(key)
+    if envelope is not None and is_fresh(envelope, tag, beta):
+        return envelope.value
+
+    if envelope is not None:
+        if not acquire_refresh_lock(key):
+            return envelope.value
+        if background:
+            refresh_in_background(lambda: _rebuild(key, compute, tag, timeout, stale_timeout))
+            return envelope.value
+        return _rebuild(key, compute, tag, timeout, stale_timeout)
+
+    # Nothing to serve: wait briefly for a rebuild already in progress
+    if not acquire_refresh_lock(key):
+        deadline = time.monotonic() + COLD_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(COLD_WAIT_INTERVAL)
+            envelope = read_envelope(key)
+            if envelope is not None:
+                return envelope.value
+        return compute()
+    return _rebuild(key, compute, tag, timeout, stale_timeout)
@@ -0,0 +1,316 @@
+"""
+Resumable chunked uploads.
+
+Brochures, syllabi and notice PDFs can be tens of megabytes and gallery
+batches hundreds, and on the campus uplink one multipart POST of that size
+often dies halfway. Instead, a client (``static/js/chunked-upload.js``):
+
+1. ``POST /admin/uploads/`` with ``filename``, ``size`` and optionally
+   ``sha256``: starts an upload and returns its ``token``.
+2. ``PUT /admin/uploads/<token>/`` with the chunk as the raw body and its
+   position in an ``Upload-Offset`` header. The body is streamed to a temporary
+   file, then appended to ``<token>.part``. A chunk at any offset other than
+   the one expected gets 409 and the expected offset. The last chunk completes
+   the upload: the file is checksummed (and checked against ``sha256``).
+3. ``GET /admin/uploads/<token>/``: the offset to resume from after a dropped
+   connection.
+
+Forms with ``ChunkedUploadFormMixin`` then take ``<field>_upload_token`` in
+place of the file itself. Tokens only work for the user who started the
+upload. Abandoned uploads are deleted after ``CHUNKED_UPLOAD_EXPIRY_HOURS``.
+"""
+
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.datastructures import MultiValueDict
+
+from .models import ChunkedUpload
+from .uploads import staging_dir
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_MAX_CHUNK_BYTES = 8 * 1024 * 1024
+DEFAULT_EXPIRY_HOURS = 24
+# Longer than appending the largest chunk takes; a crashed writer frees it then
+WRITE_LOCK_SECONDS = 60
+READ_SIZE = 64 * 1024
+
+
+class ChunkedUploadError(Exception):
+    """Raised for requests the upload cannot accept; ``status`` is the HTTP status"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def max_upload_bytes():
+    return getattr(settings, "CHUNKED_UPLOAD_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+
+def max_chunk_bytes():
+    return getattr(settings, "CHUNKED_UPLOAD_MAX_CHUNK_BYTES", DEFAULT_MAX_CHUNK_BYTES)
+
+
+def upload_dir():
+    return os.path.join(staging_dir(), "chunked")
+
+
+def part_path(upload):
+    return os.path.join(upload_dir(), f"{upload.token}.part")
+
+
+def upload_state(upload):
+    return {
+        "token": str(upload.token),
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": upload.offset,
+        "status": upload.status,
+        "sha256": upload.sha256 if upload.status == "complete" else "",
+        "chunk_size": max_chunk_bytes(),
+    }
+
+
+def start_upload(filename, size, sha256="", user=None):
+    """Record a new upload of ``size`` bytes and create its empty part file"""
+    delete_expired_uploads()
+    filename = os.path.basename(str(filename or "").replace("\\", "/"))[:255]
+    if not filename:
+        raise ChunkedUploadError("A file name is required")
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise ChunkedUploadError("A size in bytes is required") from None
+    if not 0 < size <= max_upload_bytes():
+        raise ChunkedUploadError(f"Size must be between 1 and {max_upload_bytes()} bytes", 413)
+    sha256 = (sha256 or "").lower()
+    if sha256 and (len(sha256) != 64 or set(sha256) - set("0123456789abcdef")):
+        raise ChunkedUploadError("sha256 must be 64 hex digits")
+
+    upload = ChunkedUpload.objects.create(
+        filename=filename,
+        size=size,
+        sha256=sha256,
+        created_by=user if user and user.is_authenticated else None,
+    )
+    os.makedirs(upload_dir(), exist_ok=True)
+    open(part_path(upload), "wb").close()
+    return upload
+
+
+def get_upload(token, user):
+    """``user``'s upload ``token``; anyone else's is unknown"""
+    if user is None or not user.is_authenticated:
+        raise ChunkedUploadError("Unknown upload", 404)
+    try:
+        return ChunkedUpload.objects.get(token=uuid.UUID(str(token)), created_by=user)
+    except (ValueError, ChunkedUpload.DoesNotExist):
+        raise ChunkedUploadError("Unknown upload", 404) from None
+
+
+@contextlib.contextmanager
+def write_lock(upload):
+    """Held while a chunk is written to ``upload``'s part file, by one request at a time
+
+    Kept in the shared cache, so it holds across worker processes; raises
+    ``ChunkedUploadError`` (409) when another request has it.
+    """
+    key = f"chunked-upload:{upload.token}:write-lock"
+    if not cache.add(key, 1, WRITE_LOCK_SECONDS):
+        raise ChunkedUploadError("Another chunk is being written; try again", 409)
+    try:
+        yield
+    finally:
+        cache.delete(key)
+
+
+def _receive(stream, length):
+    """Copy ``length`` bytes of ``stream`` to a temporary file, never all in memory"""
+    received = tempfile.NamedTemporaryFile(dir=upload_dir(), suffix=".chunk", delete=False)
+    try:
+        with received:
+            remaining = length
+            while remaining:
+                data = stream.read(min(READ_SIZE, remaining))
+                if not data:
+                    raise ChunkedUploadError("The chunk ended early; send it again")
+                received.write(data)
+                remaining -= len(data)
+    except BaseException:
+        os.remove(received.name)
+        raise
+    return received.name
+
+
+def write_chunk(upload, offset, length, stream):
+    """Append ``length`` bytes read from ``stream`` at ``offset``; returns the upload"""
+    if upload.status != "uploading":
+        raise ChunkedUploadError("The upload is already complete", 409)
+    if offset != upload.offset:
+        raise ChunkedUploadError(f"Expected offset {upload.offset}", 409)
+    if not 0 < length <= max_chunk_bytes():
+        raise ChunkedUploadError(f"Chunks must be 1 to {max_chunk_bytes()} bytes", 413)
+    if offset + length > upload.size:
+        raise ChunkedUploadError("The chunk goes past the end of the file")
+
+    # Receive first, so a dropped connection leaves the part file untouched
+    chunk = _receive(stream, length)
+    try:
+        with write_lock(upload):
+            upload.refresh_from_db()
+            if offset != upload.offset:
+                raise ChunkedUploadError(f"Expected offset {upload.offset}", 409)
+            with open(part_path(upload), "r+b") as part, open(chunk, "rb") as data:
+                # Overwrites whatever a chunk that failed midway left past the offset
+                part.seek(offset)
+                shutil.copyfileobj(data, part, READ_SIZE)
+                part.truncate()
+            upload.offset = offset + length
+            upload.save(update_fields=["offset"])
+            if upload.offset == upload.size:
+                _complete(upload)
+    finally:
+        os.remove(chunk)
+    return upload
+
+
+def _complete(upload):
+    digest = hashlib.sha256()
+    with open(part_path(upload), "rb") as part:
+        for block in iter(lambda: part.read(READ_SIZE), b""):
+            digest.update(block)
+    actual = digest.hexdigest()
+    if upload.sha256 and upload.sha256 != actual:
+        # Start the file over rather than keep something corrupt
+        open(part_path(upload), "wb").close()
+        upload.offset = 0
+        upload.save(update_fields=["offset"])
+        raise ChunkedUploadError("Checksum mismatch; the upload was reset", 422)
+    upload.sha256 = actual
+    upload.status = "complete"
+    upload.completed_at = timezone.now()
+    upload.save(update_fields=["sha256", "status", "completed_at"])
+
+
+class AssembledUpload(UploadedFile):
+    """An assembled upload on local disk
+
+    Like ``TemporaryUploadedFile`` it has ``temporary_file_path()``, so image
+    validation reads it from disk and ``FileSystemStorage`` moves it into place
+    instead of copying it.
+    """
+
+    def __init__(self, path, name, size):
+        super().__init__(open(path, "rb"), name, size=size)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def open_completed_upload(token, user):
+    """The assembled file of ``user``'s complete upload, as an ``UploadedFile`` for a form"""
+    upload = get_upload(token, user)
+    if upload.status != "complete":
+        raise ChunkedUploadError(f"{upload.filename} has not finished uploading")
+    return upload, AssembledUpload(part_path(upload), upload.filename, upload.size)
+
+
+def discard_upload(upload):
+    try:
+        os.remove(part_path(upload))
+    except FileNotFoundError:
+        pass
+    upload.delete()
+
+
+def delete_expired_uploads():
+    hours = getattr(settings, "CHUNKED_UPLOAD_EXPIRY_HOURS", DEFAULT_EXPIRY_HOURS)
+    cutoff = timezone.now() - timedelta(hours=hours)
+    expired = list(ChunkedUpload.objects.filter(created_at__lt=cutoff))
+    for upload in expired:
+        discard_upload(upload)
+    return len(expired)
+
+
+class ChunkedUploadFormMixin:
+    """Lets a form take ``<field>_upload_token`` in place of the file ``<field>``
+
+    List the file fields in ``chunked_upload_fields`` and pass the requesting
+    ``user``, whose uploads the tokens must be. The assembled file goes
+    through the field's usual validation; once it is saved, call
+    ``discard_chunked_uploads()`` (``save()`` does so unless ``commit=False``).
+    A form that fails validation closes the files, keeping the uploads for
+    the next attempt.
+    """
+
+    chunked_upload_fields = ()
+
+    def __init__(self, data=None, files=None, *args, user=None, **kwargs):
+        self._chunked_uploads = []
+        self._chunked_upload_files = []
+        self._chunked_upload_errors = {}
+        if data is not None:
+            if isinstance(files, MultiValueDict):
+                files = files.copy()
+            else:
+                files = MultiValueDict({key: [file] for key, file in (files or {}).items()})
+            for field_name in self.chunked_upload_fields:
+                key = f"{field_name}_upload_token"
+                tokens = data.getlist(key) if hasattr(data, "getlist") else [data.get(key)]
+                tokens = [token for token in tokens if token]
+                if not tokens or files.get(field_name):
+                    continue
+                try:
+                    opened = []
+                    for token in tokens:
+                        opened.append(open_completed_upload(token, user))
+                except ChunkedUploadError as error:
+                    for _, file in opened:
+                        file.close()
+                    self._chunked_upload_errors[field_name] = str(error)
+                    continue
+                self._chunked_uploads += [upload for upload, _ in opened]
+                self._chunked_upload_files += [file for _, file in opened]
+                files.setlist(field_name, [file for _, file in opened])
+        super().__init__(data, files, *args, **kwargs)
+        # Picked up by static/js/chunked-upload.js
+        for field_name in self.chunked_upload_fields:
+            self.fields[field_name].widget.attrs["data-chunked-upload"] = reverse(
+                "home:chunked_upload_start"
+            )
+
+    def full_clean(self):
+        super().full_clean()
+        for field_name, message in self._chunked_upload_errors.items():
+            self.add_error(field_name, message)
+        if self._errors:
+            self._close_chunked_upload_files()
+
+    def save(self, commit=True):
+        instance = super().save(commit)
+        if commit:
+            self.discard_chunked_uploads()
+        return instance
+
+    def _close_chunked_upload_files(self):
+        for file in self._chunked_upload_files:
+            file.close()
+        self._chunked_upload_files = []
+
+    def discard_chunked_uploads(self):
+        self._close_chunked_upload_files()
+        for upload in self._chunked_uploads:
+            discard_upload(upload)
+        self._chunked_uploads = []
@@ -1,12 +1,70 @@
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .cache import versioned_key
 from .models import ContactInfo, Program, SiteConfiguration, SiteLogo, FooterLink
 
+SITE_CONTEXT_TIMEOUT = 60 * 60 * 24
+
+# Each context key, the model its cache entry depends on, and how to load it
+SITE_CONTEXT_LOADERS = {
+    "site_config": (
+        SiteConfiguration,
+        lambda: SiteConfiguration.objects.filter(is_active=True).first(),
+    ),
+    "contact_info": (
+        ContactInfo,
+        lambda: ContactInfo.objects.filter(is_active=True).first(),
+    ),
+    "site_logo": (
+        SiteLogo,
+        lambda: SiteLogo.objects.filter(is_active=True).first(),
+    ),
+    "all_programs": (
+        Program,
+        lambda: list(Program.objects.filter(is_active=True).order_by("display_order")),
+    ),
+    "footer_links": (
+        FooterLink,
+        lambda: list(FooterLink.objects.all()),
+    ),
+}
+SITE_CONTEXT_MODELS = tuple(model for model, _ in SITE_CONTEXT_LOADERS.values())
+
+# Sentinel so a cached ``None`` (e.g. no active logo) still counts as a hit
+_MISSING = object()
+
+
+def load_site_value(name):
+    """Return one site context value, from the cache when its model is unchanged"""
+    model, loader = SITE_CONTEXT_LOADERS[name]
+    key = versioned_key(f"site-context:{name}", model)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        value = loader()
+        cache.set(key, value, SITE_CONTEXT_TIMEOUT)
+    return value
+
+
+def _lazy_site_value(request, name):
+    def evaluate():
+        used = getattr(request, "site_context_used", None)
+        if used is not None:
+            used.add(name)
+        return load_site_value(name)
+
+    return SimpleLazyObject(evaluate)
+
 
 def site_context(request):
-    """Add global site configuration, contact info, site logo, and programs"""
-    return {
-        "site_config": SiteConfiguration.objects.filter(is_active=True).first(),
-        "contact_info": ContactInfo.objects.filter(is_active=True).first(),
-        "site_logo": SiteLogo.objects.filter(is_active=True).first(),
-        "all_programs": Program.objects.filter(is_active=True).order_by("display_order"),
-        "footer_links": FooterLink.objects.all(),
-    }
+    """Add global site configuration, contact info, site logo, and programs
+
+    Values are lazy: nothing is fetched until a template first touches a key,
+    and each key is fetched at most once per request.
+    """
+    context = getattr(request, "_site_context", None)
+    if context is None:
+        request.site_context_used = set()
+        context = {name: _lazy_site_value(request, name) for name in SITE_CONTEXT_LOADERS}
+        request._site_context = context
+    return context
@@ -0,0 +1,164 @@
+"""
+Chunked deletion that also cleans up uploaded files.
+
+``QuerySet.delete()`` loads every row it will delete, cascades included, into
+memory to send their signals: deleting an album of thousands of photos takes
+a while and a lot of memory. And it leaves their files in storage for good.
+
+``delete_queryset`` instead works through the rows ``CHUNK_SIZE`` primary keys
+at a time: it deletes each chunk's ``CASCADE`` children the same way (and
+clears ``SET_NULL`` references), notes the chunk's file names, deletes the
+chunk with a plain ``DELETE ... WHERE id IN (...)``, and invalidates cached
+pages once per model at the end. Memory use does not grow with the number of
+rows.
+
+The file names go to the ``remove_unreferenced_files`` task in batches. Tasks
+enqueued in a transaction only run once it commits, so a rolled back delete
+keeps its files. A file is removed only when no row refers to it any more
+(the gallery's "copy" makes several images share one file), together with
+its derivatives. Files modified within ``FILE_DELETE_GRACE_SECONDS`` are
+checked again once it has passed: an identical upload reuses (and touches)
+a stored file before its row is committed, the same reason ``media_gc``
+skips recent files.
+"""
+
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import ImageDerivative
+from .signals import UNTRACKED_MODELS, content_changed
+from .tasks import enqueue, task
+
+CHUNK_SIZE = 500
+FILE_BATCH_SIZE = 200
+DEFAULT_FILE_DELETE_GRACE_SECONDS = 3600
+
+
+def file_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, models.FileField)]
+
+
+def _relations(model):
+    """``(related model, field name, on_delete)`` of rows that point at ``model``
+
+    None if deleting ``model`` needs the full collector (many-to-many fields,
+    generic relations, inheritance, or ``on_delete`` other than CASCADE,
+    SET_NULL and DO_NOTHING).
+    """
+    meta = model._meta
+    if meta.many_to_many or meta.private_fields or meta.parents:
+        return None
+    relations = []
+    # Hidden ones too (related_name="+"), as Django's own collector does
+    for relation in meta.get_fields(include_hidden=True):
+        if not relation.auto_created or relation.concrete:
+            continue
+        if relation.many_to_many or relation.on_delete not in (
+            models.CASCADE,
+            models.SET_NULL,
+            models.DO_NOTHING,
+        ):
+            return None
+        relations.append((relation.related_model, relation.field.name, relation.on_delete))
+    return relations
+
+
+def _remove_files_later(model, pks):
+    names = set()
+    for field in file_fields(model):
+        names.update(
+            model._base_manager.filter(pk__in=pks)
+            .exclude(**{field.name: ""})
+            .values_list(field.name, flat=True)
+        )
+    names = sorted(name for name in names if name)
+    for start in range(0, len(names), FILE_BATCH_SIZE):
+        remove_unreferenced_files.delay(names[start : start + FILE_BATCH_SIZE])
+
+
+def _delete_chunk(model, pks, changed):
+    relations = _relations(model)
+    _remove_files_later(model, pks)
+    rows = model._base_manager.filter(pk__in=pks)
+    if relations is None:
+        # Cascades this module cannot follow: let Django collect this chunk
+        return rows.delete()[1].get(model._meta.label, 0)
+
+    for related_model, field_name, on_delete in relations:
+        related = related_model._base_manager.filter(**{f"{field_name}__in": pks})
+        if on_delete is models.CASCADE:
+            _delete_rows(related, changed)
+        elif on_delete is models.SET_NULL:
+            if related.update(**{field_name: None}):
+                changed.add(related_model)
+    changed.add(model)
+    # The children are gone, so a plain DELETE is all that is left; it sends
+    # no signals, which is why callers get one content_changed() per model
+    return rows._raw_delete(rows.db)
+
+
+def _delete_rows(queryset, changed):
+    deleted = 0
+    queryset = queryset.order_by("pk")
+    while True:
+        pks = list(queryset.values_list("pk", flat=True)[:CHUNK_SIZE])
+        if not pks:
+            return deleted
+        deleted += _delete_chunk(queryset.model, pks, changed)
+
+
+def delete_queryset(queryset):
+    """Delete ``queryset`` and what cascades from it in chunks; returns rows of its model deleted"""
+    changed = set()
+    with transaction.atomic():
+        deleted = _delete_rows(queryset, changed)
+        for model in changed:
+            if model not in UNTRACKED_MODELS:
+                content_changed(model)
+    return deleted
+
+
+def _referenced(names):
+    referenced = set()
+    for model in apps.get_app_config("home").get_models():
+        for field in file_fields(model):
+            referenced.update(
+                model._base_manager.filter(**{f"{field.name}__in": names}).values_list(
+                    field.name, flat=True
+                )
+            )
+    return referenced
+
+
+@task
+def remove_unreferenced_files(names):
+    """Delete the stored files ``names`` that no row refers to, and their derivatives
+
+    Recently modified files are queued again for when the grace period ends.
+    """
+    orphans = sorted(set(names) - _referenced(names))
+    grace = timedelta(
+        seconds=getattr(settings, "FILE_DELETE_GRACE_SECONDS", DEFAULT_FILE_DELETE_GRACE_SECONDS)
+    )
+    cutoff = timezone.now() - grace
+    recent = {}
+    for name in orphans:
+        try:
+            modified = default_storage.get_modified_time(name)
+        except (NotImplementedError, OSError):
+            continue
+        if modified > cutoff:
+            recent[name] = modified
+    if recent:
+        enqueue(remove_unreferenced_files, [sorted(recent)], run_at=max(recent.values()) + grace)
+        orphans = [name for name in orphans if name not in recent]
+    derivatives = ImageDerivative.objects.filter(source_name__in=orphans)
+    for name in list(derivatives.values_list("file", flat=True)) + orphans:
+        default_storage.delete(name)
+    derivatives.delete()
+    return len(orphans)
@@ -0,0 +1,218 @@
+"""
+Edge (CDN / reverse proxy) caching for public pages.
+
+Responses that ``cache_public_page`` may share get ``Cache-Control`` with
+``s-maxage`` and ``stale-while-revalidate`` plus a ``Surrogate-Key`` header
+naming the content they show: one key per model the page lists (``notice``),
+one per row a detail page is about (``notice-42``, ``program-BIT``) and
+``site-chrome`` for the models behind ``base.html``. Saving or deleting rows
+purges their keys through the purger named by ``EDGE_PURGER``, in one call
+once the transaction commits. Purgers that call out over the network run
+from the task queue (``purge_edge``), so a save never waits on the edge.
+
+The proxy must bypass its cache for requests carrying the session cookie, as
+``LocalEdgeProxy`` does; logged-in responses are marked private regardless.
+"""
+
+import functools
+import time
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.cache import patch_cache_control
+from django.utils.module_loading import import_string
+
+from .context_processors import SITE_CONTEXT_MODELS
+from .tasks import task
+
+SITE_CHROME_KEY = "site-chrome"
+
+# Rows are named by this field instead of their pk
+SURROGATE_KEY_FIELDS = {"program": "code"}
+
+
+def collection_key(model):
+    return model._meta.model_name
+
+
+def surrogate_key(instance):
+    """Key naming one row, e.g. ``notice-42`` or ``program-BIT``"""
+    model_name = instance._meta.model_name
+    value = getattr(instance, SURROGATE_KEY_FIELDS.get(model_name, "pk"))
+    return f"{model_name}-{value}"
+
+
+def page_surrogate_keys(models):
+    """Keys for a page that renders ``models`` (the site chrome included)"""
+    return {
+        SITE_CHROME_KEY if model in SITE_CONTEXT_MODELS else collection_key(model)
+        for model in models
+    }
+
+
+def purge_keys(model, instance=None):
+    """Keys to purge after ``instance`` (or any row of ``model``) changed"""
+    keys = page_surrogate_keys([model])
+    if instance is not None and instance.pk is not None:
+        keys.add(surrogate_key(instance))
+    return keys
+
+
+def add_surrogate_keys(request, *keys):
+    """Tag the response to ``request`` with more keys, e.g. the row a detail page shows"""
+    if not hasattr(request, "surrogate_keys"):
+        request.surrogate_keys = set()
+    request.surrogate_keys.update(keys)
+
+
+def patch_edge_cache_control(response):
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=0,
+        s_maxage=settings.EDGE_CACHE_SECONDS,
+        stale_while_revalidate=settings.EDGE_STALE_WHILE_REVALIDATE_SECONDS,
+    )
+
+
+def set_edge_headers(response, keys):
+    patch_edge_cache_control(response)
+    response["Surrogate-Key"] = " ".join(sorted(keys))
+
+
+# ---- purgers ----------------------------------------------------------------
+
+
+class BasePurger:
+    # Purge from the task queue instead of the request that made the change
+    queued = False
+
+    def purge(self, keys):
+        raise NotImplementedError
+
+
+class NullPurger(BasePurger):
+    """Purger for deployments without an edge cache"""
+
+    def purge(self, keys):
+        pass
+
+
+class HTTPPurger(BasePurger):
+    """Send ``PURGE`` with a ``Surrogate-Key`` header to ``EDGE_PURGE_URL``
+
+    This is what Varnish (with xkey) and most CDNs' key-purge endpoints expect.
+    Purges run from the task queue, and a failed one raises so it is retried;
+    the page expires after ``s-maxage`` anyway.
+    """
+
+    queued = True
+    timeout = 5
+
+    def __init__(self):
+        self.url = settings.EDGE_PURGE_URL
+        if urllib.parse.urlsplit(self.url).scheme not in ("http", "https"):
+            raise ImproperlyConfigured("HTTPPurger needs EDGE_PURGE_URL set to an http(s) URL")
+
+    def purge(self, keys):
+        if not keys:
+            return
+        request = urllib.request.Request(
+            self.url,
+            method="PURGE",
+            headers={"Surrogate-Key": " ".join(sorted(keys))},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def _s_maxage(response):
+    for directive in response.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name.lower() == "s-maxage" and value.isdigit():
+            return int(value)
+    return 0
+
+
+class LocalEdgeProxy(BasePurger):
+    """In-process stand-in for the edge cache, for tests and local checks
+
+    ``get(path)`` behaves like a shared cache in front of the site: it serves
+    its stored copy while ``s-maxage`` lasts and forwards everything else
+    through a Django test client (``client``, which may be logged in).
+    ``purge`` drops every copy tagged with one of the keys, as the real proxy
+    would.
+    """
+
+    def __init__(self, client=None):
+        self._client = client
+        self.entries = {}  # path -> (expires, keys, response)
+        self.purged = []
+
+    @property
+    def client(self):
+        if self._client is None:
+            from django.test import Client
+
+            self._client = Client()
+        return self._client
+
+    def get(self, path, **extra):
+        # Visitors with a session always go to the origin
+        bypass = settings.SESSION_COOKIE_NAME in self.client.cookies
+        entry = self.entries.get(path)
+        if not bypass and entry is not None and entry[0] > time.time():
+            response = entry[2]
+            response["X-Edge-Cache"] = "hit"
+            return response
+
+        response = self.client.get(path, **extra)
+        max_age = _s_maxage(response)
+        if not bypass and response.status_code == 200 and max_age:
+            keys = set(response.get("Surrogate-Key", "").split())
+            self.entries[path] = (time.time() + max_age, keys, response)
+        response["X-Edge-Cache"] = "bypass" if bypass else "miss"
+        return response
+
+    def purge(self, keys):
+        keys = set(keys)
+        self.purged.append(keys)
+        for path, (_, entry_keys, _) in list(self.entries.items()):
+            if entry_keys & keys:
+                del self.entries[path]
+
+
+@functools.lru_cache(maxsize=None)
+def _load_purger(path):
+    return import_string(path)()
+
+
+def get_purger():
+    """The configured purger; one instance per process"""
+    return _load_purger(settings.EDGE_PURGER)
+
+
+@receiver(setting_changed)
+def _reset_purger(setting, **kwargs):
+    if setting == "EDGE_PURGER":
+        _load_purger.cache_clear()
+
+
+@task(max_attempts=3)
+def purge_edge(keys):
+    get_purger().purge(set(keys))
+
+
+def request_purge(keys):
+    """Purge ``keys`` from the edge: now, or from the task queue for queued purgers"""
+    if not keys:
+        return
+    purger = get_purger()
+    if purger.queued:
+        purge_edge.delay(sorted(keys))
+    else:
+        purger.purge(keys)
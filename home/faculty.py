@@ -0,0 +1,29 @@
+"""
+Faculty grouping shared by the homepage, the public faculty page and the
+admin faculty list.
+"""
+
+from collections import defaultdict
+
+from .models import Faculty
+
+
+def group_faculty_by_tab(tabs, active_only=True):
+    """Return ``{tab.slug: [faculty, ...]}`` for ``tabs`` using a single query
+
+    Faculty are matched to a tab by ``Faculty.department == tab.department_filter``
+    and keep their ``rank, name`` ordering within each tab. Tabs with no
+    matching faculty get an empty list.
+    """
+    tabs = list(tabs)
+    members = Faculty.objects.filter(
+        department__in={tab.department_filter for tab in tabs}
+    ).order_by("rank", "name")
+    if active_only:
+        members = members.filter(is_active=True)
+
+    by_department = defaultdict(list)
+    for member in members:
+        by_department[member.department].append(member)
+
+    return {tab.slug: list(by_department[tab.department_filter]) for tab in tabs}
@@ -1,5 +1,8 @@
+import zipfile
+
 from django import forms
 
+from .chunked_uploads import ChunkedUploadFormMixin
 from .models import (
     AboutSection,
     CareerProspect,
@@ -26,7 +29,9 @@ from .models import (
 )
 
 
-class NoticeForm(forms.ModelForm):
+class NoticeForm(ChunkedUploadFormMixin, forms.ModelForm):
+    chunked_upload_fields = ("image", "file")
+
     class Meta:
         model = Notice
         fields = [
@@ -452,7 +457,9 @@ class CurriculumForm(forms.ModelForm):
         }
 
 
-class CurriculumSemesterForm(forms.ModelForm):
+class CurriculumSemesterForm(ChunkedUploadFormMixin, forms.ModelForm):
+    chunked_upload_fields = ("syllabus_file",)
+
     class Meta:
         model = CurriculumSemester
         fields = ["semester_number", "description", "syllabus_file", "display_order"]
@@ -524,7 +531,9 @@ class CareerProspectForm(forms.ModelForm):
         }
 
 
-class ProgramForm(forms.ModelForm):
+class ProgramForm(ChunkedUploadFormMixin, forms.ModelForm):
+    chunked_upload_fields = ("image", "brochure")
+
     class Meta:
         model = Program
         fields = [
@@ -825,7 +834,31 @@ class MultipleFileInput(forms.ClearableFileInput):
         return None
 
 
-class GalleryImageForm(forms.ModelForm):
+class AlbumImportForm(ChunkedUploadFormMixin, forms.Form):
+    chunked_upload_fields = ("archive",)
+
+    archive = forms.FileField(
+        label="ZIP archive of photos",
+        widget=forms.FileInput(attrs={"class": "form-input", "accept": ".zip"}),
+    )
+
+    def clean_archive(self):
+        from .uploads import check_archive_size
+
+        archive = self.cleaned_data["archive"]
+        if not zipfile.is_zipfile(archive):
+            raise forms.ValidationError("Please upload a ZIP archive.")
+        try:
+            check_archive_size(zipfile.ZipFile(archive))
+        except (ValueError, zipfile.BadZipFile) as error:
+            raise forms.ValidationError(str(error))
+        archive.seek(0)
+        return archive
+
+
+class GalleryImageForm(ChunkedUploadFormMixin, forms.ModelForm):
+    chunked_upload_fields = ("image",)
+
     class Meta:
         model = GalleryImage
         fields = ["album", "caption", "image", "is_spotlight", "is_cover", "display_order"]
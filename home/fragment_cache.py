@@ -0,0 +1,68 @@
+"""
+Template fragment cache keyed on content versions.
+
+``{% cache_on Program FooterLink %}...{% endcache_on %}`` (from the
+``cache_tags`` library) stores the rendered block under a key built from the
+content versions of the models it names, so the block is re-rendered as soon as
+one of them is saved or deleted and never needs a hand-tuned TTL. Anything
+after ``vary`` is resolved against the context and mixed into the key::
+
+    {% cache_on Faculty FacultyTab vary tab.slug %}...{% endcache_on %}
+
+With ``FRAGMENT_CACHE_DEBUG`` on, every lookup is counted per template and
+``fragment_cache_report()`` gives the hit rates (staff can see them at
+``admin/fragment-cache-stats/``).
+"""
+
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .cache import versioned_key
+
+logger = logging.getLogger(__name__)
+
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# template name -> Counter of hits and misses, per process
+_fragment_stats = defaultdict(Counter)
+_fragment_stats_lock = threading.Lock()
+
+
+def fragment_cache_key(template_name, lineno, models, vary_values=()):
+    """Key for the fragment starting at ``lineno`` of ``template_name``"""
+    source = "|".join([template_name, str(lineno), *(str(value) for value in vary_values)])
+    digest = hashlib.md5(source.encode(), usedforsecurity=False).hexdigest()
+    return versioned_key(f"fragment:{digest}", *models)
+
+
+def fragment_cache_debug():
+    return getattr(settings, "FRAGMENT_CACHE_DEBUG", False)
+
+
+def record_fragment_lookup(template_name, hit):
+    with _fragment_stats_lock:
+        _fragment_stats[template_name]["hits" if hit else "misses"] += 1
+    logger.debug("fragment cache %s in %s", "hit" if hit else "miss", template_name)
+
+
+def fragment_cache_report():
+    """Return, per template, fragment hits, misses and hit rate in this process"""
+    report = {}
+    with _fragment_stats_lock:
+        for template_name, counts in sorted(_fragment_stats.items()):
+            lookups = counts["hits"] + counts["misses"]
+            report[template_name] = {
+                "hits": counts["hits"],
+                "misses": counts["misses"],
+                "hit_rate": round(counts["hits"] / lookups, 3) if lookups else None,
+            }
+    return report
+
+
+def reset_fragment_cache_stats():
+    with _fragment_stats_lock:
+        _fragment_stats.clear()
@@ -0,0 +1,108 @@
+"""
+Bulk copy, move and delete of gallery images, for ``gallery_bulk_action``.
+
+Each runs in one transaction and works through the selection in chunks of
+``CHUNK_SIZE`` rows: a copy is one ``bulk_create`` per chunk instead of a
+``create()`` per image, a move one ``UPDATE`` per chunk, and nothing is
+counted up front. Copied and moved images go after the target album's last
+image, keeping their order. A copy points at the same stored file as its
+original, so it shares its derivatives too; deleting goes through
+``home.deletion``, which removes a file only once no image uses it.
+"""
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Value
+from django.db.models.functions import Concat, Length
+
+from .deletion import delete_queryset
+from .models import GalleryImage
+from .ordering import DEFAULT_REBALANCE_LENGTH, rebalance_ranks
+from .ranking import WIDTH, bucket_prefix
+from .signals import content_changed
+
+CHUNK_SIZE = 500
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start : start + CHUNK_SIZE]
+
+
+def _selected(ids, *fields):
+    """Field values of the selected images, in gallery order"""
+    rows = []
+    for chunk in _chunks(ids):
+        rows += GalleryImage.objects.filter(pk__in=chunk).values("pk", "rank", "created_at", *fields)
+    # The model's ordering: rank, then newest first
+    rows.sort(key=lambda row: row["created_at"], reverse=True)
+    rows.sort(key=lambda row: row["rank"])
+    return rows
+
+
+def _next_order(album):
+    highest = GalleryImage.objects.filter(album=album).aggregate(Max("display_order"))
+    return (highest["display_order__max"] or 0) + 1
+
+
+def _longest_rank(images):
+    return images.aggregate(longest=Max(Length("rank")))["longest"] or 0
+
+
+def copy_images(ids, album):
+    """Copy the images ``ids`` to the end of ``album``; returns how many were copied"""
+    with transaction.atomic():
+        rows = _selected(ids, "image", "caption", "is_spotlight")
+        start = _next_order(album)
+        copies = [
+            GalleryImage(
+                album=album,
+                image=row["image"],
+                caption=row["caption"],
+                is_spotlight=row["is_spotlight"],
+                is_cover=False,
+                display_order=start + index,
+            )
+            for index, row in enumerate(rows)
+        ]
+        GalleryImage.objects.bulk_create(copies, batch_size=CHUNK_SIZE)
+        if copies:
+            # bulk_create() skips post_save, so invalidate cached pages explicitly
+            content_changed(GalleryImage)
+    return len(copies)
+
+
+def move_images(ids, album):
+    """Move the images ``ids`` to the end of ``album``; returns how many were moved"""
+    moved = 0
+    with transaction.atomic():
+        # Make room for the prefix first if a rank is near the column's length
+        room = GalleryImage._meta.get_field("rank").max_length - WIDTH
+        selection = [GalleryImage.objects.filter(pk__in=chunk) for chunk in _chunks(ids)]
+        if any(_longest_rank(images) > room for images in selection):
+            rebalance_ranks(GalleryImage._meta.label)
+        start = _next_order(album)
+        # All moved images share display_order ``start``; prefixing their old
+        # ranks with its bucket keeps their order without a value per row
+        for images in selection:
+            moved += images.update(
+                album=album,
+                display_order=start,
+                rank=Concat(Value(bucket_prefix(start)), "rank"),
+            )
+        if moved:
+            content_changed(GalleryImage)
+            limit = getattr(settings, "RANK_REBALANCE_LENGTH", DEFAULT_REBALANCE_LENGTH)
+            if _longest_rank(GalleryImage.objects.filter(album=album)) >= limit:
+                rebalance_ranks.delay(GalleryImage._meta.label)
+    return moved
+
+
+def delete_images(ids):
+    """Delete the images ``ids`` and, once unused, their files; returns how many were deleted"""
+    deleted = 0
+    with transaction.atomic():
+        for chunk in _chunks(ids):
+            deleted += delete_queryset(GalleryImage.objects.filter(pk__in=chunk))
+    return deleted
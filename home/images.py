@@ -0,0 +1,193 @@
+"""
+Responsive image derivatives.
+
+Uploads are often phone photos of several megabytes that end up in tiles a few
+hundred pixels wide. When a model with an image field is saved with a new
+file, the ``render_derivatives`` task renders the original with Pillow at every
+width in ``IMAGE_DERIVATIVE_WIDTHS`` (capped at its own width) in WebP and JPEG,
+stored under ``derivatives/`` and recorded as ``ImageDerivative`` rows keyed by
+the original's storage name. The
+``{% responsive_image %}`` tag (``image_tags`` library) turns those rows into
+``srcset``/``sizes``; images without derivatives fall back to the on-demand
+resizer in ``home.resize``.
+
+``manage.py generate_image_derivatives`` backfills existing uploads.
+"""
+
+import hashlib
+import io
+import logging
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from PIL import Image, ImageOps
+
+from .cache import bump_version, versioned_key
+from .models import (
+    Faculty,
+    GalleryImage,
+    HeroSection,
+    ImageDerivative,
+    ImageSlideshow,
+    PrincipalMessage,
+    Program,
+)
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (320, 640, 1024, 1600)
+DEFAULT_QUALITY = 80
+DERIVATIVES_TIMEOUT = 60 * 60 * 24
+
+# format -> (Pillow format, file extension)
+FORMATS = {
+    "webp": ("WEBP", "webp"),
+    "jpeg": ("JPEG", "jpg"),
+}
+
+# Image fields that get derivatives, per model
+IMAGE_FIELDS = {
+    GalleryImage: ("image",),
+    Faculty: ("photo",),
+    HeroSection: ("background_image",),
+    Program: ("image",),
+    ImageSlideshow: ("image",),
+    PrincipalMessage: ("photo",),
+}
+
+
+def derivative_widths():
+    return getattr(settings, "IMAGE_DERIVATIVE_WIDTHS", DEFAULT_WIDTHS)
+
+
+def derivative_name(source_name, width, extension):
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    # Uploads in different folders may share a file name
+    digest = hashlib.md5(source_name.encode(), usedforsecurity=False).hexdigest()[:8]
+    return f"derivatives/{stem}-{digest}-{width}w.{extension}"
+
+
+def _open_source(field_file):
+    field_file.open("rb")
+    try:
+        image = Image.open(field_file)
+        image.load()
+    finally:
+        field_file.close()
+    # Phone photos are often stored sideways with an EXIF rotation flag
+    return ImageOps.exif_transpose(image)
+
+
+def _encode(image, pil_format, quality):
+    has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+    if pil_format == "JPEG":
+        image = image.convert("RGB")
+    elif image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def generate_derivatives(field_file, force=False):
+    """Render, store and record the derivatives of ``field_file``
+
+    Does nothing if the original already has derivatives, unless ``force`` is
+    set, in which case the old ones are replaced. Returns the new rows.
+    """
+    source_name = field_file.name
+    existing = ImageDerivative.objects.filter(source_name=source_name)
+    if existing.exists() and not force:
+        return []
+
+    image = _open_source(field_file)
+    quality = getattr(settings, "IMAGE_DERIVATIVE_QUALITY", DEFAULT_QUALITY)
+    storage = field_file.storage
+    rows = []
+    for width in sorted({min(width, image.width) for width in derivative_widths()}):
+        height = max(1, round(image.height * width / image.width))
+        resized = image
+        if width != image.width:
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for format, (pil_format, extension) in FORMATS.items():
+            data = _encode(resized, pil_format, quality)
+            name = storage.save(
+                derivative_name(source_name, width, extension), ContentFile(data)
+            )
+            rows.append(
+                ImageDerivative(
+                    source_name=source_name,
+                    file=name,
+                    format=format,
+                    width=width,
+                    height=height,
+                    size=len(data),
+                )
+            )
+
+    old_files = [derivative.file for derivative in existing]
+    try:
+        with transaction.atomic():
+            existing.delete()
+            ImageDerivative.objects.bulk_create(rows)
+    except IntegrityError:
+        # Another save of the same file recorded its derivatives first; renders
+        # of the same bytes are the same, so theirs will do
+        logger.info("Derivatives of %s were generated concurrently", source_name)
+        return []
+    kept = {row.file.name for row in rows}
+    for old_file in old_files:
+        # Content-addressed storage gives identical renders the same name
+        if old_file.name not in kept:
+            old_file.delete(save=False)
+    bump_version(ImageDerivative)
+    return rows
+
+
+def generate_for_instance(instance, force=False):
+    """Generate derivatives for every image field of ``instance``
+
+    A file Pillow cannot read is logged and skipped, so one bad upload never
+    fails the task or import that renders it.
+    """
+    rows = []
+    for field_name in IMAGE_FIELDS.get(type(instance), ()):
+        field_file = getattr(instance, field_name)
+        if not field_file:
+            continue
+        if not field_file.storage.exists(field_file.name):
+            logger.warning("Image %s is missing from storage", field_file.name)
+            continue
+        try:
+            rows += generate_derivatives(field_file, force=force)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            logger.exception("Could not generate derivatives for %s", field_file.name)
+    return rows
+
+
+@task
+def render_derivatives(label, pk):
+    """Generate the derivatives of one row's images, queued when it is saved"""
+    instance = apps.get_model(label)._base_manager.filter(pk=pk).first()
+    if instance is None:
+        return 0
+    return len(generate_for_instance(instance))
+
+
+def get_derivatives(source_name):
+    """``(format, width, url)`` for each derivative of ``source_name``, cached"""
+    digest = hashlib.md5(source_name.encode(), usedforsecurity=False).hexdigest()
+    key = versioned_key(f"image-derivatives:{digest}", ImageDerivative)
+    derivatives = cache.get(key)
+    if derivatives is None:
+        derivatives = [
+            (derivative.format, derivative.width, derivative.file.url)
+            for derivative in ImageDerivative.objects.filter(source_name=source_name)
+        ]
+        cache.set(key, derivatives, DERIVATIVES_TIMEOUT)
+    return derivatives
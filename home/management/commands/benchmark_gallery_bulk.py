@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from home.gallery_actions import CHUNK_SIZE, copy_images, delete_images, move_images
+from home.models import GalleryAlbum, GalleryImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Time bulk copy, move and delete of gallery images on the configured database "
+        "(set DATABASE_URL to compare SQLite and MySQL). Uses throwaway albums."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--images", type=int, default=10000, help="Images per run")
+        parser.add_argument(
+            "--legacy",
+            action="store_true",
+            help="Also time copying with one create() per image, as the view used to",
+        )
+
+    def timed(self, label, func, *args):
+        started = time.perf_counter()
+        count = func(*args)
+        seconds = time.perf_counter() - started
+        self.stdout.write(f"{label}: {count} images in {seconds:.2f}s ({count / seconds:.0f}/s)")
+
+    def legacy_copy(self, ids, album):
+        count = 0
+        for image in GalleryImage.objects.filter(pk__in=ids):
+            GalleryImage.objects.create(
+                album=album,
+                image=image.image,
+                caption=image.caption,
+                is_spotlight=image.is_spotlight,
+                is_cover=False,
+                display_order=image.display_order,
+            )
+            count += 1
+        return count
+
+    def handle(self, *args, **options):
+        count = options["images"]
+        self.stdout.write(
+            f"Database: {connection.vendor}, {count} images, chunks of {CHUNK_SIZE}"
+        )
+        source = GalleryAlbum.objects.create(title="Benchmark source")
+        target = GalleryAlbum.objects.create(title="Benchmark target")
+        try:
+            # The rows only need a file name, not a file
+            GalleryImage.objects.bulk_create(
+                [
+                    GalleryImage(album=source, image=f"gallery/benchmark-{n}.jpg", display_order=n)
+                    for n in range(count)
+                ],
+                batch_size=CHUNK_SIZE,
+            )
+            ids = list(source.images.values_list("pk", flat=True))
+
+            if options["legacy"]:
+                self.timed("copy (per image)", self.legacy_copy, ids, target)
+                target.images.all().delete()
+            self.timed("copy", copy_images, ids, target)
+            self.timed("move", move_images, ids, target)
+            self.timed("delete", delete_images, list(target.images.values_list("pk", flat=True)))
+        finally:
+            GalleryImage.objects.filter(album__in=[source, target]).delete()
+            source.delete()
+            target.delete()
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from home.models import Task
+from home.tasks import Worker, noop
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure task queue throughput on the configured database "
+        "(set DATABASE_URL to compare SQLite and MySQL)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tasks", type=int, default=1000, help="Tasks per run")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 4, 8],
+            help="Worker thread counts to measure",
+        )
+
+    def handle(self, *args, **options):
+        count = options["tasks"]
+        self.stdout.write(f"Database: {connection.vendor}, {count} no-op tasks per run")
+        for concurrency in options["concurrency"]:
+            Task.objects.filter(name=noop.task_name).delete()
+
+            started = time.perf_counter()
+            for number in range(count):
+                noop.delay(number)
+            enqueue_seconds = time.perf_counter() - started
+
+            # Only the benchmark's own tasks: real queued jobs are left for run_worker
+            worker = Worker(
+                concurrency=concurrency, poll_interval=0.05, burst=True, names=[noop.task_name]
+            )
+            started = time.perf_counter()
+            worker.run()
+            run_seconds = time.perf_counter() - started
+
+            done = Task.objects.filter(name=noop.task_name, status="done").count()
+            Task.objects.filter(name=noop.task_name).delete()
+            self.stdout.write(
+                f"concurrency={concurrency}: enqueue {count / enqueue_seconds:.0f}/s, "
+                f"run {done / run_seconds:.0f}/s ({done}/{count} done)"
+            )
+        self.stdout.write(self.style.SUCCESS("Benchmark finished"))
@@ -0,0 +1,109 @@
+from django.apps import apps
+from django.core.files.storage import default_storage, storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from home.deletion import file_fields, remove_unreferenced_files
+from home.models import ImageDerivative
+from home.signals import UNTRACKED_MODELS, content_changed
+from home.storage import ContentAddressedStorage, content_name, is_content_addressed
+
+
+class Command(BaseCommand):
+    help = (
+        "Move uploads stored under their original names to content-addressed "
+        "names and point their rows at them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=200,
+            help="Rows renamed per transaction",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be renamed without changing anything",
+        )
+
+    def handle(self, *args, **options):
+        if not isinstance(storages["default"], ContentAddressedStorage):
+            raise CommandError("The default storage is not content-addressed (see STORAGES)")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        total = missing = 0
+        changed = set()
+        for model in apps.get_app_config("home").get_models():
+            for field in file_fields(model):
+                renamed, lost = self._migrate_field(model, field.name, options)
+                if renamed or lost:
+                    self.stdout.write(
+                        f"{model._meta.label}.{field.name}: {renamed} renamed, {lost} missing"
+                    )
+                if renamed and model not in UNTRACKED_MODELS:
+                    changed.add(model)
+                total += renamed
+                missing += lost
+
+        if not options["dry_run"]:
+            # Pages embed media URLs, so everything showing a renamed file is stale
+            for model in changed:
+                content_changed(model)
+        action = "Would rename" if options["dry_run"] else "Renamed"
+        self.stdout.write(
+            self.style.SUCCESS(f"{action} {total} files ({missing} missing from storage)")
+        )
+
+    def _migrate_field(self, model, field_name, options):
+        rows = model._base_manager.exclude(**{field_name: ""}).order_by("pk").only("pk", field_name)
+        renamed = missing = 0
+        last_pk = None
+        while True:
+            batch = rows.filter(pk__gt=last_pk) if last_pk is not None else rows
+            batch = list(batch[: options["batch_size"]])
+            if not batch:
+                return renamed, missing
+            last_pk = batch[-1].pk
+
+            updated = []
+            renames = {}
+            for instance in batch:
+                old = getattr(instance, field_name).name
+                if not old or is_content_addressed(old):
+                    continue
+                if old not in renames:
+                    if not default_storage.exists(old):
+                        missing += 1
+                        continue
+                    with default_storage.open(old) as content:
+                        if options["dry_run"]:
+                            renames[old] = content_name(old, content)
+                        else:
+                            renames[old] = default_storage.save(old, content)
+                setattr(instance, field_name, renames[old])
+                updated.append(instance)
+            renamed += len(updated)
+            if options["dry_run"] or not updated:
+                continue
+
+            with transaction.atomic():
+                model._base_manager.bulk_update(updated, [field_name])
+                self._move_derivatives(renames)
+                # Only deletes old names no row refers to any more, and only
+                # once this transaction commits
+                remove_unreferenced_files.delay(sorted(renames))
+
+    def _move_derivatives(self, renames):
+        for old, new in renames.items():
+            derivatives = ImageDerivative.objects.filter(source_name=old)
+            if ImageDerivative.objects.filter(source_name=new).exists():
+                # A copy of this file was migrated first and brought its own
+                files = list(derivatives.values_list("file", flat=True))
+                derivatives.delete()
+                if files:
+                    remove_unreferenced_files.delay(files)
+            else:
+                derivatives.update(source_name=new)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from home.images import IMAGE_FIELDS, generate_for_instance
+from home.signals import content_changed
+
+
+class Command(BaseCommand):
+    help = "Generate responsive image derivatives for existing uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Regenerate derivatives that already exist",
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        for model in IMAGE_FIELDS:
+            created = 0
+            for instance in model.objects.iterator():
+                created += len(generate_for_instance(instance, force=options["force"]))
+            if created:
+                # Re-render pages and fragments that showed these images without srcsets
+                content_changed(model)
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {created} derivatives")
+            total += created
+        self.stdout.write(self.style.SUCCESS(f"Generated {total} image derivatives"))
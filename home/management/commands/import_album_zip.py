@@ -0,0 +1,39 @@
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+
+from home.models import GalleryAlbum
+from home.uploads import import_album_zip, stage_zip_import
+
+
+class Command(BaseCommand):
+    help = "Import a ZIP archive of photos into a gallery album"
+
+    def add_arguments(self, parser):
+        parser.add_argument("album_id", type=int)
+        parser.add_argument("archive", help="Path to the ZIP file")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Threads generating image derivatives (default IMAGE_IMPORT_WORKERS)",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            album = GalleryAlbum.objects.get(pk=options["album_id"])
+        except GalleryAlbum.DoesNotExist:
+            raise CommandError(f"No album with id {options['album_id']}")
+        try:
+            with open(options["archive"], "rb") as archive:
+                batch = stage_zip_import(File(archive), album=album)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        summary = import_album_zip(batch.pk, options["workers"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{summary['imported']} photos imported into {album.title} "
+                f"({summary['skipped']} skipped, {summary['failed']} failed) in "
+                f"{summary['seconds']}s: {summary['images_per_second']} images/s"
+            )
+        )
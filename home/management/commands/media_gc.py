@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from home.media_gc import DELETE_BATCH_SIZE, find_orphans, remove_orphans, storage_root
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored media files that no row refers to any more "
+        "(list them with -v 2; --dry-run only reports)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report unreferenced files without deleting them",
+        )
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24,
+            help="Leave files younger than this alone (uploads in progress)",
+        )
+        parser.add_argument(
+            "--exclude",
+            action="append",
+            default=[],
+            metavar="PREFIX",
+            help="Leave files under this path alone; may be repeated",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            storage_root()
+        except NotImplementedError as error:
+            raise CommandError(f"{error}; media_gc only cleans up local media storage") from None
+        dry_run = options["dry_run"]
+        stats = {}
+        orphans = 0
+        orphan_bytes = 0
+        batch = []
+        started = time.perf_counter()
+
+        for name, size in find_orphans(options["grace_hours"] * 3600, options["exclude"], stats=stats):
+            orphans += 1
+            orphan_bytes += size
+            if options["verbosity"] >= 2:
+                self.stdout.write(name)
+            if not dry_run:
+                batch.append(name)
+                if len(batch) == DELETE_BATCH_SIZE:
+                    remove_orphans(batch)
+                    batch = []
+        if batch:
+            remove_orphans(batch)
+
+        seconds = time.perf_counter() - started
+        self.stdout.write(
+            f"Scanned {stats['scanned']} files in {seconds:.1f}s "
+            f"({stats['scanned'] / max(seconds, 0.001):.0f}/s); "
+            f"{stats['recent']} unreferenced but within the grace period"
+        )
+        action = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {orphans} unreferenced files ({orphan_bytes / 1024 / 1024:.1f} MB)"
+            )
+        )
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from home.models import (
     ContactInfo,
@@ -16,6 +17,8 @@ from home.models import (
 class Command(BaseCommand):
     help = "Populate database with initial sample data"
 
+    # One transaction, so the edge is purged once rather than per row
+    @transaction.atomic
     def handle(self, *args, **kwargs):
         self.stdout.write("Populating database...")
 
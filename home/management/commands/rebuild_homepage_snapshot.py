@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from home.snapshots import rebuild_homepage_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the cached homepage snapshot from the database"
+
+    def handle(self, *args, **options):
+        snapshot = rebuild_homepage_snapshot()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Homepage snapshot rebuilt: {len(snapshot['notices'])} notices, "
+                f"{len(snapshot['programs'])} programs, "
+                f"{len(snapshot['faculty_tabs'])} faculty tabs"
+            )
+        )
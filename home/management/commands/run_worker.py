@@ -0,0 +1,50 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from home.tasks import Worker, delete_finished_tasks
+
+
+class Command(BaseCommand):
+    help = "Run queued background tasks (uploads, cleanup, ...) from the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of tasks run at the same time (threads)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait between checks of an empty queue",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once no task is due, e.g. when run from cron",
+        )
+
+    def handle(self, *args, **options):
+        deleted = delete_finished_tasks()
+        if deleted:
+            self.stdout.write(f"Deleted {deleted} old finished tasks")
+
+        worker = Worker(
+            concurrency=options["concurrency"],
+            poll_interval=options["poll_interval"],
+            burst=options["burst"],
+        )
+        # Finish the running tasks before exiting on Ctrl+C or a stop from the host
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+
+        self.stdout.write(f"Worker {worker.id} started with {worker.concurrency} threads")
+        worker.run()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Worker stopped: {worker.processed} tasks run, {worker.failed} failed"
+            )
+        )
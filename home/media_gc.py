@@ -0,0 +1,105 @@
+"""
+Finding stored files that no row refers to any more.
+
+Deletes used to leave files behind, so storage holds uploads nothing uses.
+``find_orphans`` loads the name in every ``FileField``/``ImageField`` of the
+``home`` models into a set, then walks storage one directory at a time with
+``os.scandir`` and yields the files that are not in it. Only storage with
+local paths can be walked: remote backends such as Cloudinary cannot list
+files with their times and sizes cheaply (or at all), so they are refused. An image derivative counts as used only while its
+source image is. Files younger than the grace period are skipped: an upload
+in progress is saved before its row is.
+"""
+
+import os
+import posixpath
+import time
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+
+from .deletion import file_fields
+from .models import ImageDerivative
+
+DELETE_BATCH_SIZE = 500
+
+
+def referenced_names():
+    """Every stored file name a row refers to"""
+    names = set()
+    for model in apps.get_app_config("home").get_models():
+        if model is ImageDerivative:
+            continue
+        for field in file_fields(model):
+            names.update(
+                model._base_manager.exclude(**{field.name: ""})
+                .values_list(field.name, flat=True)
+                .iterator(chunk_size=2000)
+            )
+    derivatives = ImageDerivative.objects.values_list("source_name", "file").iterator(chunk_size=2000)
+    names.update([file for source, file in derivatives if source in names])
+    names.discard(None)
+    return names
+
+
+def storage_root(storage=default_storage):
+    """The local directory ``storage`` keeps its files in
+
+    Raises ``NotImplementedError`` for storage without local paths.
+    """
+    try:
+        return storage.path("")
+    except NotImplementedError:
+        raise NotImplementedError(
+            f"{type(storage).__name__} has no local paths, so its files cannot be listed"
+        ) from None
+
+
+def iter_stored_files(storage=default_storage):
+    """Yield ``(name, modified timestamp, size)`` for every file in ``storage``"""
+    root = storage_root(storage)
+    directories = [root]
+    while directories:
+        try:
+            entries = os.scandir(directories.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    directories.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    name = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                    yield name, stat.st_mtime, stat.st_size
+
+
+def find_orphans(grace_seconds, exclude=(), storage=default_storage, stats=None):
+    """Yield ``(name, size)`` of unreferenced files older than ``grace_seconds``
+
+    ``stats`` (a dict), if given, counts the files ``scanned`` and those
+    skipped as ``recent``.
+    """
+    stats = {} if stats is None else stats
+    stats.update(scanned=0, recent=0)
+    referenced = referenced_names()
+    cutoff = time.time() - grace_seconds
+    for name, modified, size in iter_stored_files(storage):
+        stats["scanned"] += 1
+        if name in referenced or name.startswith(tuple(exclude)):
+            continue
+        if posixpath.basename(name).startswith("."):
+            continue
+        if modified > cutoff:
+            stats["recent"] += 1
+            continue
+        yield name, size
+
+
+def remove_orphans(names, storage=default_storage):
+    """Delete the files ``names`` and the rows of any derivatives among them"""
+    names = list(names)
+    for name in names:
+        storage.delete(name)
+    for start in range(0, len(names), DELETE_BATCH_SIZE):
+        ImageDerivative.objects.filter(file__in=names[start : start + DELETE_BATCH_SIZE]).delete()
@@ -0,0 +1,51 @@
+import logging
+from collections import Counter, defaultdict
+
+from .context_processors import SITE_CONTEXT_LOADERS
+
+logger = logging.getLogger(__name__)
+
+# view name -> Counter of requests and site context keys evaluated, per process
+_site_context_usage = defaultdict(Counter)
+
+
+def site_context_usage_report():
+    """Return, per view, how many requests were seen and how often each key was used"""
+    report = {}
+    for view_name, counts in _site_context_usage.items():
+        requests = counts["__requests__"]
+        report[view_name] = {
+            "requests": requests,
+            "keys": {name: counts[name] for name in SITE_CONTEXT_LOADERS},
+            "skipped": {name: requests - counts[name] for name in SITE_CONTEXT_LOADERS},
+        }
+    return report
+
+
+def reset_site_context_usage():
+    _site_context_usage.clear()
+
+
+class SiteContextUsageMiddleware:
+    """Record which lazy ``site_context`` keys each view actually rendered"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        used = getattr(request, "site_context_used", None)
+        match = getattr(request, "resolver_match", None)
+        view_name = match.view_name if match else "<unresolved>"
+        counts = _site_context_usage[view_name]
+        counts["__requests__"] += 1
+        if used:
+            counts.update(used)
+
+        logger.debug(
+            "site_context usage for %s: used=%s",
+            view_name,
+            ",".join(sorted(used)) if used else "-",
+        )
+        return response
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0033_galleryalbum_date_bs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(db_index=True, help_text='Storage name of the original upload', max_length=255)),
+                ('file', models.FileField(max_length=255, upload_to='')),
+                ('format', models.CharField(choices=[('webp', 'WebP'), ('jpeg', 'JPEG')], max_length=10)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField(help_text='File size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Image Derivative',
+                'verbose_name_plural': 'Image Derivatives',
+                'ordering': ['source_name', 'format', 'width'],
+                'unique_together': {('source_name', 'format', 'width')},
+            },
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0034_imagederivative'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('caption', models.CharField(blank=True, max_length=200, null=True)),
+                ('is_spotlight', models.BooleanField(default=False)),
+                ('is_cover', models.BooleanField(default=False)),
+                ('display_order', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('album', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='home.galleryalbum')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Upload Batch',
+                'verbose_name_plural': 'Upload Batches',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('original_name', models.CharField(max_length=255)),
+                ('staged_path', models.CharField(blank=True, max_length=500)),
+                ('stored_name', models.CharField(blank=True, max_length=255)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('staged', 'Staged'), ('stored', 'Stored'), ('done', 'Done'), ('failed', 'Failed')], default='staged', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='home.uploadbatch')),
+            ],
+            options={
+                'verbose_name': 'Upload Item',
+                'verbose_name_plural': 'Upload Items',
+                'ordering': ['batch', 'position'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0037_chunked_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadbatch',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploaditem',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='uploaditem',
+            name='status',
+            field=models.CharField(choices=[('staged', 'Staged'), ('stored', 'Stored'), ('done', 'Done'), ('skipped', 'Skipped'), ('failed', 'Failed')], default='staged', max_length=20),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:30
+
+import home.ranking
+from django.db import migrations
+
+RANKED_MODELS = ["Faculty", "GalleryAlbum", "GalleryImage", "HeroSection", "MarqueeItem", "Notice"]
+
+
+def rank_from_display_order(apps, schema_editor):
+    """Give each row the rank of its display_order, so the order is unchanged"""
+    for name in RANKED_MODELS:
+        model = apps.get_model("home", name)
+        rows = list(model.objects.only("pk", "display_order"))
+        for row in rows:
+            row.rank = home.ranking.initial_rank(row.display_order)
+        model.objects.bulk_update(rows, ["rank"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('home', '0038_zip_import'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='faculty',
+            options={'ordering': ['rank', 'name'], 'verbose_name': 'Faculty Member', 'verbose_name_plural': 'Faculty Members'},
+        ),
+        migrations.AlterModelOptions(
+            name='galleryalbum',
+            options={'ordering': ['rank', '-created_at'], 'verbose_name': 'Gallery Album', 'verbose_name_plural': 'Gallery Albums'},
+        ),
+        migrations.AlterModelOptions(
+            name='galleryimage',
+            options={'ordering': ['rank', '-created_at'], 'verbose_name': 'Gallery Image', 'verbose_name_plural': 'Gallery Images'},
+        ),
+        migrations.AlterModelOptions(
+            name='herosection',
+            options={'ordering': ['rank', '-created_at'], 'verbose_name': 'Hero Section Slide', 'verbose_name_plural': 'Hero Section Slides'},
+        ),
+        migrations.AlterModelOptions(
+            name='marqueeitem',
+            options={'ordering': ['rank'], 'verbose_name': 'Marquee Item', 'verbose_name_plural': 'Marquee Items'},
+        ),
+        migrations.AlterModelOptions(
+            name='notice',
+            options={'ordering': ['rank', '-created_at'], 'verbose_name': 'Notice', 'verbose_name_plural': 'Notices'},
+        ),
+        migrations.AddField(
+            model_name='faculty',
+            name='rank',
+            field=home.ranking.RankField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='galleryalbum',
+            name='rank',
+            field=home.ranking.RankField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='galleryimage',
+            name='rank',
+            field=home.ranking.RankField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='herosection',
+            name='rank',
+            field=home.ranking.RankField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='marqueeitem',
+            name='rank',
+            field=home.ranking.RankField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='notice',
+            name='rank',
+            field=home.ranking.RankField(db_index=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(rank_from_display_order, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,14 @@
+import uuid
+
+from django.conf import settings
 from django.db import models
 
 
 from admin_ordering.models import OrderableModel
 
+from .object_cache import CachedManager
+from .ranking import RankField
+
 class Notice(models.Model):
     """Model for notices and announcements"""
 
@@ -29,11 +35,14 @@ class Notice(models.Model):
     )
     is_active = models.BooleanField(default=True)
     display_order = models.IntegerField(default=0)
+    rank = RankField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CachedManager()
+
     class Meta:
-        ordering = ['display_order', "-created_at"]
+        ordering = ["rank", "-created_at"]
         verbose_name = "Notice"
         verbose_name_plural = "Notices"
 
@@ -53,6 +62,8 @@ class Event(models.Model):
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = CachedManager()
+
     class Meta:
         ordering = ['-created_at']
         verbose_name = "Event"
@@ -105,9 +116,12 @@ class Faculty(models.Model):
     bio = models.TextField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
     display_order = models.IntegerField(default=0, help_text="Lower numbers appear first")
+    rank = RankField()
+
+    objects = CachedManager()
 
     class Meta:
-        ordering = ["display_order", "name"]
+        ordering = ["rank", "name"]
         verbose_name = "Faculty Member"
         verbose_name_plural = "Faculty Members"
 
@@ -231,12 +245,13 @@ class HeroSection(models.Model):
     display_order = models.IntegerField(
         default=0, help_text="Lower numbers appear first in carousel"
     )
+    rank = RankField()
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
 
     class Meta:
-        ordering = ["display_order", "-created_at"]
+        ordering = ["rank", "-created_at"]
         verbose_name = "Hero Section Slide"
         verbose_name_plural = "Hero Section Slides"
 
@@ -264,9 +279,10 @@ class MarqueeItem(models.Model):
     is_urgent = models.BooleanField(default=False, help_text="Shows warning icon")
     is_active = models.BooleanField(default=True)
     display_order = models.IntegerField(default=0)
+    rank = RankField()
 
     class Meta:
-        ordering = ["display_order"]
+        ordering = ["rank"]
         verbose_name = "Marquee Item"
         verbose_name_plural = "Marquee Items"
 
@@ -347,6 +363,8 @@ class Program(models.Model):
     is_active = models.BooleanField(default=True)
     display_order = models.IntegerField(default=0, help_text="Order on homepage")
 
+    objects = CachedManager()
+
     class Meta:
         verbose_name = "Program"
         verbose_name_plural = "Programs"
@@ -518,6 +536,8 @@ class Curriculum(models.Model):
     duration = models.CharField(max_length=100, default="4 Years / 8 Semesters")
     is_active = models.BooleanField(default=True)
 
+    objects = CachedManager()
+
     class Meta:
         verbose_name = "Curriculum Page"
         verbose_name_plural = "Curriculum Pages"
@@ -798,11 +818,12 @@ class GalleryAlbum(models.Model):
     description = models.TextField(blank=True, null=True, help_text="Optional description")
     date_bs = models.CharField(max_length=50, blank=True, null=True, help_text="Date in Bikram Sambat")
     display_order = models.IntegerField(default=0, help_text="Order of display")
+    rank = RankField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        ordering = ["display_order", "-created_at"]
+        ordering = ["rank", "-created_at"]
         verbose_name = "Gallery Album"
         verbose_name_plural = "Gallery Albums"
 
@@ -843,12 +864,169 @@ class GalleryImage(models.Model):
         default=False, help_text="Use this image as album cover"
     )
     display_order = models.IntegerField(default=0, help_text="Order of display")
+    rank = RankField()
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ["display_order", "-created_at"]
+        ordering = ["rank", "-created_at"]
         verbose_name = "Gallery Image"
         verbose_name_plural = "Gallery Images"
 
     def __str__(self):
         return self.caption if self.caption else f"Image {self.id}"
+
+
+class ImageDerivative(models.Model):
+    """A resized copy of an uploaded image, generated by ``home.images``"""
+
+    FORMAT_CHOICES = [
+        ("webp", "WebP"),
+        ("jpeg", "JPEG"),
+    ]
+
+    source_name = models.CharField(
+        max_length=255, db_index=True, help_text="Storage name of the original upload"
+    )
+    file = models.FileField(max_length=255)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField(help_text="File size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["source_name", "format", "width"]
+        unique_together = [("source_name", "format", "width")]
+        verbose_name = "Image Derivative"
+        verbose_name_plural = "Image Derivatives"
+
+    def __str__(self):
+        return f"{self.source_name} ({self.format}, {self.width}w)"
+
+
+class UploadBatch(models.Model):
+    """A multi-file gallery upload that is processed in the background"""
+
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    album = models.ForeignKey(
+        GalleryAlbum, on_delete=models.SET_NULL, null=True, blank=True, related_name="+"
+    )
+    caption = models.CharField(max_length=200, blank=True, null=True)
+    is_spotlight = models.BooleanField(default=False)
+    is_cover = models.BooleanField(default=False)
+    display_order = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Upload Batch"
+        verbose_name_plural = "Upload Batches"
+
+    def __str__(self):
+        return f"Upload {self.pk} ({self.status})"
+
+
+class UploadItem(models.Model):
+    """One file of an ``UploadBatch``, staged on local disk until it is stored"""
+
+    STATUS_CHOICES = [
+        ("staged", "Staged"),
+        ("stored", "Stored"),
+        ("done", "Done"),
+        ("skipped", "Skipped"),
+        ("failed", "Failed"),
+    ]
+
+    batch = models.ForeignKey(UploadBatch, on_delete=models.CASCADE, related_name="items")
+    position = models.PositiveIntegerField()
+    original_name = models.CharField(max_length=255)
+    staged_path = models.CharField(max_length=500, blank=True)
+    stored_name = models.CharField(max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="staged")
+    error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["batch", "position"]
+        verbose_name = "Upload Item"
+        verbose_name_plural = "Upload Items"
+
+    def __str__(self):
+        return f"{self.original_name} ({self.status})"
+
+
+class Task(models.Model):
+    """A queued call of a ``home.tasks.task`` function, run by ``manage.py run_worker``"""
+
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    name = models.CharField(max_length=200, help_text="Dotted path of the task function")
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+    run_at = models.DateTimeField(help_text="Not run before this time")
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["run_at", "id"]
+        indexes = [models.Index(fields=["status", "run_at"])]
+        verbose_name = "Task"
+        verbose_name_plural = "Tasks"
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
+
+
+class ChunkedUpload(models.Model):
+    """A file sent in chunks to /admin/uploads/, assembled under UPLOAD_STAGING_DIR"""
+
+    STATUS_CHOICES = [
+        ("uploading", "Uploading"),
+        ("complete", "Complete"),
+    ]
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField(help_text="Total size in bytes")
+    offset = models.PositiveBigIntegerField(default=0, help_text="Bytes received so far")
+    sha256 = models.CharField(
+        max_length=64, blank=True, help_text="Expected checksum, then the actual one"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="uploading")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Chunked Upload"
+        verbose_name_plural = "Chunked Uploads"
+
+    def __str__(self):
+        return f"{self.filename} ({self.offset}/{self.size})"
@@ -0,0 +1,97 @@
+"""
+Read-through cache for single rows.
+
+Detail views look a row up by primary key or slug and then list a few related
+rows. ``CachedManager`` caches both: ``get_cached(pk=...)`` returns an instance
+from the cache, and ``cached_ids(name, queryset)`` caches the ids a "related
+items" query returned, which ``get_many_cached`` turns back into instances
+from the same row cache. Keys carry the model's content version, so any save
+or delete (or a ``bump_version`` after ``update()``) retires them.
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db import models
+from django.http import Http404
+
+from .cache import versioned_key
+
+OBJECT_CACHE_TIMEOUT = 60 * 60
+
+# Cached in place of a row that does not exist, so repeated 404s stay cheap
+_NOT_FOUND = False
+
+
+class CachedManager(models.Manager):
+    """Default manager with read-through caching of single rows by pk or unique field"""
+
+    def _key(self, kind, name, value):
+        digest = hashlib.md5(f"{name}={value}".encode(), usedforsecurity=False).hexdigest()
+        return versioned_key(f"{kind}:{self.model._meta.label_lower}:{digest}", self.model)
+
+    def _lookup_field(self, lookup):
+        if len(lookup) != 1:
+            raise TypeError("get_cached() takes exactly one pk or unique field lookup")
+        ((name, value),) = lookup.items()
+        if name != "pk" and not self.model._meta.get_field(name).unique:
+            raise TypeError(f"get_cached() needs a unique field, not '{name}'")
+        return name, value
+
+    def get_cached(self, **lookup):
+        """Like ``get()`` for ``pk=...`` or one unique field, served from the cache"""
+        name, value = self._lookup_field(lookup)
+        key = self._key("object", name, value)
+        obj = cache.get(key)
+        if obj is None:
+            obj = self.filter(**lookup).first() or _NOT_FOUND
+            cache.set(key, obj, OBJECT_CACHE_TIMEOUT)
+        if obj is _NOT_FOUND:
+            raise self.model.DoesNotExist(
+                f"{self.model._meta.object_name} matching {name}={value!r} does not exist."
+            )
+        return obj
+
+    def get_many_cached(self, pks):
+        """Return the rows with primary keys ``pks``, in that order, skipping missing ones"""
+        keys = {self._key("object", "pk", pk): pk for pk in pks}
+        found = cache.get_many(keys)
+        objects = {keys[key]: obj for key, obj in found.items() if obj is not _NOT_FOUND}
+
+        missing = [pk for key, pk in keys.items() if key not in found]
+        if missing:
+            fetched = self.in_bulk(missing)
+            cache.set_many(
+                {
+                    self._key("object", "pk", pk): fetched.get(pk, _NOT_FOUND)
+                    for pk in missing
+                },
+                OBJECT_CACHE_TIMEOUT,
+            )
+            objects.update(fetched)
+        return [objects[pk] for pk in pks if pk in objects]
+
+    def cached_ids(self, name, queryset):
+        """Primary keys returned by ``queryset``, cached under ``name``"""
+        key = self._key("object-ids", "list", name)
+        ids = cache.get(key)
+        if ids is None:
+            ids = list(queryset.values_list("pk", flat=True))
+            cache.set(key, ids, OBJECT_CACHE_TIMEOUT)
+        return ids
+
+
+def get_cached_or_404(model, **lookup):
+    """``get_object_or_404`` through ``model.objects.get_cached``
+
+    The first keyword must be ``pk`` or a unique field; any others are plain
+    attribute checks on the cached row, e.g. ``is_active=True``.
+    """
+    name, *checks = lookup
+    try:
+        obj = model.objects.get_cached(**{name: lookup[name]})
+    except model.DoesNotExist:
+        raise Http404(f"No {model._meta.object_name} matches the given query.")
+    if any(getattr(obj, check) != lookup[check] for check in checks):
+        raise Http404(f"No {model._meta.object_name} matches the given query.")
+    return obj
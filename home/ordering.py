@@ -0,0 +1,162 @@
+"""
+Drag-and-drop reordering shared by every sortable admin list.
+
+The admin lists post the new order as a list of primary keys. ``apply_order``
+writes it in one transaction: the rows are locked in primary key order (so two
+admins reordering at once queue up instead of deadlocking), only rows whose
+position actually changed are written, and those go out as a single
+``bulk_update`` (one ``UPDATE ... SET display_order = CASE ...`` per batch)
+rather than one statement per row. Whichever reorder commits last wins as a
+whole; the two are never interleaved.
+
+Models with a ``RankField`` (see ``home.ranking``) do better for the usual
+case of dragging one item: it gets a rank between its new neighbours', and no
+other row is written. Once ranks grow past ``RANK_REBALANCE_LENGTH``
+characters, ``rebalance_ranks`` shortens them in the background.
+"""
+
+from itertools import groupby
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+
+from .ranking import WIDTH, bucket, bucket_prefix, initial_rank, key_between, rank_field, spread_keys
+from .signals import content_changed
+from .tasks import task
+
+DEFAULT_REBALANCE_LENGTH = 24
+
+
+class ReorderError(ValueError):
+    """Raised for an order that is not a list of distinct primary keys"""
+
+
+def parse_order(order):
+    """``order`` as a list of distinct integer primary keys"""
+    if not isinstance(order, list) or not order:
+        raise ReorderError("No order provided")
+    try:
+        ids = [int(pk) for pk in order]
+    except (TypeError, ValueError):
+        raise ReorderError("The order must be a list of ids") from None
+    if len(set(ids)) != len(ids):
+        raise ReorderError("The order lists an item more than once")
+    return ids
+
+
+def single_move(current, new):
+    """``(pk, position in new)`` if ``new`` is ``current`` with one item moved"""
+    if len(current) != len(new):
+        return None
+    start, end = 0, len(new)
+    while start < end and current[start] == new[start]:
+        start += 1
+    while end > start and current[end - 1] == new[end - 1]:
+        end -= 1
+    old, moved = current[start:end], new[start:end]
+    if not old:
+        return None
+    if old[0] == moved[-1] and old[1:] == moved[:-1]:
+        return moved[-1], end - 1
+    if old[-1] == moved[0] and old[:-1] == moved[1:]:
+        return moved[0], start
+    return None
+
+
+def _move_one(model, field, rows, ids):
+    # Rows with equal ranks have no room between them; renumber those instead
+    if len({row.rank for row in rows.values()}) != len(rows):
+        return None
+    current = sorted(rows, key=lambda pk: rows[pk].rank)
+    move = single_move(current, ids)
+    if move is None:
+        return None
+    pk, position = move
+    low = rows[ids[position - 1]].rank if position > 0 else None
+    high = rows[ids[position + 1]].rank if position + 1 < len(ids) else None
+    if low is None or high is None:
+        # Stay in the neighbour's bucket; an unbounded key would land at the
+        # far end of the rank space and give a huge display_order
+        neighbour = high if low is None else low
+        prefix, suffix = neighbour[:WIDTH], neighbour[WIDTH:]
+        if low is None and not suffix:
+            return None
+        rank = prefix + (key_between(None, suffix) if low is None else key_between(suffix or None, None))
+    else:
+        rank = key_between(low, high)
+    if len(rank) > field.max_length:
+        return None
+
+    model._default_manager.filter(pk=pk).update(rank=rank, display_order=bucket(rank))
+    if len(rank) >= getattr(settings, "RANK_REBALANCE_LENGTH", DEFAULT_REBALANCE_LENGTH):
+        rebalance_ranks.delay(model._meta.label)
+    return [pk]
+
+
+def _renumber(model, ranked, rows, ids):
+    changed = []
+    for index, pk in enumerate(ids):
+        row = rows[pk]
+        if ranked and bucket(row.rank) != index:
+            row.rank = initial_rank(index)
+            row.display_order = index
+            changed.append(row)
+        elif not ranked and row.display_order != index:
+            row.display_order = index
+            changed.append(row)
+    if changed:
+        model._default_manager.bulk_update(
+            changed, ["display_order", "rank"] if ranked else ["display_order"]
+        )
+    return [row.pk for row in changed]
+
+
+def apply_order(model, order, queryset=None):
+    """Put the rows in ``order`` in that order
+
+    Ids that do not exist (e.g. deleted by another admin meanwhile) are
+    skipped. Returns ``{"updated": rows written, "order": ids as stored}``.
+    """
+    ids = parse_order(order)
+    if queryset is None:
+        queryset = model._default_manager.all()
+    field = rank_field(model)
+    columns = ["pk", "display_order"] + (["rank"] if field else [])
+
+    with transaction.atomic():
+        rows = {
+            row.pk: row
+            for row in queryset.filter(pk__in=ids).select_for_update().only(*columns).order_by("pk")
+        }
+        ids = [pk for pk in ids if pk in rows]
+        changed = _move_one(model, field, rows, ids) if field else None
+        if changed is None:
+            changed = _renumber(model, field is not None, rows, ids)
+        if changed:
+            # update() skips post_save, so invalidate cached pages explicitly
+            content_changed(model)
+
+    return {"updated": len(changed), "order": ids}
+
+
+@task(max_attempts=1)
+def rebalance_ranks(label):
+    """Respace the ranks of model ``label`` evenly within each bucket, keeping the order"""
+    model = apps.get_model(label)
+    with transaction.atomic():
+        rows = model._default_manager.select_for_update().only("pk", "display_order", "rank")
+        changed = []
+        for number, group in groupby(
+            rows.order_by(*model._meta.ordering, "pk"), key=lambda row: bucket(row.rank)
+        ):
+            group = list(group)
+            for row, suffix in zip(group, spread_keys(len(group))):
+                rank = bucket_prefix(number) + suffix
+                if (row.rank, row.display_order) != (rank, number):
+                    row.rank, row.display_order = rank, number
+                    changed.append(row)
+        model._default_manager.bulk_update(changed, ["rank", "display_order"], batch_size=500)
+        if changed:
+            content_changed(model)
+    return len(changed)
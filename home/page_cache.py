@@ -0,0 +1,245 @@
+"""
+Full-page response cache for anonymous visitors.
+
+Public pages render the same HTML for every anonymous visitor, so
+``cache_public_page`` stores the finished response and serves it to later
+visitors without running the view. Each page is tagged with the models it
+depends on (plus the models behind the site chrome in ``base.html``); its cache
+entry records those models' content versions, so saving or deleting a row only
+retires the pages tagged with that row's model.
+
+The same versions give every cached page an ``ETag`` and ``Last-Modified``
+without touching the database, so a browser or crawler revalidating a page
+that has not changed gets a 304 before the view or any template runs. Shared
+responses also carry edge cache headers (see ``home.edge``).
+"""
+
+import functools
+import hashlib
+import io
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import AnonymousUser
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, urlencode
+
+from .cache import (
+    acquire_refresh_lock,
+    get_last_modified,
+    is_fresh,
+    read_envelope,
+    refresh_in_background,
+    release_refresh_lock,
+    version_tag,
+    write_envelope,
+)
+from .context_processors import SITE_CONTEXT_MODELS
+from .edge import page_surrogate_keys, patch_edge_cache_control, set_edge_headers
+
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Request headers a background render gets: only what decides the page's URL
+DETACHED_META = (
+    "SCRIPT_NAME",
+    "SERVER_NAME",
+    "SERVER_PORT",
+    "HTTP_HOST",
+    "HTTP_X_FORWARDED_HOST",
+    "HTTP_X_FORWARDED_PORT",
+    "HTTPS",
+    "wsgi.url_scheme",
+)
+
+
+def can_use_page_cache(request):
+    """Return True if ``request`` may be answered with a shared cached page"""
+    if request.method not in ("GET", "HEAD"):
+        return False
+    # Only look at the session (a DB query) when the visitor actually has one
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+        return False
+    # Flash messages are rendered into the page and must not be shared
+    if len(messages.get_messages(request)):
+        return False
+    return True
+
+
+def can_store_response(request, response):
+    if request.method != "GET" or response.status_code != 200:
+        return False
+    if response.streaming or response.cookies:
+        return False
+    # A rendered {% csrf_token %} is tied to this visitor's cookie
+    if request.META.get("CSRF_COOKIE_NEEDS_UPDATE"):
+        return False
+    return True
+
+
+def page_cache_key(request, extra=None, query_params=()):
+    """Key for ``request``'s page; only the ``query_params`` the view reads count
+
+    Any other query string (tracking tags, cache busters) maps to the same
+    entry, so visitors cannot fill the cache with copies of one page.
+    """
+    params = sorted((name, value) for name in query_params for value in request.GET.getlist(name))
+    path = f"{request.path}?{urlencode(params)}" if params else request.path
+    if extra is not None:
+        path = f"{path}#{extra}"
+    digest = hashlib.md5(path.encode(), usedforsecurity=False).hexdigest()
+    return f"page:{digest}"
+
+
+def detached_request(request):
+    """An anonymous GET for ``request``'s URL, to render its page in the background
+
+    Its response has already gone out by then, so the visitor's session, user,
+    messages and CSRF cookie must not be read again. The copy carries the path,
+    query string and host headers only.
+    """
+    names = DETACHED_META
+    if settings.SECURE_PROXY_SSL_HEADER:
+        names += (settings.SECURE_PROXY_SSL_HEADER[0],)
+    environ = {name: request.META[name] for name in names if name in request.META}
+    environ.setdefault("wsgi.url_scheme", request.scheme)
+    environ.update(
+        {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": request.path_info,
+            "QUERY_STRING": request.META.get("QUERY_STRING", ""),
+            "wsgi.input": io.BytesIO(),
+        }
+    )
+    detached = WSGIRequest(environ)
+    detached.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    detached.user = AnonymousUser()
+    detached.resolver_match = request.resolver_match
+    return detached
+
+
+def page_etag(tag, extra=None):
+    digest = hashlib.md5(f"{tag}#{extra}".encode(), usedforsecurity=False).hexdigest()
+    return f'"{digest}"'
+
+
+def set_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+
+
+def _cached_response(envelope, status):
+    content, headers = envelope.value
+    response = HttpResponse(content, headers=headers)
+    response["X-Page-Cache"] = status
+    if status == "stale":
+        # The edge must not keep a copy that is already out of date
+        response["Cache-Control"] = "no-cache"
+    return response
+
+
+def cache_public_page(
+    *models, timeout=PAGE_CACHE_TIMEOUT, extra_key=None, extra_since=None, query_params=()
+):
+    """Cache a public view's response for anonymous visitors
+
+    ``models`` are the models the page renders; the site chrome models are
+    always added. ``timeout`` may be a number of seconds or a callable returning
+    one. ``extra_key`` is an optional callable whose value is mixed into the
+    key, for pages that change on a schedule rather than on a save;
+    ``extra_since`` returns the Unix time its current value took effect, so
+    ``Last-Modified`` moves with it too.
+    ``query_params`` names the query parameters the view reads; the rest of
+    the query string is left out of the key.
+
+    When a cached page goes stale, only the request that wins the refresh lock
+    renders it again; concurrent requests get the stale copy meanwhile. With
+    ``CACHE_STALE_WHILE_REVALIDATE`` the winner gets the stale copy too and
+    the page is rendered again in a background thread, from an anonymous copy
+    of the request (see ``detached_request``).
+    """
+    tagged_models = tuple(dict.fromkeys(models + SITE_CONTEXT_MODELS))
+    model_keys = page_surrogate_keys(tagged_models)
+
+    def decorator(view_func):
+        def render_and_store(key, tag, request, args, kwargs):
+            started = time.monotonic()
+            response = view_func(request, *args, **kwargs)
+            if can_store_response(request, response):
+                if hasattr(response, "render") and callable(response.render):
+                    response.render()
+                row_keys = getattr(request, "surrogate_keys", set())
+                set_edge_headers(response, model_keys | row_keys)
+                seconds = timeout() if callable(timeout) else timeout
+                write_envelope(
+                    key,
+                    (response.content, dict(response.items())),
+                    tag,
+                    seconds,
+                    time.monotonic() - started,
+                )
+                response["X-Page-Cache"] = "miss"
+            return response
+
+        @functools.wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not can_use_page_cache(request):
+                response = view_func(request, *args, **kwargs)
+                patch_cache_control(response, private=True)
+                return response
+
+            extra = extra_key() if extra_key else None
+            key = page_cache_key(request, extra, query_params)
+            tag = version_tag(*tagged_models)
+            etag = page_etag(tag, extra)
+            last_modified = get_last_modified(*tagged_models)
+            if extra_since:
+                last_modified = max(last_modified, extra_since())
+            not_modified = get_conditional_response(
+                request, etag=etag, last_modified=int(last_modified)
+            )
+            if not_modified is not None:
+                set_validators(not_modified, etag, last_modified)
+                patch_edge_cache_control(not_modified)
+                return not_modified
+
+            envelope = read_envelope(key)
+            if envelope is not None:
+                if is_fresh(envelope, tag):
+                    response = _cached_response(envelope, "hit")
+                    set_validators(response, etag, last_modified)
+                    return response
+                if not acquire_refresh_lock(key):
+                    return _cached_response(envelope, "stale")
+                if settings.CACHE_STALE_WHILE_REVALIDATE:
+                    detached = detached_request(request)
+
+                    def refresh():
+                        try:
+                            render_and_store(key, tag, detached, args, kwargs)
+                        finally:
+                            release_refresh_lock(key)
+
+                    refresh_in_background(refresh)
+                    return _cached_response(envelope, "stale")
+                holds_lock = True
+            else:
+                holds_lock = acquire_refresh_lock(key)
+
+            try:
+                response = render_and_store(key, tag, request, args, kwargs)
+            finally:
+                if holds_lock:
+                    release_refresh_lock(key)
+            # Stale copies get no validators, so they are never revalidated as current
+            if response.get("X-Page-Cache") == "miss":
+                set_validators(response, etag, last_modified)
+            return response
+
+        wrapper.page_cache_models = tagged_models
+        return wrapper
+
+    return decorator
@@ -0,0 +1,120 @@
+"""
+Fractional ranks: sort keys that always leave room between two items.
+
+A ``RankField`` holds a string that sorts lexicographically in display order.
+Moving an item between two others gives it a key between theirs
+(``key_between``), so a drag-and-drop move writes one row instead of
+renumbering the list. Keys use the digits ``0-9a-z``, which sort the same in
+every collation we deploy on, and never end in ``0`` so there is always room
+for another key below them.
+
+The first ``WIDTH`` characters of a rank encode the item's ``display_order``
+(its "bucket"), so the integer field keeps working: saving a row whose
+``display_order`` no longer matches its rank moves it to the middle of its new
+bucket, and rows that share a ``display_order`` keep their usual tie-breaking
+order. Keys grow by about a character per repeated move into the same gap;
+``home.ordering.rebalance_ranks`` shortens them again.
+"""
+
+from django.db import models
+
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+WIDTH = 6
+# Lets negative display orders sort below zero
+OFFSET = BASE**WIDTH // 2
+MIDDLE = DIGITS[BASE // 2]
+
+
+def _encode(number, width):
+    digits = []
+    for _ in range(width):
+        number, digit = divmod(number, BASE)
+        digits.append(DIGITS[digit])
+    return "".join(reversed(digits))
+
+
+def bucket_prefix(display_order):
+    value = min(max(display_order + OFFSET, 0), BASE**WIDTH - 1)
+    return _encode(value, WIDTH)
+
+
+def initial_rank(display_order):
+    """The rank in the middle of ``display_order``'s bucket"""
+    return bucket_prefix(display_order) + MIDDLE
+
+
+def bucket(rank):
+    """The ``display_order`` that ``rank`` falls under"""
+    return int(rank[:WIDTH].ljust(WIDTH, DIGITS[0]), BASE) - OFFSET
+
+
+def _midpoint(low, high):
+    # A key strictly between ``low`` ("" for none) and ``high`` (None for none)
+    if high is not None:
+        common = 0
+        while common < len(high) and (low[common] if common < len(low) else DIGITS[0]) == high[common]:
+            common += 1
+        if common:
+            return high[:common] + _midpoint(low[common:], high[common:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high is not None else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit + 1) // 2]
+    if high is not None and len(high) > 1:
+        return high[:1]
+    return DIGITS[low_digit] + _midpoint(low[1:], None)
+
+
+def key_between(low, high):
+    """A rank that sorts after ``low`` and before ``high`` (either may be None)
+
+    Raises ``ValueError`` when there is no room, i.e. ``low >= high``.
+    """
+    if low is not None and high is not None and low >= high:
+        raise ValueError(f"No rank between {low!r} and {high!r}")
+    for key in (low, high):
+        if key and key.endswith(DIGITS[0]):
+            raise ValueError(f"Invalid rank {key!r}")
+    return _midpoint(low or "", high)
+
+
+def spread_keys(count):
+    """``count`` increasing keys, evenly spaced and as short as possible"""
+    length = 1
+    while BASE**length <= count:
+        length += 1
+    step = BASE**length / (count + 1)
+    return [_encode(round(step * (index + 1)), length).rstrip(DIGITS[0]) for index in range(count)]
+
+
+class RankField(models.CharField):
+    """Fractional sort key for a model with a ``display_order`` column
+
+    Opt a model in with ``rank = RankField()`` and ``ordering = ["rank", ...]``.
+    New rows, and rows saved with a different ``display_order``, get the rank
+    in the middle of their bucket; otherwise the rank is left alone.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", 64)
+        kwargs.setdefault("default", "")
+        kwargs.setdefault("editable", False)
+        kwargs.setdefault("db_index", True)
+        super().__init__(*args, **kwargs)
+
+    def pre_save(self, model_instance, add):
+        rank = getattr(model_instance, self.attname)
+        display_order = model_instance.display_order or 0
+        if not rank or bucket(rank) != display_order:
+            rank = initial_rank(display_order)
+            setattr(model_instance, self.attname, rank)
+        return rank
+
+
+def rank_field(model):
+    """The model's ``RankField``, or None"""
+    for field in model._meta.concrete_fields:
+        if isinstance(field, RankField):
+            return field
+    return None
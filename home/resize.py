@@ -0,0 +1,263 @@
+"""
+On-demand image resizing behind signed URLs.
+
+``resized_image_url(name, width=320, height=320, crop=True)`` returns a URL
+like ``/media-resize/w320-h320-crop:<signature>/gallery/photo.jpg``. The
+signature covers both the parameters and the path, so only sizes the site
+itself asked for can be rendered and nobody can burn CPU requesting arbitrary
+ones. The first request renders the variant from the storage (local files or
+Cloudinary, whichever ``default_storage`` is) into a disk cache under
+``MEDIA_RESIZE_CACHE_DIR``; later requests are served from there with a
+long-lived ``Cache-Control``. The disk cache is kept under
+``MEDIA_RESIZE_CACHE_MAX_BYTES`` by evicting the least recently served files,
+checked at most every ``EVICT_INTERVAL_SECONDS`` per process.
+
+Only content-addressed sources (see ``home.storage``) are served as immutable:
+their name fixes their bytes. Any other source may be replaced under the same
+name, so its variants are cached for ``REPLACEABLE_MAX_AGE`` and rendered
+again after that. Building a URL never asks the storage anything.
+"""
+
+import hashlib
+import io
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .cache import acquire_refresh_lock, release_refresh_lock
+from .storage import is_content_addressed
+
+SIGNING_SALT = "home.resize"
+DEFAULT_MAX_DIMENSION = 2400
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Evict down to this fraction of the limit, so eviction does not run on every write
+EVICT_TO = 0.9
+# Walking the cache directory is slow; a process does it at most this often
+EVICT_INTERVAL_SECONDS = 60
+# How long variants of sources that are not content-addressed are kept
+REPLACEABLE_MAX_AGE = 24 * 60 * 60
+# How long a request waits for another worker rendering the same variant
+RENDER_WAIT_SECONDS = 5.0
+RENDER_WAIT_INTERVAL = 0.05
+
+CONTENT_TYPES = {"jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+EXTENSION_FORMATS = {".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".webp": "webp"}
+
+# Older URLs carry a source version (``-v<n>``); it is ignored
+_PARAMS_RE = re.compile(
+    r"^(?:w(\d+))?(?:-?h(\d+))?(-crop)?(?:-(jpeg|png|webp))?(?:-?v\d+)?$"
+)
+
+_last_evict = None
+
+
+class ResizeError(Exception):
+    """Raised for a bad signature, bad parameters or a missing source"""
+
+
+class SourceTooLarge(ResizeError):
+    """Raised for a source with more pixels than Pillow will decode"""
+
+
+def _signer():
+    return signing.Signer(salt=SIGNING_SALT)
+
+
+def _max_dimension():
+    return getattr(settings, "MEDIA_RESIZE_MAX_DIMENSION", DEFAULT_MAX_DIMENSION)
+
+
+def format_params(width=None, height=None, crop=False, format=None):
+    parts = []
+    if width:
+        parts.append(f"w{int(width)}")
+    if height:
+        parts.append(f"h{int(height)}")
+    if crop:
+        parts.append("crop")
+    if format:
+        parts.append(format)
+    return "-".join(parts)
+
+
+def parse_params(params):
+    """Return ``(width, height, crop, format)`` for a parameter string"""
+    match = _PARAMS_RE.match(params)
+    if not match or not params:
+        raise ResizeError(f"Bad resize parameters: {params}")
+    width, height, crop, format = match.groups()
+    width = int(width) if width else None
+    height = int(height) if height else None
+    if width is None and height is None:
+        raise ResizeError("A width or a height is required")
+    if crop and not (width and height):
+        raise ResizeError("Cropping needs both a width and a height")
+    for value in (width, height):
+        if value is not None and not 0 < value <= _max_dimension():
+            raise ResizeError(f"Size out of range: {value}")
+    return width, height, bool(crop), format
+
+
+def resized_image_url(name, width=None, height=None, crop=False, format=None):
+    """Signed URL of ``name`` (a storage name) resized to fit ``width`` x ``height``"""
+    params = format_params(width, height, crop, format)
+    parse_params(params)
+    signature = _signer().signature(f"{params}/{name}")
+    return reverse("home:media_resize", args=[f"{params}:{signature}", name])
+
+
+def verify(signed_params, name):
+    """Check the signature of a resize URL and return its parsed parameters"""
+    params, _, signature = signed_params.rpartition(":")
+    expected = _signer().signature(f"{params}/{name}")
+    if not signing.constant_time_compare(signature, expected):
+        raise ResizeError("Bad signature")
+    if ".." in name.split("/"):
+        raise ResizeError("Bad path")
+    return parse_params(params)
+
+
+# ---- rendering ----------------------------------------------------------------
+
+
+def render_variant(source, width, height, crop, format):
+    """Resize the image file ``source``; returns ``(bytes, format)``"""
+    try:
+        image = ImageOps.exif_transpose(Image.open(source))
+    except Image.DecompressionBombError as error:
+        raise SourceTooLarge(str(error)) from error
+    format = format or EXTENSION_FORMATS.get(
+        os.path.splitext(getattr(source, "name", ""))[1].lower(), "jpeg"
+    )
+    if crop:
+        image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    else:
+        # Fit inside the box, never enlarging
+        box = (width or image.width, height or image.height)
+        image.thumbnail(box, Image.Resampling.LANCZOS)
+    if format == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, format.upper(), quality=82, optimize=True)
+    return buffer.getvalue(), format
+
+
+def cache_dir():
+    return str(
+        getattr(
+            settings,
+            "MEDIA_RESIZE_CACHE_DIR",
+            os.path.join(settings.BASE_DIR, ".cache", "media-resize"),
+        )
+    )
+
+
+def cache_control(name):
+    """``Cache-Control`` for variants of the source ``name``"""
+    if is_content_addressed(name):
+        # The URL is signed for these exact parameters and bytes
+        return "public, max-age=31536000, immutable"
+    return f"public, max-age={REPLACEABLE_MAX_AGE}"
+
+
+def _cache_path(params, name):
+    source = f"{params}/{name}"
+    if not is_content_addressed(name):
+        # A new path each period, so a replaced source is rendered again
+        source = f"{source}#{int(time.time() // REPLACEABLE_MAX_AGE)}"
+    digest = hashlib.sha256(source.encode()).hexdigest()
+    return os.path.join(cache_dir(), digest[:2], digest)
+
+
+def _find_cached(path):
+    for format in CONTENT_TYPES:
+        candidate = f"{path}.{format}"
+        if os.path.exists(candidate):
+            return candidate, format
+    return None, None
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as temp:
+        temp.write(data)
+    os.replace(temp_path, path)
+
+
+def evict(max_bytes=None):
+    """Delete the least recently served variants until the cache fits its limit"""
+    global _last_evict
+    _last_evict = time.monotonic()
+    if max_bytes is None:
+        max_bytes = getattr(settings, "MEDIA_RESIZE_CACHE_MAX_BYTES", DEFAULT_CACHE_MAX_BYTES)
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_dir()):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes * EVICT_TO:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def get_variant(signed_params, name):
+    """Return ``(path, content_type)`` of the cached variant, rendering it if needed"""
+    width, height, crop, format = verify(signed_params, name)
+    params = signed_params.rpartition(":")[0]
+    path = _cache_path(params, name)
+
+    cached, cached_format = _find_cached(path)
+    if cached is None:
+        lock_key = f"media-resize:{os.path.basename(path)}"
+        if acquire_refresh_lock(lock_key):
+            try:
+                cached, cached_format = _render_to_cache(path, name, width, height, crop, format)
+            finally:
+                release_refresh_lock(lock_key)
+        else:
+            deadline = time.monotonic() + RENDER_WAIT_SECONDS
+            while cached is None and time.monotonic() < deadline:
+                time.sleep(RENDER_WAIT_INTERVAL)
+                cached, cached_format = _find_cached(path)
+            if cached is None:
+                cached, cached_format = _render_to_cache(path, name, width, height, crop, format)
+    else:
+        # Mark as recently served for eviction
+        os.utime(cached)
+    return cached, CONTENT_TYPES[cached_format]
+
+
+def _render_to_cache(path, name, width, height, crop, format):
+    if not default_storage.exists(name):
+        raise ResizeError(f"No such image: {name}")
+    with default_storage.open(name, "rb") as source:
+        data, format = render_variant(source, width, height, crop, format)
+    cached = f"{path}.{format}"
+    _write_atomic(cached, data)
+    if _last_evict is None or time.monotonic() - _last_evict >= EVICT_INTERVAL_SECONDS:
+        evict()
+    return cached, format
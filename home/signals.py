@@ -0,0 +1,104 @@
+import threading
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .cache import bump_version
+from .edge import purge_keys, request_purge
+from .images import IMAGE_FIELDS, render_derivatives
+from .models import ChunkedUpload, ImageDerivative, Task, UploadBatch, UploadItem
+
+# Bookkeeping models no page renders. home.images bumps the derivative version
+# itself, once per batch.
+UNTRACKED_MODELS = (ChunkedUpload, ImageDerivative, Task, UploadBatch, UploadItem)
+
+
+class _PendingPurge:
+    """Models and edge keys changed in one transaction, flushed once it commits
+
+    Every change registers an on-commit callback, but the first to run flushes
+    the whole batch and the rest find nothing left to do.
+    """
+
+    def __init__(self):
+        self.models = set()
+        self.keys = set()
+        self.done = False
+
+    def add(self, model, instance=None):
+        self.models.add(model)
+        self.keys.update(purge_keys(model, instance))
+
+    def flush(self):
+        if self.done:
+            return
+        self.done = True
+        # Bump again once the writes are visible to other connections, so a reader
+        # that cached the old rows in between does not keep them under the new version.
+        for model in self.models:
+            bump_version(model)
+        request_purge(self.keys)
+
+
+_pending = threading.local()
+
+
+def content_changed(model, instance=None):
+    """Retire cached content built from ``model`` and purge it from the edge
+
+    Changes are purged from the edge together, in one call once the
+    transaction commits. Views that write with ``update()`` (which sends no
+    signals) call this themselves.
+    """
+    bump_version(model)
+    pending = getattr(_pending, "purge", None)
+    if pending is None or pending.done:
+        pending = _pending.purge = _PendingPurge()
+    pending.add(model, instance)
+    # Outside a transaction this runs right away; robust, so a purge that
+    # fails cannot turn a committed write into an error
+    transaction.on_commit(pending.flush, robust=True)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_content_version(sender, instance, **kwargs):
+    """Bump the content version of any ``home`` model that is saved or deleted"""
+    if sender._meta.app_label != "home":
+        return
+    if sender in UNTRACKED_MODELS:
+        return
+    content_changed(sender, instance)
+
+
+def _image_names(instance):
+    """Names of ``instance``'s loaded image fields (deferred ones are left out)"""
+    return {
+        name: getattr(instance.__dict__[name], "name", instance.__dict__[name])
+        for name in IMAGE_FIELDS[type(instance)]
+        if name in instance.__dict__
+    }
+
+
+@receiver(post_init)
+def remember_image_names(sender, instance, **kwargs):
+    if sender in IMAGE_FIELDS:
+        instance._saved_image_names = _image_names(instance)
+
+
+@receiver(post_save)
+def generate_image_derivatives(sender, instance, created=False, update_fields=None, **kwargs):
+    """Queue rendering responsive derivatives when a model gets a new image
+
+    Saves that leave the files alone (a caption edit) queue nothing.
+    """
+    if sender not in IMAGE_FIELDS:
+        return
+    saved = {} if created else getattr(instance, "_saved_image_names", {})
+    current = _image_names(instance)
+    instance._saved_image_names = current
+    if update_fields is not None:
+        current = {name: value for name, value in current.items() if name in update_fields}
+    if any(value and value != saved.get(name) for name, value in current.items()):
+        render_derivatives.delay(sender._meta.label, instance.pk)
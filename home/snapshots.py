@@ -0,0 +1,144 @@
+"""
+Prebuilt homepage snapshot.
+
+``index`` used to run close to twenty queries per hit. The snapshot gathers
+everything the homepage renders into one plain dict of lists and model
+instances, stored in the cache together with the content versions of every
+contributing model. Any save or delete on one of those models makes it stale,
+so the next request rebuilds it; ``manage.py rebuild_homepage_snapshot``
+rebuilds it ahead of time.
+"""
+
+import time
+
+from django.conf import settings
+from django.db import models
+
+from .cache import get_or_compute, version_tag, write_envelope
+from .faculty import group_faculty_by_tab
+from .models import (
+    ContactInfo,
+    Event,
+    Faculty,
+    FacultyTab,
+    GalleryImage,
+    HeroSection,
+    ImageSlideshow,
+    MarqueeItem,
+    Notice,
+    PrincipalMessage,
+    Program,
+    ProgramFeature,
+    SiteConfiguration,
+    SiteLogo,
+)
+from .spotlight import build_spotlight_pool, current_bucket, select_for_bucket
+
+HOMEPAGE_SNAPSHOT_MODELS = (
+    ContactInfo,
+    Event,
+    Faculty,
+    FacultyTab,
+    GalleryImage,
+    HeroSection,
+    ImageSlideshow,
+    MarqueeItem,
+    Notice,
+    PrincipalMessage,
+    Program,
+    ProgramFeature,
+    SiteConfiguration,
+    SiteLogo,
+)
+HOMEPAGE_SNAPSHOT_TIMEOUT = 60 * 60 * 24
+
+GRADUATE_KEYWORDS = ("master", "graduate", "phd", "doctoral")
+
+
+def _marquee_notices():
+    # Urgent first, then highlight, then normal; newest first within each
+    return list(
+        Notice.objects.filter(is_active=True).order_by(
+            models.Case(
+                models.When(priority="urgent", then=0),
+                models.When(priority="highlight", then=1),
+                models.When(priority="normal", then=2),
+                default=3,
+                output_field=models.IntegerField(),
+            ),
+            "-created_at",
+        )[:5]
+    )
+
+
+def build_homepage_snapshot():
+    """Run every homepage query and return the results as a cacheable dict"""
+    hero_slides = list(HeroSection.objects.filter(is_active=True))
+    programs = list(Program.objects.filter(is_active=True).prefetch_related("features"))
+
+    faculty_tabs = list(FacultyTab.objects.filter(is_active=True))
+    faculty_by_tab = group_faculty_by_tab(faculty_tabs)
+
+    return {
+        "hero_slides": hero_slides,
+        "hero": hero_slides[0] if hero_slides else None,
+        "spotlight_pool": build_spotlight_pool(),
+        "gallery_slides": list(
+            ImageSlideshow.objects.filter(display_location="homepage_gallery", is_active=True)
+        ),
+        "marquee_items": list(MarqueeItem.objects.filter(is_active=True)),
+        "marquee_notices": _marquee_notices(),
+        "notices": list(Notice.objects.filter(is_active=True)[:3]),
+        "events": list(Event.objects.filter(is_active=True)[:3]),
+        "programs": programs,
+        "faculty_tabs": faculty_tabs,
+        "faculty_by_tab": faculty_by_tab,
+        # Same rule as the old icontains scans, checked against the programs we already have
+        "has_graduate_programs": any(
+            keyword in program.full_name.lower()
+            for program in programs
+            for keyword in GRADUATE_KEYWORDS
+        ),
+        "principal_message": PrincipalMessage.objects.filter(is_active=True).first(),
+    }
+
+
+HOMEPAGE_SNAPSHOT_KEY = "homepage-snapshot"
+
+
+def get_homepage_snapshot():
+    """Return the current homepage snapshot, rebuilding it if any model changed
+
+    Only one worker rebuilds a stale snapshot; concurrent requests are served
+    the previous one meanwhile (see ``home.cache.get_or_compute``).
+    """
+    return get_or_compute(
+        HOMEPAGE_SNAPSHOT_KEY,
+        build_homepage_snapshot,
+        HOMEPAGE_SNAPSHOT_MODELS,
+        HOMEPAGE_SNAPSHOT_TIMEOUT,
+        background=settings.CACHE_STALE_WHILE_REVALIDATE,
+    )
+
+
+def rebuild_homepage_snapshot():
+    """Build the snapshot now and store it under the current version tag"""
+    tag = version_tag(*HOMEPAGE_SNAPSHOT_MODELS)
+    started = time.monotonic()
+    snapshot = build_homepage_snapshot()
+    write_envelope(
+        HOMEPAGE_SNAPSHOT_KEY,
+        snapshot,
+        tag,
+        HOMEPAGE_SNAPSHOT_TIMEOUT,
+        time.monotonic() - started,
+    )
+    return snapshot
+
+
+def homepage_context():
+    """Template context for ``index``, built from the snapshot without queries"""
+    context = dict(get_homepage_snapshot())
+    pool = context.pop("spotlight_pool")
+    context["spotlight_images"] = select_for_bucket(pool, current_bucket())
+    return context
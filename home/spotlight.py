@@ -0,0 +1,73 @@
+"""
+Spotlight rotation for the homepage.
+
+Instead of ``order_by("?")`` on every request, the spotlight images are kept in
+a pool whose order is shuffled once per set of ids. Time is cut into buckets of
+``SPOTLIGHT_ROTATION_SECONDS`` and each bucket shows the next window of the
+pool, so every worker picks the same images within a bucket (the page can be
+cached) while visitors still see the whole pool over successive buckets.
+"""
+
+import random
+import time
+
+from django.conf import settings
+
+from .models import GalleryImage
+
+SPOTLIGHT_SIZE = 8
+DEFAULT_ROTATION_SECONDS = 15 * 60
+
+
+def rotation_seconds():
+    return getattr(settings, "SPOTLIGHT_ROTATION_SECONDS", DEFAULT_ROTATION_SECONDS)
+
+
+def current_bucket(now=None):
+    """Return the number of the rotation bucket that ``now`` falls in"""
+    if now is None:
+        now = time.time()
+    return int(now // rotation_seconds())
+
+
+def bucket_started(now=None):
+    """Unix time the bucket that ``now`` falls in started"""
+    return current_bucket(now) * rotation_seconds()
+
+
+def seconds_left_in_bucket(now=None):
+    if now is None:
+        now = time.time()
+    return rotation_seconds() - int(now % rotation_seconds())
+
+
+def shuffle_pool(images):
+    """Shuffle spotlight images in an order that depends only on their ids
+
+    Every worker that builds the pool from the same rows gets the same order.
+    """
+    images = sorted(images, key=lambda image: image.pk)
+    seed = ",".join(str(image.pk) for image in images)
+    random.Random(seed).shuffle(images)
+    return images
+
+
+def build_spotlight_pool():
+    return shuffle_pool(GalleryImage.objects.filter(is_spotlight=True))
+
+
+def select_for_bucket(pool, bucket, size=SPOTLIGHT_SIZE):
+    """Return the ``size`` images from ``pool`` that bucket ``bucket`` shows
+
+    Consecutive buckets take consecutive windows of the pool, wrapping around,
+    so every image gets its turn.
+    """
+    if not pool:
+        return []
+    if len(pool) <= size:
+        start = bucket % len(pool)
+        return pool[start:] + pool[:start]
+    start = (bucket * size) % len(pool)
+    window = pool[start : start + size]
+    return window + pool[: size - len(window)]
+
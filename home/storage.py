@@ -0,0 +1,74 @@
+"""
+Content-addressed file storage.
+
+``ContentAddressedStorage`` stores every file under a hash of its bytes,
+in the folder it was meant for: ``gallery/IMG_0042.jpg`` becomes
+``gallery/3f/a9c0...e1.jpg``. So:
+
+- a name never refers to different bytes, and media can be served with
+  ``Cache-Control: public, max-age=31536000, immutable``: replacing a photo
+  gives it a new URL instead of reusing the old one;
+- identical files are stored once, whoever uploads them. Several rows may
+  then share a file, which ``home.deletion`` and ``media_gc`` allow for.
+  Saving a file that is already stored touches it, so cleanup treats it as
+  a fresh upload until the new row is committed.
+
+``manage.py content_address_media`` moves files stored under their old
+names.
+"""
+
+import hashlib
+import os
+import posixpath
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+DIGEST_LENGTH = 32
+
+_CONTENT_ADDRESSED = re.compile(
+    r"(?:^|/)([0-9a-f]{2})/([0-9a-f]{%d})(?:\.[a-z0-9]+)?$" % (DIGEST_LENGTH - 2)
+)
+
+
+def is_content_addressed(name):
+    return bool(_CONTENT_ADDRESSED.search(name))
+
+
+def name_digest(name):
+    """The first ``DIGEST_LENGTH`` hex digits of the SHA-256 a content-addressed name carries"""
+    match = _CONTENT_ADDRESSED.search(name)
+    return match[1] + match[2] if match else None
+
+
+def content_name(name, content):
+    """The content-addressed name for ``content`` meant to be stored as ``name``"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    digest = digest.hexdigest()[:DIGEST_LENGTH]
+    directory, basename = posixpath.split(name.replace("\\", "/"))
+    extension = os.path.splitext(basename)[1].lower()
+    return posixpath.join(directory, digest[:2], digest[2:] + extension)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """``FileSystemStorage`` that names files by the SHA-256 of their content"""
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = content_name(name, content)
+        if self.exists(name):
+            # Same name, same bytes: already stored. Touch it so a cleanup
+            # running before this upload's row commits leaves it alone
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                pass
+            else:
+                return name
+        return super().save(name, content, max_length=max_length)
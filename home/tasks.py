@@ -0,0 +1,260 @@
+"""
+A small task queue kept in the site's own database.
+
+Shared hosting gives us neither Redis nor Celery, so work that should not hold
+up a request is stored as ``Task`` rows and run by ``manage.py run_worker``
+(from a long-running process or, where only cron is available, with
+``--burst`` every minute)::
+
+    @task(max_attempts=5)
+    def send_notice_email(notice_id):
+        ...
+
+    send_notice_email.delay(notice.pk)
+
+Arguments must be JSON serializable. Enqueued inside a transaction, a task
+becomes visible to workers only when it commits.
+
+Workers claim tasks with a lease (``locked_by``/``locked_until``): the claim
+is a conditional ``UPDATE`` (``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database has it), so two workers never take the same task, and a task whose
+worker died is picked up again once its lease runs out. Running workers renew
+their leases. A failed task is retried with exponential backoff until it has
+had ``max_attempts`` runs, then left as ``failed`` with its last error.
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_RETRY_BACKOFF_SECONDS = 30
+MAX_RETRY_BACKOFF_SECONDS = 60 * 60
+DEFAULT_RETENTION_DAYS = 7
+
+_registry = {}
+
+
+class TaskError(Exception):
+    """Raised for tasks that cannot be run at all, e.g. an unknown name"""
+
+
+def task(func=None, *, max_attempts=3):
+    """Register ``func`` as a task and give it ``delay(*args, **kwargs)``"""
+
+    def register(func):
+        func.task_name = f"{func.__module__}.{func.__qualname__}"
+        func.max_attempts = max_attempts
+        func.delay = lambda *args, **kwargs: enqueue(func, args, kwargs)
+        _registry[func.task_name] = func
+        return func
+
+    return register(func) if func is not None else register
+
+
+def get_task(name):
+    """The registered task function called ``name``, importing its module if needed"""
+    if name not in _registry:
+        try:
+            import_module(name.rpartition(".")[0])
+        except ImportError as error:
+            raise TaskError(f"Unknown task: {name}") from error
+    try:
+        return _registry[name]
+    except KeyError:
+        raise TaskError(f"Unknown task: {name}") from None
+
+
+def enqueue(func, args=(), kwargs=None, run_at=None):
+    """Queue a call of the task ``func``; returns the ``Task`` row"""
+    return Task.objects.create(
+        name=func.task_name,
+        args=list(args),
+        kwargs=kwargs or {},
+        max_attempts=func.max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def _lease_seconds():
+    return getattr(settings, "TASK_LEASE_SECONDS", DEFAULT_LEASE_SECONDS)
+
+
+def _ready(now):
+    # Queued and due, or claimed by a worker whose lease has run out
+    return Q(status="queued", run_at__lte=now) | Q(status="running", locked_until__lt=now)
+
+
+def claim(worker_id, limit, lease_seconds=None, names=None):
+    """Lease up to ``limit`` due tasks to ``worker_id`` and return them
+
+    With ``names``, only tasks of those names are claimed.
+    """
+    now = timezone.now()
+    leased = {
+        "status": "running",
+        "locked_by": worker_id,
+        "locked_until": now + timedelta(seconds=lease_seconds or _lease_seconds()),
+        "attempts": F("attempts") + 1,
+    }
+    ready = Task.objects.filter(_ready(now)).order_by("run_at", "id")
+    if names is not None:
+        ready = ready.filter(name__in=names)
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(
+                ready.select_for_update(skip_locked=True).values_list("pk", flat=True)[:limit]
+            )
+            Task.objects.filter(pk__in=ids).update(**leased)
+    else:
+        # SQLite: a conditional UPDATE per candidate; losing a race updates nothing
+        ids = []
+        for pk in ready.values_list("pk", flat=True)[: limit * 2]:
+            if Task.objects.filter(_ready(now), pk=pk).update(**leased):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    return list(Task.objects.filter(pk__in=ids, locked_by=worker_id).order_by("run_at", "id"))
+
+
+def retry_delay(attempts):
+    """Seconds to wait before retrying a task that has failed ``attempts`` times"""
+    base = getattr(settings, "TASK_RETRY_BACKOFF_SECONDS", DEFAULT_RETRY_BACKOFF_SECONDS)
+    delay = min(base * 2 ** (attempts - 1), MAX_RETRY_BACKOFF_SECONDS)
+    # Jitter, so tasks that failed together do not all retry together
+    return delay * random.uniform(1, 1.25)
+
+
+def run_task(task, worker_id):
+    """Run a claimed task and record the outcome; returns True on success"""
+    mine = Task.objects.filter(pk=task.pk, locked_by=worker_id)
+    try:
+        if task.attempts > task.max_attempts:
+            # Its workers kept dying before they could record a result
+            raise TaskError(f"Lease expired after {task.max_attempts} attempts")
+        get_task(task.name)(*task.args, **task.kwargs)
+    except Exception as error:
+        now = timezone.now()
+        message = "".join(traceback.format_exception(error))
+        if task.attempts < task.max_attempts and not isinstance(error, TaskError):
+            logger.warning("Task %s (%s) failed, will retry: %s", task.pk, task.name, error)
+            mine.update(
+                status="queued",
+                run_at=now + timedelta(seconds=retry_delay(task.attempts)),
+                locked_by="",
+                locked_until=None,
+                last_error=message,
+            )
+        else:
+            logger.error("Task %s (%s) failed: %s", task.pk, task.name, error)
+            mine.update(status="failed", finished_at=now, locked_until=None, last_error=message)
+        return False
+    if not mine.update(status="done", finished_at=timezone.now(), locked_until=None):
+        logger.warning("Task %s (%s) finished after its lease ran out", task.pk, task.name)
+    return True
+
+
+def delete_finished_tasks(days=None):
+    """Delete done tasks older than ``days`` (``TASK_RETENTION_DAYS``); failed ones stay"""
+    if days is None:
+        days = getattr(settings, "TASK_RETENTION_DAYS", DEFAULT_RETENTION_DAYS)
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Task.objects.filter(status="done", finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker:
+    """Claims tasks and runs them on a pool of ``concurrency`` threads
+
+    With ``burst`` the worker stops once no task is due, which suits running it
+    from cron; otherwise it polls every ``poll_interval`` seconds until
+    ``stop()`` is called. Tasks already running are always finished first.
+    ``names`` limits the worker to tasks of those names.
+    """
+
+    def __init__(
+        self, concurrency=1, poll_interval=1.0, burst=False, lease_seconds=None, names=None
+    ):
+        self.concurrency = concurrency
+        self.names = names
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.lease_seconds = lease_seconds or _lease_seconds()
+        self.id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.processed = 0
+        self.failed = 0
+        self._stopping = threading.Event()
+        self._last_renewal = time.monotonic()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _run(self, task):
+        # Each pool thread keeps its own connection, recycled per CONN_MAX_AGE
+        close_old_connections()
+        try:
+            return run_task(task, self.id)
+        except DatabaseError:
+            # The result could not be recorded; the task runs again when its lease expires
+            logger.exception("Task %s (%s) could not be recorded", task.pk, task.name)
+            return False
+
+    def _renew_leases(self, ids):
+        if not ids or time.monotonic() - self._last_renewal < self.lease_seconds / 3:
+            return
+        self._last_renewal = time.monotonic()
+        Task.objects.filter(pk__in=ids, locked_by=self.id, status="running").update(
+            locked_until=timezone.now() + timedelta(seconds=self.lease_seconds)
+        )
+
+    def _collect(self, running):
+        for future in [future for future in running if future.done()]:
+            del running[future]
+            self.processed += 1
+            if not future.result():
+                self.failed += 1
+
+    def run(self):
+        running = {}  # future -> task id
+        with ThreadPoolExecutor(self.concurrency, thread_name_prefix="task-worker") as pool:
+            while not self._stopping.is_set():
+                self._collect(running)
+                free = self.concurrency - len(running)
+                claimed = claim(self.id, free, self.lease_seconds, self.names) if free else []
+                for task in claimed:
+                    running[pool.submit(self._run, task)] = task.pk
+                self._renew_leases(list(running.values()))
+                if claimed and len(running) < self.concurrency:
+                    continue
+                if self.burst and not claimed and not running:
+                    break
+                if running:
+                    wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                else:
+                    self._stopping.wait(self.poll_interval)
+            wait(running)
+            self._collect(running)
+        return self.processed
+
+
+@task
+def noop(*args, **kwargs):
+    """Does nothing; used to measure the queue's own overhead"""
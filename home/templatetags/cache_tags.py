@@ -0,0 +1,67 @@
+from django import template
+from django.apps import apps
+from django.core.cache import cache
+
+from home.fragment_cache import (
+    FRAGMENT_CACHE_TIMEOUT,
+    fragment_cache_debug,
+    fragment_cache_key,
+    record_fragment_lookup,
+)
+
+register = template.Library()
+
+
+class CacheOnNode(template.Node):
+    def __init__(self, nodelist, models, vary_on):
+        self.nodelist = nodelist
+        self.models = models
+        self.vary_on = vary_on
+
+    def render(self, context):
+        template_name = self.origin.template_name or self.origin.name
+        vary_values = [var.resolve(context) for var in self.vary_on]
+        key = fragment_cache_key(template_name, self.token.lineno, self.models, vary_values)
+
+        content = cache.get(key)
+        hit = content is not None
+        if not hit:
+            content = self.nodelist.render(context)
+            cache.set(key, content, FRAGMENT_CACHE_TIMEOUT)
+        if fragment_cache_debug():
+            record_fragment_lookup(template_name, hit)
+        return content
+
+
+def _resolve_model(tag_name, name):
+    """Look up ``name`` as a home model, or as ``app_label.Model``"""
+    try:
+        if "." in name:
+            return apps.get_model(name)
+        return apps.get_model("home", name)
+    except (LookupError, ValueError):
+        raise template.TemplateSyntaxError(f"'{tag_name}' got unknown model '{name}'")
+
+
+@register.tag
+def cache_on(parser, token):
+    """
+    Cache the enclosed block until one of the named models changes.
+
+    Usage: {% cache_on Program FooterLink [vary expr ...] %}...{% endcache_on %}
+    """
+    bits = token.split_contents()
+    tag_name = bits[0]
+    names = bits[1:]
+    vary_on = []
+    if "vary" in names:
+        index = names.index("vary")
+        vary_on = [parser.compile_filter(bit) for bit in names[index + 1 :]]
+        names = names[:index]
+    if not names:
+        raise template.TemplateSyntaxError(f"'{tag_name}' needs at least one model")
+
+    models = tuple(_resolve_model(tag_name, name) for name in names)
+    nodelist = parser.parse(("endcache_on",))
+    parser.delete_first_token()
+    return CacheOnNode(nodelist, models, vary_on)
@@ -0,0 +1,69 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from home.images import derivative_widths, get_derivatives
+from home.resize import resized_image_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(field_file, sizes="100vw", **attrs):
+    """
+    Render an uploaded image with WebP and JPEG srcsets of its derivatives.
+
+    Usage: {% responsive_image image.image sizes="(min-width: 768px) 25vw, 50vw" alt=image.caption class="w-full" %}
+    Extra keyword arguments become attributes of the <img>; images load lazily
+    unless loading="eager" is given. Images without derivatives get a srcset of
+    signed /media-resize/ URLs instead.
+    """
+    if not field_file:
+        return ""
+    attrs.setdefault("loading", "lazy")
+    derivatives = get_derivatives(field_file.name)
+    if not derivatives:
+        # Not processed yet: let /media-resize/ render the widths on demand
+        srcset = ", ".join(
+            f"{resized_image_url(field_file.name, width)} {width}w"
+            for width in derivative_widths()
+        )
+        return format_html(
+            '<img src="{}" srcset="{}" sizes="{}"{}>',
+            field_file.url,
+            srcset,
+            sizes,
+            flatatt(attrs),
+        )
+
+    srcsets = {}
+    for format, width, url in sorted(derivatives, key=lambda derivative: derivative[1]):
+        srcsets.setdefault(format, []).append(f"{url} {width}w")
+    jpeg = srcsets.get("jpeg", [])
+    src = jpeg[-1].rsplit(" ", 1)[0] if jpeg else field_file.url
+
+    # display: contents keeps the <img> sized by its own classes, as before
+    return format_html(
+        '<picture style="display: contents">'
+        '<source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}"{}>'
+        "</picture>",
+        ", ".join(srcsets.get("webp", [])),
+        sizes,
+        src,
+        ", ".join(jpeg),
+        sizes,
+        flatatt(attrs),
+    )
+
+
+@register.simple_tag
+def resized_url(field_file, width=None, height=None, crop=False, format=None):
+    """
+    Signed /media-resize/ URL of an uploaded image at a one-off size.
+
+    Usage: {% resized_url faculty.photo 256 256 crop=True %}
+    """
+    if not field_file:
+        return ""
+    return resized_image_url(field_file.name, width, height, crop, format)
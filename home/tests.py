@@ -1,3 +1,1845 @@
-from django.test import TestCase
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.signals import request_finished, request_started
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, transaction
+from django.db.models import Model
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template import TemplateSyntaxError, engines
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from config.cache import CULL_EVERY, TwoTierCache
+
+from .archives import zip_stream
+from .cache import (
+    Envelope,
+    acquire_refresh_lock,
+    bump_version,
+    get_or_compute,
+    is_fresh,
+    read_envelope,
+    release_refresh_lock,
+)
+from .context_processors import site_context
+from .edge import get_purger, purge_edge, surrogate_key
+from .faculty import group_faculty_by_tab
+from .forms import NoticeForm
+from .fragment_cache import fragment_cache_report, reset_fragment_cache_stats
+from .models import (
+    AboutSection,
+    ChunkedUpload,
+    ContactInfo,
+    Event,
+    Faculty,
+    FacultyTab,
+    FooterLink,
+    GalleryAlbum,
+    GalleryImage,
+    HeroSection,
+    ImageDerivative,
+    MarqueeItem,
+    Notice,
+    PrincipalMessage,
+    Program,
+    ProgramFeature,
+    SiteConfiguration,
+    Task,
+    UploadBatch,
+    UploadItem,
+)
+from .deletion import delete_queryset, remove_unreferenced_files
+from .gallery_actions import copy_images, move_images
+from .images import generate_derivatives, render_derivatives
+from .ordering import ReorderError, apply_order, rebalance_ranks
+from .ranking import key_between
+from .storage import content_name, is_content_addressed
+from .page_cache import cache_public_page, page_cache_key
+from .resize import ResizeError, evict, get_variant, resized_image_url
+from .snapshots import build_homepage_snapshot, get_homepage_snapshot
+from .spotlight import select_for_bucket, shuffle_pool
+from .tasks import Worker, claim, run_task, task
+from .uploads import import_album_zip, process_upload_batch
+
+
+def snapshot_fingerprint(snapshot):
+    """Reduce a snapshot to comparable primitives (pks, field values, flags)"""
+
+    def reduce(value):
+        if isinstance(value, Model):
+            return (type(value).__name__, value.pk, str(value))
+        if isinstance(value, (list, tuple)):
+            return [reduce(item) for item in value]
+        if isinstance(value, dict):
+            return {key: reduce(item) for key, item in value.items()}
+        return value
+
+    return reduce(snapshot)
+
+
+class SiteContextCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        SiteConfiguration.objects.create(college_name="Test College")
+        Program.objects.create(
+            code="BIT",
+            full_name="Bachelor of Information Technology",
+            short_description="IT",
+            full_description="IT",
+            url_slug="bit",
+        )
+
+    def _evaluate(self):
+        context = site_context(self.factory.get("/"))
+        return {
+            "site_config": context["site_config"].college_name,
+            "contact_info": bool(context["contact_info"]),
+            "site_logo": bool(context["site_logo"]),
+            "all_programs": [p.code for p in context["all_programs"]],
+            "footer_links": [link.name for link in context["footer_links"]],
+        }
+
+    def test_second_request_runs_no_queries(self):
+        self._evaluate()
+        with self.assertNumQueries(0):
+            values = self._evaluate()
+        self.assertEqual(values["site_config"], "Test College")
+        self.assertEqual(values["all_programs"], ["BIT"])
+
+    def test_save_invalidates_cached_context(self):
+        self._evaluate()
+        FooterLink.objects.create(name="Results", url="/results/")
+        self.assertEqual(self._evaluate()["footer_links"], ["Results"])
+
+    def test_delete_invalidates_cached_context(self):
+        contact = ContactInfo.objects.create(email="info@example.com", phone="1", address="x")
+        self.assertTrue(self._evaluate()["contact_info"])
+        contact.delete()
+        self.assertFalse(self._evaluate()["contact_info"])
+
+    def test_untouched_keys_are_never_loaded(self):
+        request = self.factory.get("/")
+        template = engines["django"].from_string("{{ site_config.college_name }}")
+        with self.assertNumQueries(1):
+            html = template.render(site_context(request), request)
+        self.assertEqual(html, "Test College")
+        self.assertEqual(request.site_context_used, {"site_config"})
+
+    def test_values_are_memoized_per_request(self):
+        request = self.factory.get("/")
+        site_context(request)["all_programs"].__len__()
+        cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(site_context(request)["all_programs"]), 1)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class HomepageSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteConfiguration.objects.create(college_name="Test College")
+        self.program = Program.objects.create(
+            code="BIT",
+            full_name="Bachelor of Information Technology",
+            short_description="IT",
+            full_description="IT",
+            url_slug="bit",
+        )
+        self.tab = FacultyTab.objects.create(name="IT", slug="it", department_filter="IT")
+        self.faculty = Faculty.objects.create(
+            name="Asha", designation="Lecturer", department="IT", qualification="MSc"
+        )
+        self.notices = [
+            Notice.objects.create(title=f"Notice {i}", date_bs="2082-01-01", display_order=i)
+            for i in range(3)
+        ]
+        HeroSection.objects.create(title="Welcome", subtitle="Hello")
+
+    def assertSnapshotConsistent(self):
+        self.assertEqual(
+            snapshot_fingerprint(get_homepage_snapshot()),
+            snapshot_fingerprint(build_homepage_snapshot()),
+        )
+
+    def test_snapshot_is_served_from_cache(self):
+        get_homepage_snapshot()
+        with self.assertNumQueries(0):
+            get_homepage_snapshot()
+
+    def test_homepage_renders_without_content_queries(self):
+        self.client.get(reverse("home:index"))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse("home:index"))
+        self.assertContains(response, "Notice 0")
+        self.assertContains(response, "Asha")
+
+    def test_consistent_after_create(self):
+        get_homepage_snapshot()
+        Event.objects.create(title="Sports Week", description="d", date_bs="2082-01-02")
+        MarqueeItem.objects.create(text="Admissions open")
+        ProgramFeature.objects.create(program=self.program, feature_text="Labs")
+        PrincipalMessage.objects.create(quote="q", full_message="m", principal_name="P")
+        self.assertSnapshotConsistent()
+
+    def test_consistent_after_update(self):
+        get_homepage_snapshot()
+        self.notices[0].title = "Exam routine published"
+        self.notices[0].save()
+        self.faculty.department = "Agriculture"
+        self.faculty.save()
+        self.assertSnapshotConsistent()
+        self.assertEqual(get_homepage_snapshot()["faculty_by_tab"]["it"], [])
+
+    def test_consistent_after_delete(self):
+        get_homepage_snapshot()
+        self.notices[1].delete()
+        self.tab.delete()
+        self.assertSnapshotConsistent()
+
+    def test_consistent_after_deactivate(self):
+        get_homepage_snapshot()
+        self.program.is_active = False
+        self.program.save()
+        self.assertSnapshotConsistent()
+        self.assertEqual(get_homepage_snapshot()["programs"], [])
+
+    def test_consistent_after_reorder(self):
+        get_homepage_snapshot()
+        staff = get_user_model().objects.create_user(
+            username="staff", email="staff@example.com", password="pw", is_staff=True
+        )
+        self.client.force_login(staff)
+        order = [notice.pk for notice in reversed(self.notices)]
+        response = self.client.post(
+            reverse("home:notice_reorder"),
+            json.dumps({"order": order}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertSnapshotConsistent()
+        self.assertEqual([n.pk for n in get_homepage_snapshot()["notices"]], order)
+
+    def test_consistent_after_spotlight_toggle(self):
+        get_homepage_snapshot()
+        GalleryImage.objects.create(image="gallery/a.jpg", is_spotlight=True)
+        self.assertSnapshotConsistent()
+        self.assertEqual(len(get_homepage_snapshot()["spotlight_pool"]), 1)
+
+    def test_graduate_programs_flag(self):
+        self.assertFalse(get_homepage_snapshot()["has_graduate_programs"])
+        Program.objects.create(
+            code="MIT",
+            full_name="Master of Information Technology",
+            short_description="IT",
+            full_description="IT",
+            url_slug="mit",
+        )
+        self.assertTrue(get_homepage_snapshot()["has_graduate_programs"])
+
+    def test_rebuild_command(self):
+        cache.clear()
+        out = io.StringIO()
+        call_command("rebuild_homepage_snapshot", stdout=out)
+        self.assertIn("Homepage snapshot rebuilt", out.getvalue())
+        with self.assertNumQueries(0):
+            get_homepage_snapshot()
+
+
+class FacultyGroupingTests(TestCase):
+    def setUp(self):
+        self.it = FacultyTab.objects.create(name="IT", slug="it", department_filter="IT")
+        self.ag = FacultyTab.objects.create(
+            name="Agriculture", slug="ag", department_filter="Agriculture", display_order=1
+        )
+        self.empty = FacultyTab.objects.create(name="Civil", slug="civil", department_filter="Civil")
+        for name, department, order, active in [
+            ("Bina", "IT", 2, True),
+            ("Asha", "IT", 1, True),
+            ("Hari", "IT", 0, False),
+            ("Gita", "Agriculture", 0, True),
+            ("Ram", "Physics", 0, True),
+        ]:
+            Faculty.objects.create(
+                name=name,
+                designation="Lecturer",
+                department=department,
+                qualification="MSc",
+                display_order=order,
+                is_active=active,
+            )
+
+    def names(self, grouped):
+        return {slug: [member.name for member in members] for slug, members in grouped.items()}
+
+    def test_groups_with_one_query(self):
+        tabs = list(FacultyTab.objects.all())
+        with self.assertNumQueries(1):
+            grouped = group_faculty_by_tab(tabs)
+        self.assertEqual(
+            self.names(grouped), {"it": ["Asha", "Bina"], "ag": ["Gita"], "civil": []}
+        )
+
+    def test_can_include_inactive_members(self):
+        grouped = group_faculty_by_tab([self.it], active_only=False)
+        self.assertEqual(self.names(grouped), {"it": ["Hari", "Asha", "Bina"]})
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_fragment_cache_stats()
+        self.program = Program.objects.create(
+            code="BCE", full_name="Civil Engineering", url_slug="civil"
+        )
+
+    def render(self, source, **context):
+        template = engines["django"].from_string("{% load cache_tags %}" + source)
+        return template.render(context)
+
+    def test_block_is_cached_until_model_changes(self):
+        source = "{% cache_on Program %}{% for p in programs %}{{ p.full_name }}{% endfor %}{% endcache_on %}"
+        self.assertEqual(self.render(source, programs=Program.objects.all()), "Civil Engineering")
+        with self.assertNumQueries(0):
+            # A hit never evaluates the queryset
+            self.assertEqual(self.render(source, programs=Program.objects.all()), "Civil Engineering")
+
+        self.program.full_name = "Civil Engg."
+        self.program.save()
+        self.assertEqual(self.render(source, programs=Program.objects.all()), "Civil Engg.")
+
+    def test_vary_values_are_part_of_the_key(self):
+        source = "{% cache_on Program vary slug %}{{ slug }}{% endcache_on %}"
+        self.assertEqual(self.render(source, slug="it"), "it")
+        self.assertEqual(self.render(source, slug="civil"), "civil")
+
+    def test_unknown_model_is_a_syntax_error(self):
+        with self.assertRaises(TemplateSyntaxError):
+            self.render("{% cache_on NoSuchModel %}x{% endcache_on %}")
+
+    @override_settings(FRAGMENT_CACHE_DEBUG=True)
+    def test_debug_mode_reports_hit_rate_per_template(self):
+        source = "{% cache_on Program %}x{% endcache_on %}"
+        for _ in range(4):
+            self.render(source)
+        report = fragment_cache_report()["<unknown source>"]
+        self.assertEqual((report["hits"], report["misses"]), (3, 1))
+        self.assertEqual(report["hit_rate"], 0.75)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ObjectCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteConfiguration.objects.create(college_name="Test College")
+        self.faculty = [
+            Faculty.objects.create(
+                name=f"Member {i}", designation="Lecturer", department="IT", display_order=i
+            )
+            for i in range(5)
+        ]
+
+    def test_row_is_read_through(self):
+        first = Faculty.objects.get_cached(pk=self.faculty[0].pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(Faculty.objects.get_cached(pk=self.faculty[0].pk), first)
+
+    def test_save_and_delete_invalidate_row(self):
+        faculty = self.faculty[0]
+        Faculty.objects.get_cached(pk=faculty.pk)
+        faculty.designation = "Professor"
+        faculty.save()
+        self.assertEqual(Faculty.objects.get_cached(pk=faculty.pk).designation, "Professor")
+        faculty.delete()
+        with self.assertRaises(Faculty.DoesNotExist):
+            Faculty.objects.get_cached(pk=self.faculty[0].pk)
+
+    def test_missing_rows_are_cached_too(self):
+        with self.assertRaises(Faculty.DoesNotExist):
+            Faculty.objects.get_cached(pk=9999)
+        with self.assertNumQueries(0), self.assertRaises(Faculty.DoesNotExist):
+            Faculty.objects.get_cached(pk=9999)
+
+    def test_lookup_must_be_unique(self):
+        with self.assertRaises(TypeError):
+            Faculty.objects.get_cached(department="IT")
+
+    def test_get_many_keeps_order_and_skips_missing(self):
+        pks = [self.faculty[3].pk, 9999, self.faculty[1].pk]
+        self.assertEqual(
+            Faculty.objects.get_many_cached(pks), [self.faculty[3], self.faculty[1]]
+        )
+        with self.assertNumQueries(0):
+            Faculty.objects.get_many_cached(pks)
+
+    def test_detail_page_served_from_cache(self):
+        url = reverse("home:faculty_detail", args=[self.faculty[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(
+            [member.name for member in response.context["related_faculty"]],
+            ["Member 1", "Member 2", "Member 3"],
+        )
+        # The next member's page finds its row and related rows already cached
+        with self.assertNumQueries(0):
+            self.client.get(reverse("home:faculty_detail", args=[self.faculty[1].pk]))
+
+    def test_inactive_row_is_404(self):
+        notice = Notice.objects.create(title="Old", date_bs="2082-01-01", is_active=False)
+        response = self.client.get(reverse("home:notice_detail", args=[notice.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(SPOTLIGHT_ROTATION_SECONDS=600)
+class SpotlightRotationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.images = [
+            GalleryImage.objects.create(image=f"gallery/{i}.jpg", is_spotlight=True)
+            for i in range(20)
+        ]
+        GalleryImage.objects.create(image="gallery/hidden.jpg")
+
+    def test_pool_order_depends_only_on_ids(self):
+        pool = shuffle_pool(self.images)
+        self.assertEqual(shuffle_pool(list(reversed(self.images))), pool)
+        self.assertCountEqual(pool, self.images)
+
+    def test_successive_buckets_cover_the_pool(self):
+        pool = shuffle_pool(self.images)
+        shown = set()
+        for bucket in range(3):
+            selection = select_for_bucket(pool, bucket)
+            self.assertEqual(len(selection), 8)
+            self.assertEqual(len(set(selection)), 8)
+            shown.update(selection)
+        self.assertEqual(shown, set(self.images))
+
+    def test_small_pool_rotates_order(self):
+        pool = shuffle_pool(self.images[:3])
+        self.assertEqual(select_for_bucket(pool, 0), pool)
+        self.assertEqual(select_for_bucket(pool, 1), pool[1:] + pool[:1])
+        self.assertEqual(select_for_bucket([], 5), [])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        SiteConfiguration.objects.create(college_name="Test College")
+        self.notice = Notice.objects.create(title="Exam routine", date_bs="2082-01-01")
+        self.faculty = Faculty.objects.create(
+            name="Asha", designation="Lecturer", department="IT", qualification="MSc"
+        )
+        FacultyTab.objects.create(name="IT", slug="it", department_filter="IT")
+
+    def test_anonymous_hit_skips_the_view(self):
+        url = reverse("home:notices_page")
+        self.assertEqual(self.client.get(url)["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertContains(response, "Exam routine")
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get(reverse("home:notices_page"))
+        response = self.client.get(reverse("home:notices_page") + "?q=nothing-matches")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+
+    def test_save_purges_only_tagged_pages(self):
+        notices_url = reverse("home:notices_page")
+        faculty_url = reverse("home:faculty")
+        self.client.get(notices_url)
+        self.client.get(faculty_url)
+
+        self.notice.title = "Exam routine (revised)"
+        self.notice.save()
+
+        response = self.client.get(notices_url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Exam routine (revised)")
+        self.assertEqual(self.client.get(faculty_url)["X-Page-Cache"], "hit")
+
+    def test_delete_purges_detail_page(self):
+        url = reverse("home:notice_detail", args=[self.notice.pk])
+        self.client.get(url)
+        self.notice.delete()
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_site_chrome_change_purges_every_page(self):
+        url = reverse("home:about")
+        AboutSection.objects.create(section_type="history", title="History", content="c")
+        self.client.get(url)
+        FooterLink.objects.create(name="Results", url="/results/")
+        response = self.client.get(url)
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertContains(response, "Results")
+
+    def test_staff_bypass_cache(self):
+        url = reverse("home:notices_page")
+        self.client.get(url)
+        staff = get_user_model().objects.create_user(
+            username="staff", email="staff@example.com", password="pw", is_staff=True
+        )
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertNotIn("X-Page-Cache", response)
+        self.assertContains(response, "Welcome, staff")
+
+    def test_unread_query_parameters_share_the_entry(self):
+        url = reverse("home:notices_page")
+        self.client.get(f"{url}?q=exam&page=1")
+        for query in ("page=1&q=exam&utm_source=x", "q=exam&page=1&_=123"):
+            self.assertEqual(self.client.get(f"{url}?{query}")["X-Page-Cache"], "hit")
+        self.assertEqual(self.client.get(f"{url}?q=other")["X-Page-Cache"], "miss")
+
+    def test_pending_messages_bypass_cache(self):
+        calls = []
+
+        def view_func(request):
+            calls.append(request)
+            return HttpResponse("page")
+
+        view = cache_public_page(Notice)(view_func)
+        factory = RequestFactory()
+        view(factory.get("/page/"))
+        request = factory.get("/page/")
+        request._messages = ["Notice created successfully!"]
+        response = view(request)
+        self.assertEqual(len(calls), 2)
+        self.assertNotIn("X-Page-Cache", response)
+
+    def test_matching_etag_gets_304_without_rendering(self):
+        url = reverse("home:notices_page")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_if_modified_since(self):
+        url = reverse("home:notices_page")
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_schedule_change_moves_last_modified(self):
+        bucket, started = [1], [time.time() - 600]
+        view = cache_public_page(
+            Notice, extra_key=lambda: bucket[0], extra_since=lambda: started[0]
+        )(lambda request: HttpResponse("page"))
+        factory = RequestFactory()
+        last_modified = view(factory.get("/spotlight/"))["Last-Modified"]
+        bucket[0], started[0] = 2, time.time() + 60
+        response = view(factory.get("/spotlight/", HTTP_IF_MODIFIED_SINCE=last_modified))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["Last-Modified"], last_modified)
+
+    def test_save_changes_validators(self):
+        url = reverse("home:notices_page")
+        etag = self.client.get(url)["ETag"]
+        self.notice.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_csrf_pages_are_not_stored(self):
+        calls = []
+
+        def form_view(request):
+            calls.append(request)
+            get_token(request)
+            return HttpResponse("<form></form>")
+
+        view = cache_public_page(Notice)(form_view)
+        factory = RequestFactory()
+        view(factory.get("/form/"))
+        view(factory.get("/form/"))
+        self.assertEqual(len(calls), 2)
+
+
+class StampedeProtectionTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_fresh_value_is_computed_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return "value"
+
+        self.assertEqual(get_or_compute("stampede:key", compute, (Notice,), 60), "value")
+        self.assertEqual(get_or_compute("stampede:key", compute, (Notice,), 60), "value")
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_value_served_while_another_worker_rebuilds(self):
+        get_or_compute("stampede:key", lambda: "old", (Notice,), 60)
+        bump_version(Notice)
+        self.assertTrue(acquire_refresh_lock("stampede:key"))
+
+        def compute():
+            raise AssertionError("only the lock holder may rebuild")
+
+        self.assertEqual(get_or_compute("stampede:key", compute, (Notice,), 60), "old")
+
+        release_refresh_lock("stampede:key")
+        self.assertEqual(get_or_compute("stampede:key", lambda: "new", (Notice,), 60), "new")
+
+    def test_background_refresh_serves_stale_value(self):
+        get_or_compute("stampede:key", lambda: "old", (Notice,), 60)
+        bump_version(Notice)
+        with mock.patch("home.cache.refresh_in_background") as refresh:
+            value = get_or_compute(
+                "stampede:key", lambda: "new", (Notice,), 60, background=True
+            )
+        self.assertEqual(value, "old")
+        refresh.call_args.args[0]()
+        self.assertEqual(read_envelope("stampede:key").value, "new")
+        self.assertTrue(acquire_refresh_lock("stampede:key"))
+
+    def test_early_expiry_near_deadline(self):
+        envelope = Envelope(value="v", tag="t", expires=1000.0, delta=5.0)
+        self.assertTrue(is_fresh(envelope, "t", now=0.0))
+        self.assertFalse(is_fresh(envelope, "other", now=0.0))
+        with mock.patch("home.cache.random.random", return_value=0.5):
+            # 5s rebuild * ln 2 ~ 3.5s early
+            self.assertFalse(is_fresh(envelope, "t", now=997.0))
+            self.assertTrue(is_fresh(envelope, "t", now=996.0))
+
+    def test_page_served_stale_while_locked(self):
+        calls = []
+
+        def view_func(request):
+            calls.append(request)
+            return HttpResponse(f"render {len(calls)}")
+
+        view = cache_public_page(Notice)(view_func)
+        factory = RequestFactory()
+        view(factory.get("/page/"))
+        bump_version(Notice)
+        self.assertTrue(acquire_refresh_lock(page_cache_key(factory.get("/page/"))))
+
+        response = view(factory.get("/page/"))
+        self.assertEqual(response["X-Page-Cache"], "stale")
+        self.assertEqual(response.content, b"render 1")
+        self.assertEqual(len(calls), 1)
+
+
+    @override_settings(CACHE_STALE_WHILE_REVALIDATE=True)
+    def test_background_render_gets_a_detached_request(self):
+        calls = []
+
+        def view_func(request):
+            calls.append(request)
+            return HttpResponse(f"render {len(calls)}")
+
+        view = cache_public_page(Notice, query_params=("page",))(view_func)
+        factory = RequestFactory()
+        view(factory.get("/page/", {"page": "2"}))
+        bump_version(Notice)
+        visitor = factory.get("/page/", {"page": "2"}, HTTP_COOKIE="tracking=1")
+        visitor.user = AnonymousUser()
+        with mock.patch("home.page_cache.refresh_in_background", lambda target: target()):
+            response = view(visitor)
+
+        self.assertEqual(response["X-Page-Cache"], "stale")
+        rendered = calls[-1]
+        self.assertIsNot(rendered, visitor)
+        self.assertEqual(rendered.get_full_path(), "/page/?page=2")
+        self.assertEqual(rendered.get_host(), "testserver")
+        self.assertEqual(rendered.COOKIES, {})
+        self.assertFalse(rendered.user.is_authenticated)
+        self.assertEqual(view(factory.get("/page/", {"page": "2"})).content, b"render 2")
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class EdgeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Entering the override per test gives each test a fresh proxy
+        self.enterContext(override_settings(EDGE_PURGER="home.edge.LocalEdgeProxy"))
+        # As if committed: purge the fixtures before any test caches pages
+        with self.captureOnCommitCallbacks(execute=True):
+            SiteConfiguration.objects.create(college_name="Test College")
+            self.notice = Notice.objects.create(title="Exam routine", date_bs="2082-01-01")
+            Faculty.objects.create(name="Asha", designation="Lecturer", department="IT")
+        self.proxy = get_purger()
+
+    def test_public_page_headers(self):
+        response = self.client.get(reverse("home:notice_detail", args=[self.notice.pk]))
+        self.assertIn("s-maxage=300", response["Cache-Control"])
+        self.assertIn("stale-while-revalidate=60", response["Cache-Control"])
+        self.assertEqual(
+            set(response["Surrogate-Key"].split()),
+            {"notice", f"notice-{self.notice.pk}", "site-chrome"},
+        )
+
+    def test_program_rows_are_named_by_code(self):
+        program = Program.objects.create(code="BIT", full_name="IT", url_slug="it")
+        self.assertEqual(surrogate_key(program), "program-BIT")
+
+    def test_save_purges_affected_pages_only(self):
+        notice_url = reverse("home:notice_detail", args=[self.notice.pk])
+        faculty_url = reverse("home:faculty")
+        self.proxy.get(notice_url)
+        self.proxy.get(faculty_url)
+        self.assertEqual(self.proxy.get(notice_url)["X-Edge-Cache"], "hit")
+
+        self.notice.title = "Exam routine (revised)"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.notice.save()
+
+        self.assertIn(f"notice-{self.notice.pk}", self.proxy.purged[-1])
+        response = self.proxy.get(notice_url)
+        self.assertEqual(response["X-Edge-Cache"], "miss")
+        self.assertContains(response, "Exam routine (revised)")
+        self.assertEqual(self.proxy.get(faculty_url)["X-Edge-Cache"], "hit")
+
+    def test_site_chrome_change_purges_everything(self):
+        url = reverse("home:faculty")
+        self.proxy.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            FooterLink.objects.create(name="Results", url="/results/")
+        self.assertContains(self.proxy.get(url), "Results")
+
+    def test_one_purge_per_transaction(self):
+        self.proxy.purged.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(5):
+                Notice.objects.create(title=f"Notice {n}", date_bs="2082-01-01")
+            Faculty.objects.create(name="Bina", designation="Lecturer", department="IT")
+        self.assertEqual(len(self.proxy.purged), 1)
+        self.assertTrue({"notice", "faculty"} <= self.proxy.purged[0])
+
+    @override_settings(EDGE_PURGER="home.edge.HTTPPurger", EDGE_PURGE_URL="")
+    def test_http_purger_needs_a_url(self):
+        with self.assertRaises(ImproperlyConfigured):
+            get_purger()
+        # The write has committed by the time the purge runs; it must not fail
+        with self.assertLogs("django", level="ERROR"), self.captureOnCommitCallbacks(execute=True):
+            Notice.objects.create(title="Holiday", date_bs="2082-01-02")
+
+    @override_settings(EDGE_PURGER="home.edge.HTTPPurger", EDGE_PURGE_URL="http://edge.invalid/")
+    def test_http_purges_run_from_the_task_queue(self):
+        with mock.patch("urllib.request.urlopen") as urlopen:
+            with self.captureOnCommitCallbacks(execute=True):
+                Notice.objects.create(title="Holiday", date_bs="2082-01-02")
+            urlopen.assert_not_called()
+            queued = Task.objects.get(name=purge_edge.task_name)
+            self.assertIn("notice", queued.args[0])
+            urlopen.side_effect = OSError("edge down")
+            _run_queued_tasks()
+            queued.refresh_from_db()
+            self.assertEqual(queued.status, "queued")
+            request = urlopen.call_args.args[0]
+            self.assertEqual((request.method, request.full_url), ("PURGE", "http://edge.invalid/"))
+
+    def test_logged_in_visitors_bypass_the_edge(self):
+        url = reverse("home:notices_page")
+        self.proxy.get(url)
+        staff = get_user_model().objects.create_user(
+            username="staff", email="staff@example.com", password="pw", is_staff=True
+        )
+        self.proxy.client.force_login(staff)
+        response = self.proxy.get(url)
+        self.assertEqual(response["X-Edge-Cache"], "bypass")
+        self.assertIn("private", response["Cache-Control"])
+        self.assertContains(response, "Welcome, staff")
+
+
+def _run_queued_tasks():
+    """Run every due task here and now, as a burst worker would"""
+    while tasks := claim("test-worker", 50):
+        for queued in tasks:
+            run_task(queued, "test-worker")
+
+
+def _jpeg_upload(name="photo.jpg", size=(2000, 1000)):
+    # Coloured by name: storage is content-addressed, so equal bytes share a file
+    buffer = io.BytesIO()
+    Image.new("RGB", size, tuple(hashlib.sha256(name.encode()).digest()[:3])).save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=(320, 640, 4000))
+class ImageDerivativeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def test_upload_generates_each_width_and_format(self):
+        image = GalleryImage.objects.create(image=_jpeg_upload())
+        _run_queued_tasks()
+        derivatives = ImageDerivative.objects.filter(source_name=image.image.name)
+        self.assertEqual(
+            sorted(derivatives.values_list("format", "width", "height")),
+            [
+                ("jpeg", 320, 160),
+                ("jpeg", 640, 320),
+                ("jpeg", 2000, 1000),
+                ("webp", 320, 160),
+                ("webp", 640, 320),
+                ("webp", 2000, 1000),
+            ],
+        )
+        for derivative in derivatives:
+            self.assertTrue(derivative.file.storage.exists(derivative.file.name))
+            self.assertEqual(derivative.size, derivative.file.size)
+
+    def test_responsive_image_tag(self):
+        image = GalleryImage.objects.create(image=_jpeg_upload())
+        _run_queued_tasks()
+        html = engines["django"].from_string(
+            '{% load image_tags %}{% responsive_image image.image sizes="50vw" alt="Campus" %}'
+        ).render({"image": image})
+        self.assertIn('<source type="image/webp" srcset="/media/derivatives/', html)
+        self.assertIn("320w", html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn('alt="Campus"', html)
+        self.assertIn('loading="lazy"', html)
+
+    @override_settings(IMAGE_DERIVATIVE_WIDTHS=(320, 1600))
+    def test_tag_falls_back_to_resizer_without_derivatives(self):
+        image = GalleryImage(image="gallery/missing.jpg")
+        html = engines["django"].from_string(
+            "{% load image_tags %}{% responsive_image image.image %}"
+        ).render({"image": image})
+        self.assertTrue(html.startswith('<img src="/media/gallery/missing.jpg" srcset="/media-resize/w320:'))
+        self.assertIn("/gallery/missing.jpg 1600w", html)
+
+    @override_settings(ALLOWED_HOSTS=["testserver"], IMAGE_DERIVATIVE_WIDTHS=(320,))
+    def test_rendered_derivatives_reach_cached_pages(self):
+        SiteConfiguration.objects.create(college_name="Test College")
+        Program.objects.create(code="BIT", full_name="IT", url_slug="bit", image=_jpeg_upload())
+        self.assertContains(self.client.get(reverse("home:index")), "/media-resize/")
+        _run_queued_tasks()
+        response = self.client.get(reverse("home:index"))
+        self.assertContains(response, '<source type="image/webp" srcset="/media/derivatives/')
+
+    def test_only_new_files_queue_rendering(self):
+        rendering = Task.objects.filter(name=render_derivatives.task_name)
+        image = GalleryImage.objects.create(image=_jpeg_upload())
+        self.assertEqual(rendering.count(), 1)
+        self.assertFalse(ImageDerivative.objects.exists())
+
+        image.caption = "Convocation"
+        image.save()
+        GalleryImage.objects.get(pk=image.pk).save(update_fields=["caption"])
+        self.assertEqual(rendering.count(), 1)
+
+        image.image = _jpeg_upload("other.jpg")
+        image.save()
+        self.assertEqual(rendering.count(), 2)
+        _run_queued_tasks()
+        self.assertEqual(ImageDerivative.objects.filter(source_name=image.image.name).count(), 6)
+
+    def test_concurrent_render_keeps_the_first(self):
+        image = GalleryImage.objects.create(image=_jpeg_upload())
+        _run_queued_tasks()
+        with mock.patch.object(ImageDerivative.objects, "filter") as filter:
+            # The second save saw no derivatives yet, then lost the insert race
+            filter.return_value = ImageDerivative.objects.none()
+            self.assertEqual(generate_derivatives(image.image), [])
+        self.assertEqual(ImageDerivative.objects.filter(source_name=image.image.name).count(), 6)
+
+    def test_command_backfills_existing_uploads(self):
+        image = GalleryImage.objects.create(image=_jpeg_upload())
+        ImageDerivative.objects.all().delete()
+        call_command("generate_image_derivatives", stdout=io.StringIO())
+        self.assertEqual(
+            ImageDerivative.objects.filter(source_name=image.image.name).count(), 6
+        )
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class MediaResizeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        resize_cache = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(
+            override_settings(MEDIA_ROOT=media_root, MEDIA_RESIZE_CACHE_DIR=resize_cache)
+        )
+        self.name = default_storage.save("legacy/photo.jpg", _jpeg_upload())
+        SiteConfiguration.objects.create(college_name="Test College")
+
+    def test_resize_and_crop(self):
+        response = self.client.get(resized_image_url(self.name, width=300))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (300, 150))
+
+        url = resized_image_url(self.name, width=200, height=200, crop=True, format="webp")
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (200, 200))
+
+    def test_second_request_served_from_disk(self):
+        url = resized_image_url(self.name, width=300)
+        self.client.get(url)
+        default_storage.delete(self.name)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_tampered_parameters_are_rejected(self):
+        url = resized_image_url(self.name, width=300)
+        self.assertEqual(self.client.get(url.replace("w300", "w2000")).status_code, 404)
+        other = url.replace(self.name, "legacy/other.jpg")
+        self.assertEqual(self.client.get(other).status_code, 404)
+
+    def test_sizes_are_bounded(self):
+        with self.assertRaises(ResizeError):
+            resized_image_url(self.name, width=100000)
+        with self.assertRaises(ResizeError):
+            resized_image_url(self.name, width=100, crop=True)
+
+    def test_replaceable_sources_are_rendered_again_later(self):
+        # Not content-addressed, as on Cloudinary: the name can get new bytes
+        legacy = FileSystemStorage().save("legacy/photo.jpg", _jpeg_upload(size=(400, 200)))
+        url = resized_image_url(legacy, width=100)
+        with mock.patch("home.resize.default_storage") as storage:
+            resized_image_url(legacy, width=200)
+        self.assertEqual(storage.method_calls, [])
+        response = self.client.get(url)
+        self.assertEqual(response["Cache-Control"], "public, max-age=86400")
+        b"".join(response.streaming_content)
+
+        with open(default_storage.path(legacy), "wb") as replaced:
+            replaced.write(_jpeg_upload(size=(400, 400)).read())
+        tomorrow = time.time() + 86400
+        with mock.patch("home.resize.time.time", return_value=tomorrow):
+            response = self.client.get(url)
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as image:
+            self.assertEqual(image.size, (100, 100))
+
+    def test_oversized_source_is_a_bad_request(self):
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            response = self.client.get(resized_image_url(self.name, width=300))
+        self.assertEqual(response.status_code, 400)
+
+    def test_eviction_is_throttled(self):
+        with mock.patch("home.resize.evict") as evict_mock:
+            with mock.patch("home.resize._last_evict", time.monotonic()):
+                get_variant(*resized_image_url(self.name, width=100).split("/", 3)[2:])
+            self.assertEqual(evict_mock.call_count, 0)
+            with mock.patch("home.resize._last_evict", time.monotonic() - 61):
+                get_variant(*resized_image_url(self.name, width=110).split("/", 3)[2:])
+            self.assertEqual(evict_mock.call_count, 1)
+
+    def test_eviction_drops_least_recently_served(self):
+        old = resized_image_url(self.name, width=100)
+        new = resized_image_url(self.name, width=120)
+        old_path, _ = get_variant(*old.split("/", 3)[2:])
+        new_path, _ = get_variant(*new.split("/", 3)[2:])
+        os.utime(old_path, (1, 1))
+        # Room for the newer variant only
+        evict(max_bytes=int(os.path.getsize(new_path) / 0.9) + 1)
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(os.path.exists(new_path))
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], IMAGE_DERIVATIVE_WIDTHS=(320,))
+class UploadBatchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.staging = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(
+            override_settings(MEDIA_ROOT=media_root, UPLOAD_STAGING_DIR=self.staging)
+        )
+        SiteConfiguration.objects.create(college_name="Test College")
+        self.album = GalleryAlbum.objects.create(title="Sports Week")
+        staff = get_user_model().objects.create_user(
+            "staff", "staff@example.com", "password", is_staff=True
+        )
+        self.client.force_login(staff)
+
+    def upload(self, *files):
+        response = self.client.post(
+            reverse("home:gallery_add"),
+            {"album": self.album.pk, "caption": "Finals", "display_order": 5, "image": list(files)},
+        )
+        self.assertEqual(response.status_code, 302)
+        return UploadBatch.objects.get()
+
+    def test_upload_is_staged_then_processed(self):
+        batch = self.upload(_jpeg_upload("a.jpg"), _jpeg_upload("b.jpg"))
+        # Acknowledged before anything reaches storage, and queued for a worker
+        self.assertFalse(GalleryImage.objects.exists())
+        self.assertEqual(
+            list(Task.objects.values_list("name", "args")),
+            [(process_upload_batch.task_name, [batch.pk])],
+        )
+        self.assertEqual(batch.items.count(), 2)
+        self.assertTrue(all(os.path.exists(item.staged_path) for item in batch.items.all()))
+
+        process_upload_batch(batch.pk)
+        images = GalleryImage.objects.filter(album=self.album).order_by("display_order")
+        self.assertEqual([image.display_order for image in images], [5, 6])
+        self.assertEqual({image.caption for image in images}, {"Finals"})
+        self.assertTrue(ImageDerivative.objects.filter(source_name=images[0].image.name).exists())
+        self.assertEqual(os.listdir(self.staging), [])
+
+        progress = self.client.get(reverse("home:gallery_upload_progress", args=[batch.pk])).json()
+        self.assertEqual(progress["status"], "done")
+        self.assertEqual(progress["counts"]["done"], 2)
+        self.assertEqual([item["name"] for item in progress["items"]], ["a.jpg", "b.jpg"])
+
+    def test_unreadable_file_is_reported_per_file(self):
+        broken = SimpleUploadedFile("broken.jpg", b"not an image", content_type="image/jpeg")
+        # The form itself only validates the last file
+        batch = self.upload(broken, _jpeg_upload("good.jpg"))
+        process_upload_batch(batch.pk)
+
+        self.assertEqual(GalleryImage.objects.count(), 1)
+        progress = self.client.get(reverse("home:gallery_upload_progress", args=[batch.pk])).json()
+        self.assertEqual(progress["status"], "done")
+        failed = [item for item in progress["items"] if item["status"] == "failed"]
+        self.assertEqual([item["name"] for item in failed], ["broken.jpg"])
+        self.assertTrue(failed[0]["error"])
+
+    def test_failed_batch_removes_its_staged_files(self):
+        broken = SimpleUploadedFile("broken.jpg", b"not an image", content_type="image/jpeg")
+        batch = self.upload(broken, _jpeg_upload("good.jpg"))
+        with mock.patch("home.uploads.GalleryImage.objects.bulk_create", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                process_upload_batch(batch.pk)
+        batch.refresh_from_db()
+        self.assertEqual(batch.status, "failed")
+        self.assertEqual(os.listdir(self.staging), [])
+
+
+def _zip_of(entries):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in entries:
+            archive.writestr(name, data)
+    return SimpleUploadedFile("photos.zip", buffer.getvalue(), content_type="application/zip")
+
+
+@override_settings(
+    ALLOWED_HOSTS=["testserver"], IMAGE_DERIVATIVE_WIDTHS=(320,), IMAGE_IMPORT_WORKERS=1
+)
+class ZipImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        staging = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, UPLOAD_STAGING_DIR=staging))
+        SiteConfiguration.objects.create(college_name="Test College")
+        self.album = GalleryAlbum.objects.create(title="Convocation")
+        staff = get_user_model().objects.create_user(
+            "staff", "staff@example.com", "password", is_staff=True
+        )
+        self.client.force_login(staff)
+        self.photos = photos = [_jpeg_upload(size=(400, 300 + index)).read() for index in range(3)]
+        self.archive = [
+            ("IMG_10.jpg", photos[2]),
+            ("IMG_2.jpg", photos[1]),
+            ("IMG_1.jpg", photos[0]),
+            ("copy of IMG_1.jpg", photos[0]),
+            ("notes.txt", b"shot list"),
+            ("broken.jpg", b"not a photo"),
+            ("__MACOSX/._IMG_1.jpg", b"metadata"),
+        ]
+
+    def import_archive(self):
+        response = self.client.post(
+            reverse("home:album_import", args=[self.album.pk]), {"archive": _zip_of(self.archive)}
+        )
+        self.assertEqual(response.status_code, 302)
+        batch = UploadBatch.objects.latest("pk")
+        self.assertTrue(Task.objects.filter(name=import_album_zip.task_name, args=[batch.pk]).exists())
+        return batch, import_album_zip(batch.pk)
+
+    def test_imports_photos_in_name_order_skipping_the_rest(self):
+        GalleryImage.objects.create(album=self.album, image=_jpeg_upload("existing.jpg"), display_order=4)
+        batch, summary = self.import_archive()
+        self.assertEqual((summary["imported"], summary["skipped"], summary["failed"]), (3, 2, 1))
+
+        images = GalleryImage.objects.filter(album=self.album).exclude(display_order=4)
+        self.assertEqual(
+            [(image.image.height, image.display_order) for image in images.order_by("display_order")],
+            [(300, 5), (301, 6), (302, 7)],
+        )
+        self.assertEqual(
+            ImageDerivative.objects.filter(
+                width=320, format="jpeg", source_name__in=[image.image.name for image in images]
+            ).count(),
+            3,
+        )
+
+        progress = self.client.get(reverse("home:gallery_upload_progress", args=[batch.pk])).json()
+        self.assertEqual(progress["status"], "done")
+        self.assertNotIn("__MACOSX/._IMG_1.jpg", [item["name"] for item in progress["items"]])
+        self.assertIn("images_per_second", progress)
+
+    def test_reimport_skips_photos_already_in_the_album(self):
+        self.import_archive()
+        _, summary = self.import_archive()
+        self.assertEqual(summary["imported"], 0)
+        self.assertEqual(GalleryImage.objects.filter(album=self.album).count(), 3)
+
+    def test_skips_photos_added_through_the_upload_form(self):
+        GalleryImage.objects.create(album=self.album, image=SimpleUploadedFile("a.jpg", self.photos[0]))
+        legacy = FileSystemStorage().save("gallery/IMG_2.jpg", io.BytesIO(self.photos[1]))
+        GalleryImage.objects.create(album=self.album, image=legacy)
+        real_open = FileSystemStorage.open
+
+        def open_unless_legacy(storage, name, *args, **kwargs):
+            self.assertNotEqual(name, legacy, "legacy photo was read back")
+            return real_open(storage, name, *args, **kwargs)
+
+        with mock.patch.object(FileSystemStorage, "open", open_unless_legacy):
+            _, summary = self.import_archive()
+        # The legacy name carries no digest, so its photo is imported again
+        self.assertEqual((summary["imported"], summary["skipped"]), (2, 3))
+
+    def test_oversized_photos_and_archives_are_refused(self):
+        with override_settings(IMAGE_IMPORT_MAX_FILE_BYTES=1024):
+            _, summary = self.import_archive()
+        self.assertEqual((summary["imported"], summary["failed"]), (0, 5))
+        self.assertTrue(UploadItem.objects.filter(error__startswith="Larger than the").exists())
+
+        with override_settings(IMAGE_IMPORT_MAX_TOTAL_BYTES=1024):
+            response = self.client.post(
+                reverse("home:album_import", args=[self.album.pk]), {"archive": _zip_of(self.archive)}
+            )
+        self.assertContains(response, "the limit is 1.0")
+        self.assertEqual(UploadBatch.objects.count(), 1)
+
+    def test_rejects_files_that_are_not_zips(self):
+        response = self.client.post(
+            reverse("home:album_import", args=[self.album.pk]), {"archive": _jpeg_upload()}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(UploadBatch.objects.exists())
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class ReorderTests(TestCase):
+    def setUp(self):
+        self.albums = [GalleryAlbum.objects.create(title=f"Album {n}", display_order=n) for n in range(4)]
+        self.ids = [album.pk for album in self.albums]
+
+    def test_renumbers_only_moved_rows_in_one_statement(self):
+        links = [FooterLink.objects.create(name=f"Link {n}", url="/", display_order=n) for n in range(4)]
+        # Swap the last two; the first two keep their positions
+        order = [link.pk for link in links[:2] + links[:1:-1]]
+        with self.assertNumQueries(4):  # savepoint, lock, bulk UPDATE, release
+            result = apply_order(FooterLink, order)
+        self.assertEqual(result, {"updated": 2, "order": order})
+        self.assertEqual(list(FooterLink.objects.values_list("pk", flat=True)), order)
+        self.assertEqual(apply_order(FooterLink, order)["updated"], 0)
+
+    @override_settings(RANK_REBALANCE_LENGTH=10)
+    def test_single_move_writes_one_ranked_row(self):
+        order = self.ids[:]
+        order.insert(1, order.pop())
+        with self.assertNumQueries(4):  # savepoint, lock, UPDATE of the moved row, release
+            self.assertEqual(apply_order(GalleryAlbum, order)["updated"], 1)
+        for _ in range(30):
+            # Keep dragging the last album into the gap between the first two
+            order.insert(1, order.pop())
+            self.assertEqual(apply_order(GalleryAlbum, order)["updated"], 1)
+            self.assertEqual(list(GalleryAlbum.objects.values_list("pk", flat=True)), order)
+        # The rank keys grew, so a rebalance was queued; it keeps the order
+        rebalance = Task.objects.filter(name=rebalance_ranks.task_name).first()
+        self.assertTrue(rebalance_ranks(*rebalance.args))
+        self.assertEqual(list(GalleryAlbum.objects.values_list("pk", flat=True)), order)
+        self.assertLessEqual(max(len(album.rank) for album in GalleryAlbum.objects.all()), 7)
+
+    def test_moves_to_either_end_keep_display_order(self):
+        for _ in range(3):
+            order = self.ids[1:] + self.ids[:1]
+            self.assertEqual(apply_order(GalleryAlbum, order)["updated"], 1)
+            self.ids = order
+        for _ in range(3):
+            order = self.ids[-1:] + self.ids[:-1]
+            self.assertEqual(apply_order(GalleryAlbum, order)["updated"], 1)
+            self.ids = order
+        self.assertEqual(list(GalleryAlbum.objects.values_list("pk", flat=True)), self.ids)
+        orders = GalleryAlbum.objects.values_list("display_order", flat=True)
+        self.assertLessEqual(max(abs(number) for number in orders), 3)
+
+    def test_ranks_follow_display_order(self):
+        album = self.albums[3]
+        album.display_order = -1
+        album.save()
+        self.assertEqual(GalleryAlbum.objects.first(), album)
+        # Saving without touching display_order keeps a rank set by a move
+        apply_order(GalleryAlbum, self.ids[:2] + self.ids[3:1:-1])
+        album.refresh_from_db()
+        rank = album.rank
+        album.title = "Renamed"
+        album.save()
+        album.refresh_from_db()
+        self.assertEqual(album.rank, rank)
+
+    def test_key_between(self):
+        low, high = None, None
+        keys = []
+        for n in range(200):
+            key = key_between(low, high)
+            self.assertTrue((low is None or low < key) and (high is None or key < high))
+            self.assertFalse(key.endswith("0"))
+            keys.append(key)
+            low, high = (key, high) if n % 2 else (low, key)
+        with self.assertRaises(ValueError):
+            key_between("b", "a")
+
+    def test_skips_missing_and_rejects_bad_orders(self):
+        result = apply_order(GalleryAlbum, [self.ids[1], 99999, self.ids[0]])
+        self.assertEqual(result["order"], [self.ids[1], self.ids[0]])
+        for order in ([], "1,2", [1, "x"], [self.ids[0], self.ids[0]]):
+            with self.assertRaises(ReorderError):
+                apply_order(GalleryAlbum, order)
+
+    def test_view(self):
+        staff = get_user_model().objects.create_user("staff", "s@example.com", "pw", is_staff=True)
+        self.client.force_login(staff)
+        url = reverse("home:album_reorder")
+        order = self.ids[::-1]
+        response = self.client.post(url, json.dumps({"order": order}), content_type="application/json")
+        self.assertEqual(response.json()["order"], order)
+        self.assertEqual(list(GalleryAlbum.objects.values_list("pk", flat=True)), order)
+        response = self.client.post(url, "not json", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_notices_are_added_and_sorted_in_django_admin(self):
+        admin_user = get_user_model().objects.create_superuser("admin", "a@example.com", "pw")
+        self.client.force_login(admin_user)
+        for title in ("First", "Second"):
+            response = self.client.post(
+                "/django-admin/home/notice/add/",
+                {"title": title, "date_bs": "2082-01-01", "priority": "normal", "is_active": "on"},
+            )
+            self.assertEqual(response.status_code, 302)
+        first, second = Notice.objects.order_by("pk")
+        self.assertEqual((first.display_order, second.display_order), (1, 2))
+        self.assertEqual(list(Notice.objects.all()), [first, second])
+        self.assertEqual(self.client.get("/django-admin/home/notice/").status_code, 200)
+
+        response = self.client.post(
+            "/django-admin/home/notice/adminsortable2_update/",
+            json.dumps({"updatedItems": [[second.pk, 1], [first.pk, 2]]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(Notice.objects.all()), [second, first])
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class GalleryBulkActionTests(TestCase):
+    def setUp(self):
+        self.source = GalleryAlbum.objects.create(title="Sports Week")
+        self.target = GalleryAlbum.objects.create(title="Best of")
+        GalleryImage.objects.create(album=self.target, image="gallery/kept.jpg", display_order=7)
+        self.images = [
+            GalleryImage.objects.create(album=self.source, image=f"gallery/{n}.jpg", display_order=n)
+            for n in range(3)
+        ]
+        self.ids = [image.pk for image in self.images]
+
+    def names(self, album):
+        return [image.image.name for image in album.images.all()]
+
+    def post(self, action, ids):
+        return self.client.post(
+            reverse("home:gallery_bulk_action"),
+            {"action": action, "image_ids": ids, "target_album": self.target.pk},
+        )
+
+    def test_copy_appends_in_order(self):
+        with mock.patch("home.gallery_actions.CHUNK_SIZE", 2), self.assertNumQueries(7):
+            # savepoint, a select per chunk, max, an insert per chunk, release
+            self.assertEqual(copy_images(self.ids[::-1], self.target), 3)
+        expected = ["gallery/kept.jpg", "gallery/0.jpg", "gallery/1.jpg", "gallery/2.jpg"]
+        self.assertEqual(self.names(self.target), expected)
+        self.assertEqual(len(self.names(self.source)), 3)
+
+    def test_move_appends_in_order(self):
+        with mock.patch("home.gallery_actions.CHUNK_SIZE", 2):
+            self.assertEqual(move_images(self.ids, self.target), 3)
+        expected = ["gallery/kept.jpg", "gallery/0.jpg", "gallery/1.jpg", "gallery/2.jpg"]
+        self.assertEqual(self.names(self.target), expected)
+        self.assertEqual(self.names(self.source), [])
+        # Moving again stacks another bucket prefix on the ranks, still in order
+        move_images(self.ids[:1], self.target)
+        self.assertEqual(self.names(self.target)[-1], "gallery/0.jpg")
+
+    def test_view(self):
+        staff = get_user_model().objects.create_user("staff", "s@example.com", "pw", is_staff=True)
+        self.client.force_login(staff)
+        self.post("copy", self.ids)
+        self.assertEqual(self.target.images.count(), 4)
+        self.post("delete", self.ids)
+        self.assertEqual(self.source.images.count(), 0)
+        self.assertEqual(self.target.images.count(), 4)
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=(320,), FILE_DELETE_GRACE_SECONDS=0)
+class DeletionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.enterContext(mock.patch("home.deletion.CHUNK_SIZE", 2))
+        self.album = GalleryAlbum.objects.create(title="Sports Week")
+        self.images = [
+            GalleryImage.objects.create(album=self.album, image=_jpeg_upload(f"{n}.jpg", (400, 300)))
+            for n in range(3)
+        ]
+        _run_queued_tasks()
+        self.batch = UploadBatch.objects.create(album=self.album)
+
+    def run_file_tasks(self):
+        tasks = Task.objects.filter(name=remove_unreferenced_files.task_name)
+        return sum(remove_unreferenced_files(*task.args) for task in tasks)
+
+    def test_album_delete_keeps_files_still_in_use(self):
+        best_of = GalleryAlbum.objects.create(title="Best of")
+        copy_images([self.images[0].pk], best_of)
+        shared, removed = self.images[0].image.name, self.images[1].image.name
+        derivative = ImageDerivative.objects.filter(source_name=removed).first().file.name
+
+        self.assertEqual(delete_queryset(GalleryAlbum.objects.filter(pk=self.album.pk)), 1)
+        self.assertFalse(GalleryImage.objects.filter(album=self.album.pk).exists())
+        self.batch.refresh_from_db()
+        self.assertIsNone(self.batch.album)
+        # Nothing leaves storage until the queued tasks run
+        self.assertTrue(default_storage.exists(removed))
+
+        self.assertEqual(self.run_file_tasks(), 2)
+        self.assertTrue(default_storage.exists(shared))
+        self.assertFalse(default_storage.exists(removed))
+        self.assertFalse(default_storage.exists(derivative))
+        self.assertFalse(ImageDerivative.objects.filter(source_name=removed).exists())
+        self.assertTrue(ImageDerivative.objects.filter(source_name=shared).exists())
+
+    def test_rolled_back_delete_queues_nothing(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            delete_queryset(GalleryImage.objects.all())
+            raise RuntimeError
+        self.assertEqual(GalleryImage.objects.count(), 3)
+        self.assertFalse(Task.objects.filter(name=remove_unreferenced_files.task_name).exists())
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=(320,))
+class MediaGcTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.kept = GalleryImage.objects.create(image=_jpeg_upload("kept.jpg", (400, 300)))
+        gone = GalleryImage.objects.create(image=_jpeg_upload("gone.jpg", (400, 300)))
+        _run_queued_tasks()
+        # Removed the way deletes used to: the row goes, the files stay
+        GalleryImage.objects.filter(pk=gone.pk).delete()
+        self.gone = [gone.image.name] + list(
+            ImageDerivative.objects.filter(source_name=gone.image.name).values_list("file", flat=True)
+        )
+        self.recent = default_storage.save("gallery/recent.jpg", io.BytesIO(b"x"))
+        an_hour_ago = time.time() - 3600
+        for name in self.gone:
+            os.utime(default_storage.path(name), (an_hour_ago, an_hour_ago))
+
+    def gc(self, *args):
+        out = io.StringIO()
+        call_command("media_gc", "--grace-hours", "0.5", *args, stdout=out)
+        return out.getvalue()
+
+    def test_dry_run_only_reports(self):
+        self.assertIn(f"Would delete {len(self.gone)} unreferenced files", self.gc("--dry-run"))
+        self.assertTrue(all(default_storage.exists(name) for name in self.gone))
+
+    def test_deletes_old_unreferenced_files(self):
+        self.assertIn("1 unreferenced but within the grace period", self.gc())
+        self.assertFalse(any(default_storage.exists(name) for name in self.gone))
+        self.assertFalse(ImageDerivative.objects.filter(source_name=self.gone[0]).exists())
+        self.assertTrue(default_storage.exists(self.recent))
+        self.assertTrue(default_storage.exists(self.kept.image.name))
+        for derivative in ImageDerivative.objects.filter(source_name=self.kept.image.name):
+            self.assertTrue(default_storage.exists(derivative.file.name))
+
+    def test_refuses_storage_without_local_paths(self):
+        with mock.patch.object(FileSystemStorage, "path", side_effect=NotImplementedError):
+            with self.assertRaisesMessage(CommandError, "only cleans up local media storage"):
+                self.gc()
+        self.assertTrue(all(default_storage.exists(name) for name in self.gone))
+
+
+@override_settings(IMAGE_DERIVATIVE_WIDTHS=(320,))
+class ContentAddressedStorageTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def test_identical_uploads_share_one_file(self):
+        photo = _jpeg_upload("a.jpg", (64, 48)).read()
+        first = GalleryImage.objects.create(image=SimpleUploadedFile("a.jpg", photo))
+        again = GalleryImage.objects.create(image=SimpleUploadedFile("IMG_1.JPG", photo))
+        other = GalleryImage.objects.create(image=_jpeg_upload("b.jpg", (64, 48)))
+        self.assertTrue(is_content_addressed(first.image.name))
+        self.assertTrue(first.image.name.startswith("gallery/"))
+        self.assertEqual(again.image.name, first.image.name)
+        self.assertNotEqual(other.image.name, first.image.name)
+
+    def test_cleanup_keeps_a_file_reused_by_an_uncommitted_upload(self):
+        photo = _jpeg_upload("a.jpg", (64, 48)).read()
+        name = default_storage.save("gallery/a.jpg", io.BytesIO(photo))
+        two_hours_ago = time.time() - 7200
+        os.utime(default_storage.path(name), (two_hours_ago, two_hours_ago))
+        # An identical upload reuses the file; its row is not committed yet
+        self.assertEqual(default_storage.save("gallery/IMG_1.jpg", io.BytesIO(photo)), name)
+        self.assertEqual(remove_unreferenced_files([name]), 0)
+        self.assertTrue(default_storage.exists(name))
+        retry = Task.objects.get(name=remove_unreferenced_files.task_name)
+        self.assertEqual(retry.args, [[name]])
+        self.assertGreater(retry.run_at, timezone.now())
+        with override_settings(FILE_DELETE_GRACE_SECONDS=0):
+            self.assertEqual(remove_unreferenced_files(*retry.args), 1)
+        self.assertFalse(default_storage.exists(name))
+
+    @override_settings(FILE_DELETE_GRACE_SECONDS=0)
+    def test_command_renames_legacy_files(self):
+        legacy = FileSystemStorage()
+        photo = _jpeg_upload("legacy.jpg", (64, 48)).read()
+        names = [legacy.save(f"gallery/{name}", io.BytesIO(photo)) for name in ("one.jpg", "two.jpg")]
+        images = [GalleryImage.objects.create(image=name) for name in names]
+        _run_queued_tasks()
+        self.assertTrue(ImageDerivative.objects.filter(source_name=names[1]).exists())
+
+        out = io.StringIO()
+        call_command("content_address_media", "--batch-size", "1", stdout=out)
+        self.assertIn("Renamed 2 files", out.getvalue())
+
+        new = content_name(names[0], File(io.BytesIO(photo)))
+        for image in images:
+            image.refresh_from_db()
+            self.assertEqual(image.image.name, new)
+        self.assertFalse(ImageDerivative.objects.filter(source_name__in=names).exists())
+        self.assertTrue(ImageDerivative.objects.filter(source_name=new).exists())
+
+        for task in Task.objects.filter(name=remove_unreferenced_files.task_name):
+            remove_unreferenced_files(*task.args)
+        self.assertFalse(any(default_storage.exists(name) for name in names))
+        self.assertTrue(default_storage.exists(new))
+        for derivative in ImageDerivative.objects.all():
+            self.assertTrue(default_storage.exists(derivative.file.name))
+        out = io.StringIO()
+        call_command("content_address_media", stdout=out)
+        self.assertIn("Renamed 0 files", out.getvalue())
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"])
+class AlbumDownloadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        SiteConfiguration.objects.create(college_name="Test College")
+        self.album = GalleryAlbum.objects.create(title="Sports Week")
+        for order, name in ((2, "finals.jpg"), (1, "opening.jpg")):
+            GalleryImage.objects.create(
+                album=self.album, image=_jpeg_upload(name, (64, 48)), display_order=order
+            )
+        self.url = reverse("home:gallery_album_download", args=[self.album.pk])
+
+    def test_streams_stored_zip_in_album_order(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+        self.assertIn('filename="sports-week.zip"', response["Content-Disposition"])
+        self.assertIn("s-maxage", response["Cache-Control"])
+
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+            images = GalleryImage.objects.order_by("display_order")
+            entries = [f"{n:03d}-{os.path.basename(image.image.name)}" for n, image in enumerate(images, 1)]
+            self.assertEqual(archive.namelist(), entries)
+            self.assertEqual(
+                {info.compress_type for info in archive.infolist()}, {zipfile.ZIP_STORED}
+            )
+            self.assertEqual(archive.read(entries[0]), images[0].image.read())
+
+    def test_read_ahead_is_bounded(self):
+        # More data than the read-ahead allows still streams through in order
+        names = [default_storage.save(f"big/{n}.bin", io.BytesIO(os.urandom(600_000))) for n in range(3)]
+        entries = [(name, name, (2024, 1, 1, 0, 0, 0)) for name in names]
+        data = b"".join(zip_stream(entries, read_ahead_bytes=1))
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for name in names:
+                with default_storage.open(name) as stored:
+                    self.assertEqual(archive.read(name), stored.read())
+
+    def test_unchanged_album_revalidates(self):
+        etag = self.client.get(self.url)["ETag"]
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        GalleryImage.objects.create(album=self.album, image=_jpeg_upload("late.jpg", (64, 48)))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(ALLOWED_HOSTS=["testserver"], CHUNKED_UPLOAD_MAX_CHUNK_BYTES=1000)
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        media_root = self.enterContext(tempfile.TemporaryDirectory())
+        staging = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=media_root, UPLOAD_STAGING_DIR=staging))
+        self.staff = get_user_model().objects.create_user(
+            "staff", "staff@example.com", "password", is_staff=True
+        )
+        self.client.force_login(self.staff)
+        self.data = os.urandom(2500)
+
+    def start(self, **extra):
+        response = self.client.post(
+            reverse("home:chunked_upload_start"),
+            {"filename": "brochure.pdf", "size": len(self.data), **extra},
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put(self, token, offset, data):
+        return self.client.put(
+            reverse("home:chunked_upload_detail", args=[token]),
+            data,
+            content_type="application/octet-stream",
+            headers={"Upload-Offset": str(offset)},
+        )
+
+    def upload(self, **extra):
+        state = self.start(**extra)
+        for offset in range(0, len(self.data), 1000):
+            response = self.put(state["token"], offset, self.data[offset : offset + 1000])
+        return state["token"], response
+
+    def test_chunks_resume_and_complete_with_checksum(self):
+        token = self.start()["token"]
+        self.assertEqual(self.put(token, 0, self.data[:1000]).json()["offset"], 1000)
+        # A retried or skipped chunk is refused with the offset to resume from
+        response = self.put(token, 2000, self.data[2000:])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["offset"], 1000)
+        status = self.client.get(reverse("home:chunked_upload_detail", args=[token])).json()
+        self.assertEqual((status["offset"], status["status"]), (1000, "uploading"))
+
+        self.put(token, 1000, self.data[1000:2000])
+        state = self.put(token, 2000, self.data[2000:]).json()
+        self.assertEqual(state["status"], "complete")
+        self.assertEqual(state["sha256"], hashlib.sha256(self.data).hexdigest())
+        # Chunks over the limit are refused
+        self.assertEqual(self.put(self.start()["token"], 0, os.urandom(1001)).status_code, 413)
+
+    def test_checksum_mismatch_resets_the_upload(self):
+        _, response = self.upload(sha256="0" * 64)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()["offset"], 0)
+
+    def test_form_accepts_upload_token(self):
+        token, _ = self.upload()
+        response = self.client.post(
+            reverse("home:notice_add"),
+            {
+                "title": "Admission notice",
+                "date_bs": "2082-01-01",
+                "priority": "normal",
+                "is_active": "on",
+                "file_upload_token": token,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        notice = Notice.objects.get()
+        self.assertTrue(notice.file.name.endswith(".pdf"))
+        with notice.file.open("rb") as stored:
+            self.assertEqual(stored.read(), self.data)
+        self.assertFalse(ChunkedUpload.objects.exists())
+
+    def test_unfinished_upload_is_a_form_error(self):
+        token = self.start()["token"]
+        form = NoticeForm(
+            {"title": "Notice", "date_bs": "2082-01-01", "priority": "normal", "file_upload_token": token},
+            user=self.staff,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("has not finished uploading", form.errors["file"][0])
+
+    def test_tokens_only_work_for_their_uploader(self):
+        token, _ = self.upload()
+        other = get_user_model().objects.create_user(
+            "other", "other@example.com", "password", is_staff=True
+        )
+        self.client.force_login(other)
+        detail = reverse("home:chunked_upload_detail", args=[token])
+        self.assertEqual(self.client.get(detail).status_code, 404)
+        self.assertEqual(self.put(token, 0, self.data[:1000]).status_code, 404)
+        form = NoticeForm(
+            {"title": "Notice", "date_bs": "2082-01-01", "priority": "normal", "file_upload_token": token},
+            user=other,
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("Unknown upload", form.errors["file"][0])
+        self.assertTrue(ChunkedUpload.objects.exists())
+
+    def test_invalid_form_closes_the_assembled_file(self):
+        token, _ = self.upload()
+        form = NoticeForm(
+            {"date_bs": "2082-01-01", "priority": "normal", "file_upload_token": token}, user=self.staff
+        )
+        file = form.files["file"]
+        self.assertFalse(form.is_valid())
+        self.assertTrue(file.closed)
+        # The upload stays for the corrected form
+        self.assertEqual(ChunkedUpload.objects.get().status, "complete")
+
+
+task_calls = []
+
+
+@task(max_attempts=2)
+def record_call(value):
+    task_calls.append(value)
+
+
+@task(max_attempts=2)
+def always_fail():
+    raise ValueError("broken")
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        task_calls.clear()
+
+    def test_claims_are_exclusive(self):
+        record_call.delay(1)
+        first = claim("worker-a", 5)
+        self.assertEqual([task.args for task in first], [[1]])
+        self.assertEqual(claim("worker-b", 5), [])
+
+        self.assertTrue(run_task(first[0], "worker-a"))
+        self.assertEqual(task_calls, [1])
+        self.assertEqual(Task.objects.get().status, "done")
+
+    def test_expired_lease_is_reclaimed(self):
+        record_call.delay(1)
+        claimed = claim("worker-a", 1)
+        Task.objects.update(locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = claim("worker-b", 1)
+        self.assertEqual([task.pk for task in reclaimed], [claimed[0].pk])
+        self.assertEqual(reclaimed[0].attempts, 2)
+        # The first worker lost its lease and cannot record a result
+        run_task(claimed[0], "worker-a")
+        self.assertEqual(Task.objects.get().status, "running")
+
+    def test_failures_back_off_then_fail(self):
+        always_fail.delay()
+        self.assertFalse(run_task(claim("worker", 1)[0], "worker"))
+        queued = Task.objects.get()
+        self.assertEqual(queued.status, "queued")
+        self.assertGreaterEqual(queued.run_at, timezone.now() + timedelta(seconds=29))
+        self.assertIn("broken", queued.last_error)
+        # Not due yet
+        self.assertEqual(claim("worker", 1), [])
+
+        Task.objects.update(run_at=timezone.now())
+        run_task(claim("worker", 1)[0], "worker")
+        self.assertEqual(Task.objects.get().status, "failed")
+
+
+def _serialized(func, lock):
+    def call(*args, **kwargs):
+        with lock:
+            return func(*args, **kwargs)
+
+    return call
+
+
+class TaskWorkerTests(TransactionTestCase):
+    def test_burst_worker_runs_every_task_once(self):
+        task_calls.clear()
+        for value in range(20):
+            record_call.delay(value)
+        # SQLite's shared in-memory test database fails, rather than waits, on
+        # writes from two threads at once
+        lock = threading.Lock()
+        self.enterContext(mock.patch("home.tasks.claim", _serialized(claim, lock)))
+        self.enterContext(mock.patch("home.tasks.run_task", _serialized(run_task, lock)))
+        worker = Worker(concurrency=4, poll_interval=0.01, burst=True)
+        self.assertEqual(worker.run(), 20)
+        self.assertEqual(sorted(task_calls), list(range(20)))
+        self.assertEqual(Task.objects.filter(status="done").count(), 20)
+
+    def test_benchmark_leaves_other_tasks_queued(self):
+        task_calls.clear()
+        record_call.delay("real job")
+        out = io.StringIO()
+        call_command("benchmark_task_queue", "--tasks", "5", "--concurrency", "1", stdout=out)
+        self.assertIn("(5/5 done)", out.getvalue())
+        self.assertEqual(task_calls, [])
+        self.assertEqual(Task.objects.get().status, "queued")
+
+
+def _two_tier_cache(location, **options):
+    return TwoTierCache(location, {"OPTIONS": options})
+
+
+def _increment_in_child(location, times):
+    backend = _two_tier_cache(location)
+    for _ in range(times):
+        backend.incr("counter")
+
+
+def _set_in_child(location, key, value):
+    _two_tier_cache(location).set(key, value)
+
+
+def _delete_in_child(location, key):
+    _two_tier_cache(location).delete(key)
+
+
+def _overwrite_in_child(location, count):
+    backend = _two_tier_cache(location)
+    for n in range(count):
+        backend.set("greeting", n)
+
+
+def _fill_in_child(location, count):
+    backend = _two_tier_cache(location, MAX_ENTRIES=10)
+    for n in range(count):
+        backend.set(f"filler-{n}", n)
+
+
+@unittest.skipUnless(
+    "fork" in multiprocessing.get_all_start_methods(), "needs fork start method"
+)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, "cache.sqlite3")
+        self.backend = _two_tier_cache(self.location, LOCAL_MAX_ENTRIES=3)
+        self.processes = multiprocessing.get_context("fork")
+
+    def run_children(self, target, *args, count=1):
+        children = [self.processes.Process(target=target, args=args) for _ in range(count)]
+        for child in children:
+            child.start()
+        for child in children:
+            child.join(timeout=60)
+            self.assertEqual(child.exitcode, 0)
+
+    def test_incr_is_atomic_across_processes(self):
+        self.backend.set("counter", 0)
+        self.run_children(_increment_in_child, self.location, 50, count=4)
+        self.assertEqual(self.backend.get("counter"), 200)
+
+    def test_invalidation_reaches_other_processes_on_next_request(self):
+        self.backend.set("greeting", "hello")
+        request_started.send(sender=None)
+        try:
+            self.assertEqual(self.backend.get("greeting"), "hello")
+            self.run_children(_set_in_child, self.location, "greeting", "namaste")
+            # Within one request the shared generation is only read once
+            self.assertEqual(self.backend.get("greeting"), "hello")
+        finally:
+            request_finished.send(sender=None)
+
+        request_started.send(sender=None)
+        try:
+            self.assertEqual(self.backend.get("greeting"), "namaste")
+        finally:
+            request_finished.send(sender=None)
+
+    def test_overwrite_in_another_process_only_drops_that_key(self):
+        self.backend.set("greeting", "hello")
+        self.backend.set("farewell", "bye")
+        self.backend.get("greeting")
+        self.run_children(_set_in_child, self.location, "greeting", "namaste")
+        before = self.backend.stats()
+        self.assertEqual(self.backend.get("greeting"), "namaste")
+        self.assertEqual(self.backend.get("farewell"), "bye")
+        after = self.backend.stats()
+        self.assertEqual(after["local_flushes"], before["local_flushes"])
+        self.assertEqual(after["local_hits"] - before["local_hits"], 1)
+
+    def test_falling_behind_the_change_log_empties_tier_one(self):
+        self.backend.set("greeting", "hello")
+        self.backend.get("greeting")
+        with mock.patch("config.cache.CHANGE_LOG_LENGTH", 5):
+            self.run_children(_overwrite_in_child, self.location, CULL_EVERY)
+        before = self.backend.stats()
+        self.assertEqual(self.backend.get("greeting"), CULL_EVERY - 1)
+        self.assertEqual(self.backend.stats()["local_flushes"], before["local_flushes"] + 1)
+
+    def test_delete_in_another_process_is_seen(self):
+        self.backend.set("greeting", "hello")
+        self.backend.get("greeting")
+        self.run_children(_delete_in_child, self.location, "greeting")
+        self.assertIsNone(self.backend.get("greeting"))
+
+    def test_cull_in_another_process_is_seen(self):
+        self.backend.set("greeting", "hello")
+        self.backend.get("greeting")
+        self.run_children(_fill_in_child, self.location, CULL_EVERY)
+        self.assertIsNone(self.backend.get("greeting"))
+
+    def test_local_tier_is_bounded_lru(self):
+        for i in range(5):
+            self.backend.set(f"key-{i}", i)
+        self.assertEqual(self.backend.stats()["local_entries"], 3)
+        # Evicted from tier 1 but still in the shared tier
+        self.assertEqual(self.backend.get("key-0"), 0)
+        stats = self.backend.stats()
+        self.assertEqual(stats["shared_hits"], 1)
+
+    def test_hit_and_miss_counters(self):
+        before = self.backend.stats()
+        self.backend.set("a", 1)
+        self.backend.get("a")
+        self.backend.get("missing")
+        self.assertEqual(self.backend.get_many(["a", "missing"]), {"a": 1})
+        after = self.backend.stats()
+        self.assertEqual(after["local_hits"] - before["local_hits"], 2)
+        self.assertEqual(after["misses"] - before["misses"], 2)
+        self.assertEqual(after["sets"] - before["sets"], 1)
+
+    def test_add_touch_and_expiry(self):
+        self.assertTrue(self.backend.add("once", 1))
+        self.assertFalse(self.backend.add("once", 2))
+        self.backend.set("short", "x", timeout=0)
+        self.assertIsNone(self.backend.get("short"))
+        self.assertTrue(self.backend.add("short", "y"))
+        self.assertTrue(self.backend.touch("once", 60))
+        self.assertFalse(self.backend.touch("missing", 60))
+        with self.assertRaises(ValueError):
+            self.backend.incr("missing")
@@ -0,0 +1,457 @@
+"""
+Background processing of multi-file gallery uploads.
+
+``gallery_add`` used to write every file to storage (an upload to Cloudinary
+when that is enabled) inside the request, so large albums timed out under
+Passenger. Now ``stage_upload`` only copies the files to ``UPLOAD_STAGING_DIR``
+on local disk and records an ``UploadBatch`` with one ``UploadItem`` per file,
+and the admin gets a response straight away. ``process_upload_batch``, a
+``home.tasks`` task run by ``manage.py run_worker``, then moves each file into
+storage, creates the ``GalleryImage`` rows with one ``bulk_create`` and
+generates their derivatives, saving each item's status as it goes so
+``upload_progress`` can report it.
+
+Whole albums arrive as ZIP archives from event photographers:
+``stage_zip_import`` stages the archive and ``import_album_zip`` reads it entry
+by entry (nothing is extracted in full), skipping non-images and photos the
+album already has, and generates derivatives on a pool of
+``IMAGE_IMPORT_WORKERS`` threads. The sizes the archive lists are checked
+against ``IMAGE_IMPORT_MAX_FILE_BYTES`` and ``IMAGE_IMPORT_MAX_TOTAL_BYTES``
+before anything is unpacked, so a small archive cannot fill the disk.
+"""
+
+import contextlib
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files import File
+from django.db import connection
+from django.db.models import Max
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+from PIL import Image
+
+from .images import generate_for_instance
+from .models import GalleryImage, UploadBatch, UploadItem
+from .signals import content_changed
+from .storage import DIGEST_LENGTH, name_digest
+from .tasks import task
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+# GalleryImage rows are created this many at a time during a ZIP import
+IMPORT_BATCH_SIZE = 100
+DEFAULT_IMPORT_WORKERS = 4
+DEFAULT_IMPORT_MAX_FILE_BYTES = 50 * 1024 * 1024
+DEFAULT_IMPORT_MAX_TOTAL_BYTES = 4 * 1024 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+def staging_dir():
+    return str(settings.UPLOAD_STAGING_DIR)
+
+
+def batch_dir(batch):
+    return os.path.join(staging_dir(), str(batch.pk))
+
+
+def _copy_and_hash(source, destination, max_bytes=None):
+    digest = hashlib.sha256()
+    copied = 0
+    for block in iter(lambda: source.read(READ_SIZE), b""):
+        copied += len(block)
+        if max_bytes is not None and copied > max_bytes:
+            raise ValueError(f"Larger than the {filesizeformat(max_bytes)} limit")
+        digest.update(block)
+        destination.write(block)
+    return digest.hexdigest()
+
+
+def stage_upload(files, *, album, caption, is_spotlight, is_cover, display_order, user=None):
+    """Copy uploaded ``files`` to the staging area and record them as a batch"""
+    batch = UploadBatch.objects.create(
+        album=album,
+        caption=caption,
+        is_spotlight=is_spotlight,
+        is_cover=is_cover,
+        display_order=display_order,
+        created_by=user if user and user.is_authenticated else None,
+    )
+    os.makedirs(batch_dir(batch), exist_ok=True)
+
+    items = []
+    for position, uploaded in enumerate(files):
+        # Staged under our own name; the visitor's file name is only kept as data
+        extension = os.path.splitext(uploaded.name)[1].lower()[:10]
+        path = os.path.join(batch_dir(batch), f"{position}{extension}")
+        uploaded.seek(0)
+        with open(path, "wb") as staged:
+            sha256 = _copy_and_hash(uploaded, staged)
+        items.append(
+            UploadItem(
+                batch=batch,
+                position=position,
+                original_name=os.path.basename(uploaded.name)[:255],
+                staged_path=path,
+                size=uploaded.size,
+                sha256=sha256,
+            )
+        )
+    UploadItem.objects.bulk_create(items)
+    return batch
+
+
+def start_upload_batch(batch_id):
+    """Queue the batch for a worker; it is picked up once the transaction commits"""
+    return process_upload_batch.delay(batch_id)
+
+
+def _verify_image(file):
+    with Image.open(file) as image:
+        image.verify()
+
+
+def _store_item(item, field):
+    """Move one staged file into storage; returns True on success"""
+    try:
+        _verify_image(item.staged_path)
+        with open(item.staged_path, "rb") as staged:
+            name = field.generate_filename(None, item.original_name)
+            item.stored_name = field.storage.save(name, File(staged, name=item.original_name))
+    except (OSError, ValueError, Image.DecompressionBombError) as error:
+        item.status = "failed"
+        item.error = str(error) or error.__class__.__name__
+    else:
+        item.status = "stored"
+        os.remove(item.staged_path)
+    item.save(update_fields=["stored_name", "status", "error"])
+    return item.status == "stored"
+
+
+@contextlib.contextmanager
+def _processing(batch):
+    """Mark ``batch`` processing, then done (or failed, on an exception)
+
+    Either way its staging directory is removed: the tasks are not retried, so
+    nothing would read the staged files again.
+    """
+    batch.status = "processing"
+    batch.started_at = timezone.now()
+    batch.save(update_fields=["status", "started_at"])
+    try:
+        yield
+        if batch.status == "processing":
+            batch.status = "done"
+    except Exception:
+        logger.exception("Upload batch %s failed", batch.pk)
+        batch.status = "failed"
+        raise
+    finally:
+        batch.finished_at = timezone.now()
+        batch.save(update_fields=["status", "finished_at"])
+        shutil.rmtree(batch_dir(batch), ignore_errors=True)
+
+
+# Not retried: a second run after bulk_create would add the images twice
+@task(max_attempts=1)
+def process_upload_batch(batch_id):
+    """Store a staged batch, create its gallery images and their derivatives"""
+    batch = UploadBatch.objects.select_related("album").get(pk=batch_id)
+    with _processing(batch):
+        field = GalleryImage._meta.get_field("image")
+        items = list(batch.items.filter(status="staged"))
+        stored = [item for item in items if _store_item(item, field)]
+
+        images = [
+            GalleryImage(
+                album=batch.album,
+                image=item.stored_name,
+                caption=batch.caption,
+                is_spotlight=batch.is_spotlight,
+                is_cover=batch.is_cover,
+                display_order=batch.display_order + item.position,
+            )
+            for item in stored
+        ]
+        GalleryImage.objects.bulk_create(images)
+        # bulk_create sends no signals
+        content_changed(GalleryImage)
+
+        for image, item in zip(images, stored):
+            generate_for_instance(image)
+            item.status = "done"
+            item.save(update_fields=["status"])
+
+        if items and not stored:
+            batch.status = "failed"
+    return batch
+
+
+# ---- ZIP import ---------------------------------------------------------------
+
+
+def archive_path(batch):
+    return os.path.join(batch_dir(batch), "archive.zip")
+
+
+def stage_zip_import(archive, *, album, user=None):
+    """Copy an uploaded ZIP of photos to the staging area as a batch for ``album``"""
+    batch = UploadBatch.objects.create(
+        album=album, created_by=user if user and user.is_authenticated else None
+    )
+    os.makedirs(batch_dir(batch), exist_ok=True)
+    archive.seek(0)
+    with open(archive_path(batch), "wb") as staged:
+        shutil.copyfileobj(archive, staged, READ_SIZE)
+    return batch
+
+
+def _natural_key(name):
+    # IMG_9.jpg before IMG_10.jpg, as photographers number them
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def _is_listed(info):
+    """Entries worth an item: files, without macOS metadata or hidden files"""
+    parts = info.filename.split("/")
+    return not (
+        info.is_dir() or parts[0] == "__MACOSX" or any(part.startswith(".") for part in parts)
+    )
+
+
+def _import_workers():
+    return getattr(settings, "IMAGE_IMPORT_WORKERS", DEFAULT_IMPORT_WORKERS)
+
+
+def _max_file_bytes():
+    return getattr(settings, "IMAGE_IMPORT_MAX_FILE_BYTES", DEFAULT_IMPORT_MAX_FILE_BYTES)
+
+
+def check_archive_size(archive):
+    """Raise ValueError if the photos in ``archive`` (a ``ZipFile``) unpack to too much"""
+    limit = getattr(settings, "IMAGE_IMPORT_MAX_TOTAL_BYTES", DEFAULT_IMPORT_MAX_TOTAL_BYTES)
+    total = sum(
+        info.file_size
+        for info in archive.infolist()
+        if _is_listed(info) and os.path.splitext(info.filename)[1].lower() in IMAGE_EXTENSIONS
+    )
+    if total > limit:
+        raise ValueError(
+            f"The photos in this archive unpack to {filesizeformat(total)}; "
+            f"the limit is {filesizeformat(limit)}"
+        )
+
+
+def _album_digests(album):
+    """Content digests of the photos already in ``album``, read from their names
+
+    Photos stored before names were content-addressed carry no digest and are
+    not matched; reading them back would download every one on each import.
+    """
+    digests = {
+        sha256[:DIGEST_LENGTH]
+        for sha256 in UploadItem.objects.filter(
+            batch__album=album, status__in=["stored", "done"]
+        )
+        .exclude(sha256="")
+        .values_list("sha256", flat=True)
+    }
+    for name in GalleryImage.objects.filter(album=album).values_list("image", flat=True):
+        digest = name_digest(name)
+        if digest is not None:
+            digests.add(digest)
+    return digests
+
+
+def _generate(image):
+    try:
+        generate_for_instance(image)
+    finally:
+        # Pool threads each open their own connection
+        connection.close()
+
+
+class _ZipImport:
+    """State of one ``import_zip`` run"""
+
+    def __init__(self, batch, pool):
+        self.batch = batch
+        self.pool = pool
+        self.field = GalleryImage._meta.get_field("image")
+        self.seen = _album_digests(batch.album)
+        highest = GalleryImage.objects.filter(album=batch.album).aggregate(Max("display_order"))
+        self.next_order = (highest["display_order__max"] or 0) + 1
+        self.pending = []  # stored items without a GalleryImage yet
+        self.generating = []  # (future, item)
+        self.imported = 0
+
+    def add(self, archive, info, item):
+        extension = os.path.splitext(info.filename)[1].lower()
+        if extension not in IMAGE_EXTENSIONS:
+            return self._finish(item, "skipped", "Not an image")
+        max_bytes = _max_file_bytes()
+        if info.file_size > max_bytes:
+            return self._finish(item, "failed", f"Larger than the {filesizeformat(max_bytes)} limit")
+        with archive.open(info) as entry, tempfile.TemporaryFile() as temp:
+            try:
+                # Bounded again while reading, in case the listing lies
+                item.sha256 = _copy_and_hash(entry, temp, max_bytes)
+            except (OSError, ValueError, zipfile.BadZipFile) as error:
+                return self._finish(item, "failed", str(error) or error.__class__.__name__)
+            if item.sha256[:DIGEST_LENGTH] in self.seen:
+                return self._finish(item, "skipped", "Duplicate of a photo already in the album")
+            try:
+                temp.seek(0)
+                _verify_image(temp)
+                temp.seek(0)
+                name = os.path.basename(info.filename)
+                item.stored_name = self.field.storage.save(
+                    self.field.generate_filename(None, name), File(temp, name=name)
+                )
+            except (OSError, ValueError, Image.DecompressionBombError) as error:
+                return self._finish(item, "failed", str(error) or error.__class__.__name__)
+        self.seen.add(item.sha256[:DIGEST_LENGTH])
+        item.status = "stored"
+        self.pending.append(item)
+        if len(self.pending) >= IMPORT_BATCH_SIZE:
+            self.flush()
+
+    def _finish(self, item, status, error):
+        item.status = status
+        item.error = error
+        item.save(update_fields=["sha256", "status", "error"])
+
+    def flush(self):
+        """Create the pending gallery images and start on their derivatives"""
+        if not self.pending:
+            return
+        images = [
+            GalleryImage(
+                album=self.batch.album,
+                image=item.stored_name,
+                display_order=self.next_order + index,
+            )
+            for index, item in enumerate(self.pending)
+        ]
+        GalleryImage.objects.bulk_create(images)
+        UploadItem.objects.bulk_update(self.pending, ["sha256", "stored_name", "status"])
+        content_changed(GalleryImage)
+        self.next_order += len(images)
+        self.imported += len(images)
+        for image, item in zip(images, self.pending):
+            if self.pool is None:
+                generate_for_instance(image)
+                self.generating.append((None, item))
+            else:
+                self.generating.append((self.pool.submit(_generate, image), item))
+        self.pending = []
+        self.collect()
+
+    def collect(self, wait=False):
+        """Mark the items whose derivatives are ready as done"""
+        done = []
+        for future, item in self.generating:
+            if future is None or wait or future.done():
+                if future is not None:
+                    future.result()
+                item.status = "done"
+                done.append(item)
+        if done:
+            UploadItem.objects.bulk_update(done, ["status"])
+            self.generating = [entry for entry in self.generating if entry[1] not in done]
+
+
+def import_zip(batch, workers=None):
+    """Import the staged archive of ``batch`` into its album; returns a summary"""
+    workers = _import_workers() if workers is None else workers
+    started = time.monotonic()
+    with contextlib.ExitStack() as stack:
+        archive = stack.enter_context(zipfile.ZipFile(archive_path(batch)))
+        # With one worker, derivatives are made in this thread
+        pool = stack.enter_context(ThreadPoolExecutor(workers)) if workers > 1 else None
+
+        members = sorted(
+            (info for info in archive.infolist() if _is_listed(info)),
+            key=lambda info: _natural_key(info.filename),
+        )
+        UploadItem.objects.bulk_create(
+            UploadItem(
+                batch=batch,
+                position=position,
+                original_name=info.filename[-255:],
+                size=info.file_size,
+            )
+            for position, info in enumerate(members)
+        )
+        # Fetched again: MySQL does not return the pks of bulk-created rows
+        items = batch.items.order_by("position")
+        state = _ZipImport(batch, pool)
+        try:
+            check_archive_size(archive)
+        except ValueError as error:
+            items.update(status="failed", error=str(error))
+        else:
+            for info, item in zip(members, items):
+                state.add(archive, info, item)
+        state.flush()
+        state.collect(wait=True)
+
+    seconds = time.monotonic() - started
+    summary = {
+        "imported": state.imported,
+        "skipped": batch.items.filter(status="skipped").count(),
+        "failed": batch.items.filter(status="failed").count(),
+        "seconds": round(seconds, 2),
+        "images_per_second": round(state.imported / seconds, 2) if seconds else 0,
+    }
+    logger.info("Imported ZIP into album %s: %s", batch.album_id, summary)
+    return summary
+
+
+@task(max_attempts=1)
+def import_album_zip(batch_id, workers=None):
+    """Import a staged ZIP archive (``stage_zip_import``) into its album"""
+    batch = UploadBatch.objects.select_related("album").get(pk=batch_id)
+    with _processing(batch):
+        summary = import_zip(batch, workers)
+        if not summary["imported"] and summary["failed"]:
+            batch.status = "failed"
+    return summary
+
+
+def upload_progress(batch):
+    """Per-file status of ``batch``, for the admin progress endpoint"""
+    items = list(batch.items.all())
+    storage = GalleryImage._meta.get_field("image").storage
+    counts = {status: 0 for status, _ in UploadItem.STATUS_CHOICES}
+    for item in items:
+        counts[item.status] += 1
+    progress = {
+        "id": batch.pk,
+        "status": batch.status,
+        "total": len(items),
+        "counts": counts,
+        "items": [
+            {
+                "name": item.original_name,
+                "status": item.status,
+                "error": item.error,
+                "url": storage.url(item.stored_name) if item.stored_name else None,
+            }
+            for item in items
+        ],
+    }
+    if batch.started_at and batch.finished_at:
+        seconds = (batch.finished_at - batch.started_at).total_seconds()
+        progress["seconds"] = round(seconds, 2)
+        progress["images_per_second"] = round(counts["done"] / seconds, 2) if seconds else 0
+    return progress
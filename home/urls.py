@@ -29,8 +29,29 @@ urlpatterns = [
     # Public Gallery
     path("gallery/", views.gallery_page, name="gallery"),
     path("gallery/<int:pk>/", views.gallery_album_detail, name="gallery_album_detail"),
+    path(
+        "gallery/<int:pk>/download/",
+        views.gallery_album_download,
+        name="gallery_album_download",
+    ),
+    path(
+        "media-resize/<str:signed_params>/<path:name>",
+        views.media_resize,
+        name="media_resize",
+    ),
     # Admin Dashboard
     path("admin/", views.admin_dashboard, name="admin_dashboard"),
+    path(
+        "admin/site-context-usage/",
+        views.site_context_usage,
+        name="site_context_usage",
+    ),
+    path("admin/cache-stats/", views.cache_stats, name="cache_stats"),
+    path(
+        "admin/fragment-cache-stats/",
+        views.fragment_cache_stats,
+        name="fragment_cache_stats",
+    ),
     # Notice Management
     path("admin/notices/", views.notice_list, name="notice_list"),
     path("admin/notices/add/", views.notice_add, name="notice_add"),
@@ -190,11 +211,24 @@ urlpatterns = [
     path("admin/albums/", views.album_list, name="album_list"),
     path("admin/albums/add/", views.album_add, name="album_add"),
     path("admin/albums/<int:pk>/edit/", views.album_edit, name="album_edit"),
+    path("admin/albums/<int:pk>/import/", views.album_import, name="album_import"),
     path("admin/albums/<int:pk>/delete/", views.album_delete, name="album_delete"),
     path("admin/albums/reorder/", views.album_reorder, name="album_reorder"),
     # Gallery Management
     path("admin/gallery/", views.gallery_list, name="gallery_list"),
     path("admin/gallery/add/", views.gallery_add, name="gallery_add"),
+    path(
+        "admin/gallery/uploads/<int:pk>/",
+        views.gallery_upload_progress,
+        name="gallery_upload_progress",
+    ),
+    # Resumable chunked uploads, used in place of large file fields
+    path("admin/uploads/", views.chunked_upload_start, name="chunked_upload_start"),
+    path(
+        "admin/uploads/<str:token>/",
+        views.chunked_upload_detail,
+        name="chunked_upload_detail",
+    ),
     path("admin/gallery/<int:pk>/edit/", views.gallery_edit, name="gallery_edit"),
     path("admin/gallery/<int:pk>/delete/", views.gallery_delete, name="gallery_delete"),
     path("admin/gallery/bulk-action/", views.gallery_bulk_action, name="gallery_bulk_action"),
@@ -3,9 +3,10 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db import models
 from django.db.models import Count
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.cache import get_conditional_response
 from django.views.decorators.http import require_POST
 
 from .forms import (
@@ -22,6 +23,7 @@ from .forms import (
     SiteLogoForm,
 )
 from .models import (
+    AboutSection,
     CareerProspect,
     ContactInfo,
     ContactMessage,
@@ -30,10 +32,12 @@ from .models import (
     CurriculumSemester,
     Event,
     Faculty,
+    FacultyTab,
     FooterLink,
     GalleryAlbum,
     GalleryImage,
     HeroSection,
+    ImageDerivative,
     MarqueeItem,
     Notice,
     PrincipalMessage,
@@ -42,78 +46,51 @@ from .models import (
     SiteLogo,
 )
 
+from .archives import album_zip_response
+from .cache import get_last_modified, version_tag
+from .edge import (
+    add_surrogate_keys,
+    page_surrogate_keys,
+    patch_edge_cache_control,
+    set_edge_headers,
+    surrogate_key,
+)
+from .faculty import group_faculty_by_tab
+from .object_cache import get_cached_or_404
+from .page_cache import cache_public_page, page_etag, set_validators
+from .signals import content_changed
+from .snapshots import HOMEPAGE_SNAPSHOT_MODELS
+from .spotlight import bucket_started, current_bucket, seconds_left_in_bucket
 from .views_bulk import semester_bulk_add, course_bulk_add
 
 
+@cache_public_page(
+    *HOMEPAGE_SNAPSHOT_MODELS,
+    ImageDerivative,
+    timeout=seconds_left_in_bucket,
+    extra_key=current_bucket,
+    extra_since=bucket_started,
+)
 def index(request):
     """Homepage view with dynamic content"""
-    from .models import FacultyTab, ImageSlideshow, SiteConfiguration
-
-    # Get marquee items from notices - urgent first, then by created date, limit to 5
-    marquee_notices = Notice.objects.filter(is_active=True).order_by(
-        models.Case(
-            models.When(priority="urgent", then=0),
-            models.When(priority="highlight", then=1),
-            models.When(priority="normal", then=2),
-            default=3,
-            output_field=models.IntegerField(),
-        ),
-        "-created_at",
-    )[:5]
-
-    # Get faculty tabs and organize faculty by department
-    faculty_tabs = FacultyTab.objects.filter(is_active=True)
-    faculty_by_tab = {}
-    for tab in faculty_tabs:
-        faculty_by_tab[tab.slug] = Faculty.objects.filter(
-            department=tab.department_filter, is_active=True
-        )
-
-    # Check for graduate programs (programs with "graduate" or "master" in name)
-    has_graduate_programs = (
-        Program.objects.filter(is_active=True)
-        .filter(
-            models.Q(full_name__icontains="master")
-            | models.Q(full_name__icontains="graduate")
-            | models.Q(full_name__icontains="phd")
-            | models.Q(full_name__icontains="doctoral")
-        )
-        .exists()
-    )
+    from .snapshots import homepage_context
 
-    context = {
-        "site_config": SiteConfiguration.objects.filter(is_active=True).first(),
-        "hero_slides": HeroSection.objects.filter(is_active=True),
-        "hero": HeroSection.objects.filter(is_active=True).first(),
-        "spotlight_images": GalleryImage.objects.filter(is_spotlight=True).order_by("?")[:8],
-        "gallery_slides": ImageSlideshow.objects.filter(
-            display_location="homepage_gallery", is_active=True
-        ),
-        "marquee_items": MarqueeItem.objects.filter(is_active=True),
-        "marquee_notices": marquee_notices,
-        "notices": Notice.objects.filter(is_active=True)[:3],
-        "events": Event.objects.filter(is_active=True)[:3],
-        "programs": Program.objects.filter(is_active=True),
-        "faculty_tabs": faculty_tabs,
-        "faculty_by_tab": faculty_by_tab,
-        "has_graduate_programs": has_graduate_programs,
-        "principal_message": PrincipalMessage.objects.filter(is_active=True).first(),
-        "contact_info": ContactInfo.objects.filter(is_active=True).first(),
-        "site_logo": SiteLogo.objects.filter(is_active=True).first(),
-    }
-    return render(request, "home/index.html", context)
+    return render(request, "home/index.html", homepage_context())
 
 
+@cache_public_page(GalleryAlbum, GalleryImage)
 def gallery_page(request):
     """Public gallery page - Lists Albums"""
-    albums = GalleryAlbum.objects.all().order_by("display_order", "-created_at")
+    albums = GalleryAlbum.objects.all().order_by("rank", "-created_at")
     return render(request, "home/gallery.html", {"albums": albums})
 
 
+@cache_public_page(GalleryAlbum, GalleryImage, ImageDerivative, query_params=("page",))
 def gallery_album_detail(request, pk):
     """View images in a specific album"""
     album = get_object_or_404(GalleryAlbum, pk=pk)
-    images = album.images.all().order_by("display_order", "-created_at")
+    add_surrogate_keys(request, surrogate_key(album))
+    images = album.images.all().order_by("rank", "-created_at")
     
     # Pagination
     paginator = Paginator(images, 12)
@@ -132,13 +109,52 @@ def gallery_album_detail(request, pk):
     )
 
 
+def gallery_album_download(request, pk):
+    """Stream all photos of an album as one ZIP (stored, not compressed)"""
+    album = get_object_or_404(GalleryAlbum, pk=pk)
+    etag = page_etag(version_tag(GalleryAlbum, GalleryImage), f"album-zip-{pk}")
+    last_modified = get_last_modified(GalleryAlbum, GalleryImage)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if not_modified is not None:
+        set_validators(not_modified, etag, last_modified)
+        patch_edge_cache_control(not_modified)
+        return not_modified
+
+    response = album_zip_response(album)
+    set_validators(response, etag, last_modified)
+    keys = page_surrogate_keys([GalleryAlbum, GalleryImage]) | {surrogate_key(album)}
+    set_edge_headers(response, keys)
+    return response
+
+
+def media_resize(request, signed_params, name):
+    """Serve a resized variant of an uploaded image from a signed URL"""
+    from .resize import ResizeError, SourceTooLarge, cache_control, get_variant
+
+    try:
+        path, content_type = get_variant(signed_params, name)
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    except SourceTooLarge:
+        return HttpResponseBadRequest("Image too large to resize")
+    except (ResizeError, OSError, ValueError):
+        raise Http404("No such image variant")
+    response["Cache-Control"] = cache_control(name)
+    return response
+
+
+@cache_public_page(Program, Curriculum, CurriculumSemester, Course, CareerProspect)
 def curriculum_page(request, slug):
     """Dynamic curriculum page for any program"""
     # Get program by URL slug
-    program = get_object_or_404(Program, url_slug=slug, is_active=True)
+    program = get_cached_or_404(Program, url_slug=slug, is_active=True)
+    add_surrogate_keys(request, surrogate_key(program))
 
     # Get curriculum for this program
-    curriculum = Curriculum.objects.filter(program=program, is_active=True).first()
+    curriculum_ids = Curriculum.objects.cached_ids(
+        f"program:{program.pk}", Curriculum.objects.filter(program=program, is_active=True)[:1]
+    )
+    curriculum = Curriculum.objects.get_many_cached(curriculum_ids)
+    curriculum = curriculum[0] if curriculum else None
 
     # Get semesters and courses
     semesters = (
@@ -171,14 +187,20 @@ def curriculum_page(request, slug):
     return render(request, "home/curriculum_detail.html", context)
 
 
+@cache_public_page(Faculty)
 def faculty_detail(request, pk):
     """View individual faculty member details"""
-    faculty = get_object_or_404(Faculty, pk=pk, is_active=True)
-    # Get related faculty from same department
-    related_faculty = (
-        Faculty.objects.filter(department=faculty.department, is_active=True)
-        .exclude(pk=pk)
-        .order_by("display_order")[:3]
+    faculty = get_cached_or_404(Faculty, pk=pk, is_active=True)
+    add_surrogate_keys(request, surrogate_key(faculty))
+    # Get related faculty from same department; one id list serves the whole department
+    related_ids = Faculty.objects.cached_ids(
+        f"department:{faculty.department}",
+        Faculty.objects.filter(department=faculty.department, is_active=True).order_by(
+            "rank"
+        )[:4],
+    )
+    related_faculty = Faculty.objects.get_many_cached(
+        [related_pk for related_pk in related_ids if related_pk != faculty.pk][:3]
     )
 
     context = {
@@ -213,11 +235,12 @@ def error_500(request):
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models import Q
 
+@cache_public_page(Notice, query_params=("page", "q"))
 def notices_page(request):
     """Public notices page - list all notices"""
     query = request.GET.get('q')
     notices_list = Notice.objects.filter(is_active=True).order_by(
-        'display_order',
+        'rank',
         models.Case(
             models.When(priority="urgent", then=0),
             models.When(priority="highlight", then=1),
@@ -249,6 +272,7 @@ def notices_page(request):
     return render(request, "home/notices.html", context)
 
 
+@cache_public_page(Event)
 def events_page(request):
     """View all events"""
     events = Event.objects.filter(is_active=True).order_by("-is_highlight", "-created_at")
@@ -258,14 +282,18 @@ def events_page(request):
     return render(request, "home/events.html", context)
 
 
+@cache_public_page(Event)
 def event_detail(request, pk):
     """View individual event details"""
-    event = get_object_or_404(Event, pk=pk, is_active=True)
-    # Get related events (highlighted or recent)
-    related_events = (
-        Event.objects.filter(is_active=True)
-        .exclude(pk=pk)
-        .order_by("-is_highlight", "-created_at")[:3]
+    event = get_cached_or_404(Event, pk=pk, is_active=True)
+    add_surrogate_keys(request, surrogate_key(event))
+    # Get related events (highlighted or recent); one id list serves every event
+    related_ids = Event.objects.cached_ids(
+        "related",
+        Event.objects.filter(is_active=True).order_by("-is_highlight", "-created_at")[:4],
+    )
+    related_events = Event.objects.get_many_cached(
+        [related_pk for related_pk in related_ids if related_pk != event.pk][:3]
     )
 
     context = {
@@ -275,12 +303,17 @@ def event_detail(request, pk):
     return render(request, "home/event_detail.html", context)
 
 
+@cache_public_page(Notice)
 def notice_detail(request, pk):
     """View individual notice details"""
-    notice = get_object_or_404(Notice, pk=pk, is_active=True)
-    # Get related notices (same priority or recent)
-    related_notices = (
-        Notice.objects.filter(is_active=True).exclude(pk=pk).order_by("-created_at")[:3]
+    notice = get_cached_or_404(Notice, pk=pk, is_active=True)
+    add_surrogate_keys(request, surrogate_key(notice))
+    # Get related notices (same priority or recent); one id list serves every notice
+    related_ids = Notice.objects.cached_ids(
+        "related", Notice.objects.filter(is_active=True).order_by("-created_at")[:4]
+    )
+    related_notices = Notice.objects.get_many_cached(
+        [related_pk for related_pk in related_ids if related_pk != notice.pk][:3]
     )
 
     context = {
@@ -290,6 +323,7 @@ def notice_detail(request, pk):
     return render(request, "home/notice_detail.html", context)
 
 
+@cache_public_page(Program, ProgramFeature)
 def programs_page(request):
     """List all academic programs"""
     programs = Program.objects.filter(is_active=True).order_by("display_order")
@@ -312,16 +346,13 @@ def programs_page(request):
     return render(request, "home/programs.html", context)
 
 
+@cache_public_page(Faculty, FacultyTab)
 def faculty_page(request):
     """List all faculty members organized by tabs"""
     from .models import FacultyTab
     
-    faculty_tabs = FacultyTab.objects.filter(is_active=True).order_by("display_order")
-    faculty_by_tab = {}
-    for tab in faculty_tabs:
-        faculty_by_tab[tab.slug] = Faculty.objects.filter(
-            department=tab.department_filter, is_active=True
-        ).order_by("display_order")
+    faculty_tabs = list(FacultyTab.objects.filter(is_active=True).order_by("display_order"))
+    faculty_by_tab = group_faculty_by_tab(faculty_tabs)
 
     context = {
         "faculty_tabs": faculty_tabs,
@@ -358,6 +389,34 @@ def admin_dashboard(request):
     return render(request, "home/admin_dashboard.html", context)
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def site_context_usage(request):
+    """Per-view report of which site_context keys were rendered by this worker"""
+    from .middleware import site_context_usage_report
+
+    return JsonResponse(site_context_usage_report())
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def cache_stats(request):
+    """Hit/miss counters of the default cache in this worker"""
+    from django.core.cache import cache
+
+    stats = getattr(cache, "stats", None)
+    return JsonResponse(stats() if stats else {})
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def fragment_cache_stats(request):
+    """Per-template {% cache_on %} hit rates in this worker (needs FRAGMENT_CACHE_DEBUG)"""
+    from .fragment_cache import fragment_cache_report
+
+    return JsonResponse(fragment_cache_report())
+
+
 # ============= NOTICE MANAGEMENT =============
 
 
@@ -365,7 +424,7 @@ def admin_dashboard(request):
 @user_passes_test(lambda u: u.is_staff)
 def notice_list(request):
     """List all notices"""
-    notices = Notice.objects.all().order_by("display_order", "-date_bs", "-created_at")
+    notices = Notice.objects.all().order_by("rank", "-date_bs", "-created_at")
     return render(request, "home/admin/notice_list.html", {"notices": notices})
 
 
@@ -374,7 +433,7 @@ def notice_list(request):
 def notice_add(request):
     """Add new notice"""
     if request.method == "POST":
-        form = NoticeForm(request.POST, request.FILES)
+        form = NoticeForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, "Notice created successfully!")
@@ -394,7 +453,7 @@ def notice_edit(request, pk):
     notice = get_object_or_404(Notice, pk=pk)
 
     if request.method == "POST":
-        form = NoticeForm(request.POST, request.FILES, instance=notice)
+        form = NoticeForm(request.POST, request.FILES, instance=notice, user=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, "Notice updated successfully!")
@@ -420,28 +479,24 @@ def notice_delete(request, pk):
     return redirect("home:notice_list")
 
 
+def _reorder(request, model):
+    """Apply a drag-and-drop order posted as ``{"order": [pk, ...]}``"""
+    from .ordering import ReorderError, apply_order
+
+    try:
+        order = json.loads(request.body).get("order")
+        result = apply_order(model, order)
+    except (ReorderError, ValueError, AttributeError) as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return JsonResponse({"status": "success", "message": "Order updated successfully", **result})
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 @require_POST
 def notice_reorder(request):
     """Reorder notices via AJAX"""
-    import json
-    from django.http import JsonResponse
-
-    try:
-        data = json.loads(request.body)
-        order = data.get("order", [])
-        
-        if not order:
-            return JsonResponse({"status": "error", "message": "No order provided"}, status=400)
-
-        # Update display_order for each item
-        for index, pk in enumerate(order):
-            Notice.objects.filter(pk=pk).update(display_order=index)
-
-        return JsonResponse({"status": "success", "message": "Order updated successfully"})
-    except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return _reorder(request, Notice)
 
 
 # ============= EVENT MANAGEMENT =============
@@ -515,16 +570,10 @@ def faculty_list(request):
     """List all faculty members grouped by tab/department"""
     from .models import FacultyTab
 
-    tabs = FacultyTab.objects.all().order_by("display_order")
-    grouped_faculty = []
-    
-    for tab in tabs:
-        members = Faculty.objects.filter(department=tab.department_filter).order_by("display_order")
-        grouped_faculty.append({
-            "tab": tab,
-            "members": members
-        })
-        
+    tabs = list(FacultyTab.objects.all().order_by("display_order"))
+    faculty_by_tab = group_faculty_by_tab(tabs, active_only=False)
+    grouped_faculty = [{"tab": tab, "members": faculty_by_tab[tab.slug]} for tab in tabs]
+
     # Handle faculty not in any active tab?
     # For now, let's stick to the defined tabs as requested "shown under their own faculty section"
     # If needed we could add an "Others" group.
@@ -588,23 +637,7 @@ def faculty_delete(request, pk):
 @require_POST
 def faculty_reorder(request):
     """Reorder faculty members via AJAX"""
-    import json
-    from django.http import JsonResponse
-
-    try:
-        data = json.loads(request.body)
-        order = data.get("order", [])
-        
-        if not order:
-            return JsonResponse({"status": "error", "message": "No order provided"}, status=400)
-
-        # Update display_order for each item
-        for index, pk in enumerate(order):
-            Faculty.objects.filter(pk=pk).update(display_order=index)
-
-        return JsonResponse({"status": "success", "message": "Order updated successfully"})
-    except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return _reorder(request, Faculty)
 
 
 # ============= FACULTY TAB MANAGEMENT =============
@@ -689,7 +722,7 @@ def faculty_tab_delete(request, pk):
 def page_content(request):
     """Manage page content (hero, marquee, principal message, contact info)"""
     hero = HeroSection.objects.filter(is_active=True).first()
-    marquee_items = MarqueeItem.objects.all().order_by("display_order")
+    marquee_items = MarqueeItem.objects.all().order_by("rank")
     principal_message = PrincipalMessage.objects.filter(is_active=True).first()
     contact_info = ContactInfo.objects.filter(is_active=True).first()
     site_logo = SiteLogo.objects.filter(is_active=True).first()
@@ -711,7 +744,7 @@ def page_content(request):
 @user_passes_test(lambda u: u.is_staff)
 def hero_list(request):
     """List all hero slides"""
-    slides = HeroSection.objects.all().order_by("display_order", "-created_at")
+    slides = HeroSection.objects.all().order_by("rank", "-created_at")
     return render(request, "home/admin/hero_list.html", {"slides": slides})
 
 
@@ -986,9 +1019,11 @@ def curriculum_edit(request, pk):
 @require_POST
 def curriculum_delete(request, pk):
     """Delete curriculum"""
+    from .deletion import delete_queryset
+
     curriculum = get_object_or_404(Curriculum, pk=pk)
     program_name = str(curriculum.program)
-    curriculum.delete()
+    delete_queryset(Curriculum.objects.filter(pk=curriculum.pk))
     messages.success(request, f"{program_name} curriculum deleted successfully!")
     return redirect("home:curriculum_list")
 
@@ -1002,11 +1037,12 @@ def semester_add(request, curriculum_pk):
     curriculum = get_object_or_404(Curriculum, pk=curriculum_pk)
 
     if request.method == "POST":
-        form = CurriculumSemesterForm(request.POST, request.FILES)
+        form = CurriculumSemesterForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             semester = form.save(commit=False)
             semester.curriculum = curriculum
             semester.save()
+            form.discard_chunked_uploads()
             messages.success(request, "Semester added successfully!")
             return redirect("home:curriculum_list")
     else:
@@ -1032,7 +1068,7 @@ def semester_edit(request, pk):
     semester = get_object_or_404(CurriculumSemester, pk=pk)
 
     if request.method == "POST":
-        form = CurriculumSemesterForm(request.POST, request.FILES, instance=semester)
+        form = CurriculumSemesterForm(request.POST, request.FILES, instance=semester, user=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, "Semester updated successfully!")
@@ -1140,7 +1176,7 @@ def program_add(request):
     from .forms import ProgramForm
 
     if request.method == "POST":
-        form = ProgramForm(request.POST, request.FILES)
+        form = ProgramForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             program = form.save()
             messages.success(request, f"{program.full_name} created successfully!")
@@ -1164,7 +1200,7 @@ def program_edit(request, pk):
     program = get_object_or_404(Program, pk=pk)
 
     if request.method == "POST":
-        form = ProgramForm(request.POST, request.FILES, instance=program)
+        form = ProgramForm(request.POST, request.FILES, instance=program, user=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, f"{program.full_name} updated!")
@@ -1492,6 +1528,7 @@ def about_section_delete(request, pk):
 
 
 # Public About Page
+@cache_public_page(AboutSection)
 def about_page(request):
     """Public about us page"""
     from .models import AboutSection, SiteConfiguration
@@ -1518,7 +1555,7 @@ def about_page(request):
 @user_passes_test(lambda u: u.is_staff)
 def album_list(request):
     """List all gallery albums"""
-    albums = GalleryAlbum.objects.all().order_by("display_order", "-created_at")
+    albums = GalleryAlbum.objects.all().order_by("rank", "-created_at")
     return render(request, "home/admin/album_list.html", {"albums": albums})
 
 
@@ -1562,13 +1599,44 @@ def album_edit(request, pk):
     )
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def album_import(request, pk):
+    """Import a ZIP archive of photos into an album in the background"""
+    from .forms import AlbumImportForm
+    from .uploads import import_album_zip, stage_zip_import
+
+    album = get_object_or_404(GalleryAlbum, pk=pk)
+
+    if request.method == "POST":
+        form = AlbumImportForm(request.POST, request.FILES, user=request.user)
+        if form.is_valid():
+            batch = stage_zip_import(form.cleaned_data["archive"], album=album, user=request.user)
+            import_album_zip.delay(batch.pk)
+            form.discard_chunked_uploads()
+            messages.success(request, "Archive received; its photos are being imported.")
+            request.session["gallery_upload_batch"] = batch.pk
+            return redirect(f"{reverse('home:gallery_list')}?album_id={album.pk}")
+    else:
+        form = AlbumImportForm()
+
+    return render(
+        request,
+        "home/admin/album_import_form.html",
+        {"form": form, "title": f"Import Photos into {album.title}", "album": album},
+    )
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 @require_POST
 def album_delete(request, pk):
     """Delete album"""
+    from .deletion import delete_queryset
+
     album = get_object_or_404(GalleryAlbum, pk=pk)
-    album.delete()
+    # Chunked, so even an album of thousands of photos returns quickly
+    delete_queryset(GalleryAlbum.objects.filter(pk=album.pk))
     messages.success(request, "Album deleted!")
     return redirect("home:album_list")
 
@@ -1594,15 +1662,78 @@ def gallery_list(request):
         images = images.filter(album=album)
         title = f"Manage Photos: {album.title}"
 
-    images = images.order_by("display_order", "-created_at")
+    images = images.order_by("rank", "-created_at")
     albums = GalleryAlbum.objects.all().order_by("-created_at")
     return render(
         request,
         "home/admin/gallery_list.html",
-        {"images": images, "albums": albums, "title": title, "filter": filter_type, "current_album_id": int(album_id) if album_id else None},
+        {
+            "images": images,
+            "albums": albums,
+            "title": title,
+            "filter": filter_type,
+            "current_album_id": int(album_id) if album_id else None,
+            "upload_batch_id": request.session.pop("gallery_upload_batch", None),
+        },
     )
 
 
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def gallery_upload_progress(request, pk):
+    """Per-file status of a background gallery upload, as JSON"""
+    from .models import UploadBatch
+    from .uploads import upload_progress
+
+    batch = get_object_or_404(UploadBatch, pk=pk)
+    return JsonResponse(upload_progress(batch))
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+@require_POST
+def chunked_upload_start(request):
+    """Start a resumable chunked upload (see home.chunked_uploads)"""
+    from .chunked_uploads import ChunkedUploadError, start_upload, upload_state
+
+    try:
+        upload = start_upload(
+            request.POST.get("filename"),
+            request.POST.get("size"),
+            request.POST.get("sha256", ""),
+            user=request.user,
+        )
+    except ChunkedUploadError as e:
+        return JsonResponse({"error": str(e)}, status=e.status)
+    return JsonResponse(upload_state(upload), status=201)
+
+
+@login_required
+@user_passes_test(lambda u: u.is_staff)
+def chunked_upload_detail(request, token):
+    """GET: where to resume a chunked upload; PUT: append a chunk at Upload-Offset"""
+    from .chunked_uploads import ChunkedUploadError, get_upload, upload_state, write_chunk
+
+    if request.method not in ("GET", "PUT"):
+        return JsonResponse({"error": "Method not allowed"}, status=405)
+    try:
+        upload = get_upload(token, request.user)
+        if request.method == "PUT":
+            try:
+                offset = int(request.headers["Upload-Offset"])
+                length = int(request.META["CONTENT_LENGTH"])
+            except (KeyError, ValueError):
+                raise ChunkedUploadError("Upload-Offset and Content-Length are required")
+            # Read from the request stream; request.body would buffer the chunk
+            upload = write_chunk(upload, offset, length, request)
+    except ChunkedUploadError as e:
+        state = {"error": str(e)}
+        if e.status != 404:
+            state.update(upload_state(get_upload(token, request.user)))
+        return JsonResponse(state, status=e.status)
+    return JsonResponse(upload_state(upload))
+
+
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 @login_required
@@ -1618,9 +1749,10 @@ def gallery_add(request):
         initial_data['album'] = target_album
 
     if request.method == "POST":
-        form = GalleryImageForm(request.POST, request.FILES)
+        form = GalleryImageForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
-            images = request.FILES.getlist('image')  # Get list of images
+            # Files sent as chunked uploads are in form.files too
+            images = form.files.getlist('image')
             if len(images) > 1:
                 # Handle bulk upload
                 album = form.cleaned_data['album']
@@ -1629,20 +1761,26 @@ def gallery_add(request):
                 is_cover = form.cleaned_data['is_cover']
                 display_order = form.cleaned_data['display_order'] or 0
 
-                count = 0
-                for img in images:
-                    GalleryImage.objects.create(
-                        album=album,
-                        image=img,
-                        caption=caption,  # Same caption for all? Or default?
-                        is_spotlight=is_spotlight,
-                        is_cover=is_cover, # If multiple, maybe only first should be cover? Or all? 
-                        # Giving all is_cover=True might be weird but it's what the user asked (bulk add)
-                        display_order=display_order + count
-                    )
-                    count += 1
-                
-                messages.success(request, f"{count} images added to gallery!")
+                # Storing many files inside the request timed out; stage them
+                # and let a background worker do the rest
+                from .uploads import stage_upload, start_upload_batch
+
+                batch = stage_upload(
+                    images,
+                    album=album,
+                    caption=caption,
+                    is_spotlight=is_spotlight,
+                    is_cover=is_cover,
+                    display_order=display_order,
+                    user=request.user,
+                )
+                start_upload_batch(batch.pk)
+                form.discard_chunked_uploads()
+                messages.success(
+                    request,
+                    f"{len(images)} images received and are being processed.",
+                )
+                request.session["gallery_upload_batch"] = batch.pk
             else:
                 # Normal single upload (fallback to standard save)
                 form.save()
@@ -1675,7 +1813,7 @@ def gallery_edit(request, pk):
     image = get_object_or_404(GalleryImage, pk=pk)
 
     if request.method == "POST":
-        form = GalleryImageForm(request.POST, request.FILES, instance=image)
+        form = GalleryImageForm(request.POST, request.FILES, instance=image, user=request.user)
         if form.is_valid():
             form.save()
             messages.success(request, "Gallery image updated!")
@@ -1714,11 +1852,10 @@ def gallery_bulk_action(request):
         messages.warning(request, "No images selected.")
         return redirect("home:gallery_list")
 
-    images = GalleryImage.objects.filter(id__in=image_ids)
-    count = images.count()
-    
+    from .gallery_actions import copy_images, delete_images, move_images
+
     if action == "delete":
-        images.delete()
+        count = delete_images(image_ids)
         messages.success(request, f"{count} images deleted successfully!")
 
     elif action == "move":
@@ -1726,7 +1863,7 @@ def gallery_bulk_action(request):
             messages.error(request, "Target album not selected for move.")
         else:
             target_album = get_object_or_404(GalleryAlbum, pk=target_album_id)
-            updated_count = images.update(album=target_album)
+            updated_count = move_images(image_ids, target_album)
             messages.success(request, f"{updated_count} images moved to '{target_album.title}'!")
 
     elif action == "copy":
@@ -1734,22 +1871,8 @@ def gallery_bulk_action(request):
             messages.error(request, "Target album not selected for copy.")
         else:
             target_album = get_object_or_404(GalleryAlbum, pk=target_album_id)
-            copied_count = 0
-            for img in images:
-                # Create a new instance pointing to the same file
-                # We use the same file field, which just stores the path.
-                # Note: If the original file is deleted, this reference might break if standard Django cleanup handles it.
-                # However, Django defaults do NOT delete files when models are deleted unless custom logic exists.
-                # So this is generally safe for "reference" style copying.
-                GalleryImage.objects.create(
-                    album=target_album,
-                    image=img.image, 
-                    caption=img.caption,
-                    is_spotlight=img.is_spotlight,
-                    is_cover=False, # Reset cover for copy usually
-                    display_order=img.display_order
-                )
-                copied_count += 1
+            # Copies point at the same stored file as their originals
+            copied_count = copy_images(image_ids, target_album)
             messages.success(request, f"{copied_count} images copied to '{target_album.title}'!")
 
     else:
@@ -1763,38 +1886,12 @@ def gallery_bulk_action(request):
     return redirect("home:gallery_list")
 
 
-@login_required
-@user_passes_test(lambda u: u.is_staff)
-@require_POST
-def gallery_reorder(request):
-    """Handle drag-and-drop reordering for images"""
-    try:
-        data = json.loads(request.body)
-        order = data.get("order", [])
-        
-        for index, pk in enumerate(order):
-            GalleryImage.objects.filter(pk=pk).update(display_order=index)
-            
-        return JsonResponse({"status": "success"})
-    except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)}, status=400)
-
-
 @login_required
 @user_passes_test(lambda u: u.is_staff)
 @require_POST
 def album_reorder(request):
     """Handle drag-and-drop reordering for albums"""
-    try:
-        data = json.loads(request.body)
-        order = data.get("order", [])
-        
-        for index, pk in enumerate(order):
-            GalleryAlbum.objects.filter(pk=pk).update(display_order=index)
-            
-        return JsonResponse({"status": "success"})
-    except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return _reorder(request, GalleryAlbum)
 
 
 @login_required
@@ -1802,20 +1899,4 @@ def album_reorder(request):
 @require_POST
 def gallery_reorder(request):
     """Reorder gallery images via AJAX"""
-    import json
-    from django.http import JsonResponse
-
-    try:
-        data = json.loads(request.body)
-        order = data.get("order", [])
-        
-        if not order:
-            return JsonResponse({"status": "error", "message": "No order provided"}, status=400)
-
-        # Update display_order for each item
-        for index, pk in enumerate(order):
-            GalleryImage.objects.filter(pk=pk).update(display_order=index)
-
-        return JsonResponse({"status": "success", "message": "Order updated successfully"})
-    except Exception as e:
-        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    return _reorder(request, GalleryImage)
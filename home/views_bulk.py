@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
+from .deletion import delete_queryset
 from .models import Curriculum, CurriculumSemester, Course
 from .bulk_forms import BulkSemesterForm, BulkCourseForm, BulkSemesterDeleteForm, BulkCourseDeleteForm
 
@@ -128,8 +129,7 @@ def semester_bulk_delete(request, curriculum_pk):
         form = BulkSemesterDeleteForm(request.POST, curriculum=curriculum)
         if form.is_valid():
             selected_semesters = form.cleaned_data["semesters"]
-            count = selected_semesters.count()
-            selected_semesters.delete()
+            count = delete_queryset(selected_semesters)
             messages.success(request, f"Successfully deleted {count} semesters.")
             return redirect("home:curriculum_list")
     else:
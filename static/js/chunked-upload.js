@@ -0,0 +1,97 @@
+// Resumable chunked uploads for large files in admin forms.
+//
+// File inputs marked with data-chunked-upload (set by ChunkedUploadFormMixin)
+// send files over CHUNKED_THRESHOLD bytes to /admin/uploads/ in chunks before
+// the form is submitted. A failed chunk is retried from the offset the server
+// reports, so a dropped connection costs one chunk instead of the whole file.
+// The form is then submitted with <field>_upload_token in place of the files.
+(function () {
+    const CHUNKED_THRESHOLD = 2 * 1024 * 1024;
+    const MAX_RETRIES = 5;
+
+    function csrfToken(form) {
+        const input = form.querySelector('input[name="csrfmiddlewaretoken"]');
+        return input ? input.value : '';
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function uploadFile(file, startUrl, csrf, onProgress) {
+        const body = new FormData();
+        body.append('filename', file.name);
+        body.append('size', file.size);
+        let response = await fetch(startUrl, {
+            method: 'POST',
+            headers: { 'X-CSRFToken': csrf },
+            body: body,
+        });
+        let state = await response.json();
+        if (!response.ok) throw new Error(state.error);
+
+        const url = startUrl + state.token + '/';
+        let retries = 0;
+        while (state.status !== 'complete') {
+            const end = Math.min(state.offset + state.chunk_size, file.size);
+            try {
+                response = await fetch(url, {
+                    method: 'PUT',
+                    headers: { 'X-CSRFToken': csrf, 'Upload-Offset': state.offset },
+                    body: file.slice(state.offset, end),
+                });
+                const next = await response.json();
+                if (!response.ok && response.status !== 409) throw new Error(next.error);
+                // 409: the server has a different offset; resume from there
+                state = next;
+                retries = 0;
+            } catch (error) {
+                if (++retries > MAX_RETRIES) throw error;
+                await sleep(1000 * 2 ** retries);
+                response = await fetch(url);
+                state = await response.json();
+            }
+            onProgress(state.offset / file.size);
+        }
+        return state.token;
+    }
+
+    document.addEventListener('submit', async function (event) {
+        const form = event.target;
+        const inputs = Array.from(form.querySelectorAll('input[type="file"][data-chunked-upload]'))
+            .filter(input => Array.from(input.files).reduce((total, file) => total + file.size, 0) > CHUNKED_THRESHOLD);
+        if (!inputs.length || form.dataset.chunkedUploadsDone) return;
+        event.preventDefault();
+
+        const submit = form.querySelector('[type="submit"]');
+        const label = submit ? submit.textContent : '';
+        if (submit) submit.disabled = true;
+        try {
+            for (const input of inputs) {
+                const files = Array.from(input.files);
+                for (const [index, file] of files.entries()) {
+                    const token = await uploadFile(file, input.dataset.chunkedUpload, csrfToken(form), progress => {
+                        if (submit) {
+                            submit.textContent = `Uploading ${file.name} (${index + 1}/${files.length}): ${Math.round(progress * 100)}%`;
+                        }
+                    });
+                    const hidden = document.createElement('input');
+                    hidden.type = 'hidden';
+                    hidden.name = input.name + '_upload_token';
+                    hidden.value = token;
+                    form.appendChild(hidden);
+                }
+                input.value = '';
+            }
+        } catch (error) {
+            alert('Upload failed: ' + error.message);
+            if (submit) {
+                submit.disabled = false;
+                submit.textContent = label;
+            }
+            return;
+        }
+        form.dataset.chunkedUploadsDone = '1';
+        form.submit();
+    });
+})();